@@ -1,70 +1,43 @@
 import streamlit as st
-import tempfile
-from pathlib import Path
-
-from docling.document_converter import DocumentConverter, PdfFormatOption
-from docling.backend.docling_parse_v2_backend import DoclingParseV2DocumentBackend
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import PdfPipelineOptions, AcceleratorOptions, AcceleratorDevice
-
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores import Chroma
-from langchain.chains import RetrievalQA
-from langchain_community.llms import HuggingFacePipeline
-
-from transformers import pipeline
-
-
-# ----------------- CONVERSION TO MARKDOWN -----------------
-def convert_to_markdown(file_path: str) -> str:
-    path = Path(file_path)
-    ext = path.suffix.lower()
-
-    if ext == ".pdf":
-        pdf_opts = PdfPipelineOptions(do_ocr=False)
-        pdf_opts.accelerator_options = AcceleratorOptions(
-            num_threads=4,
-            device=AcceleratorDevice.CPU
-        )
-        converter = DocumentConverter(
-            format_options={
-                InputFormat.PDF: PdfFormatOption(
-                    pipeline_options=pdf_opts,
-                    backend=DoclingParseV2DocumentBackend
-                )
-            }
-        )
-        doc = converter.convert(file_path).document
-        return doc.export_to_markdown(image_mode="placeholder")
-
-    if ext in [".doc", ".docx"]:
-        converter = DocumentConverter()
-        doc = converter.convert(file_path).document
-        return doc.export_to_markdown(image_mode="placeholder")
-
-    if ext == ".txt":
-        try:
-            return path.read_text(encoding="utf-8")
-        except UnicodeDecodeError:
-            return path.read_text(encoding="latin-1", errors="replace")
 
-    raise ValueError(f"Unsupported extension: {ext}")
+from context_builder import build_context
+from converter import convert_to_markdown, warm_converters
+from doc_index import HNSW_SETTINGS
+from embedding_service import get_embedding_service
+from markdown_chunker import MarkdownChunker
+from metrics import metrics, start_exporter
+from model_registry import get_generator
+from startup import warm_up
+from streaming import TimedStream, pipeline_tokens
+from upload_spool import spool_upload
+
+QA_PROMPT = (
+    "Use the following pieces of context to answer the question at the end. "
+    "If you don't know the answer, just say that you don't know, don't try to make up an answer.\n\n"
+    "{context}\n\nQuestion: {question}\nHelpful Answer:"
+)
+
+# falcon-7b-instruct reads 2048 tokens, answer included: leave room for the answer,
+# the instructions above (~50 tokens) and the question
+MAX_NEW_TOKENS = 500
+CONTEXT_TOKEN_BUDGET = 2048 - MAX_NEW_TOKENS - 150
 
 
 # ----------------- STREAMLIT APP -----------------
 def main():
+    start_exporter()
     st.title("📄 AI-Powered Q&A from Uploaded Documents")
+    # Loaded on background threads while the user picks a file (once per server process)
+    warm_up("embedding_model", lambda: get_embedding_service().load())
+    warm_up("converters", warm_converters)
 
     uploaded_file = st.file_uploader("Upload a document (.pdf, .docx, .txt)", type=["pdf", "doc", "docx", "txt"], key="file_upload")
 
     if uploaded_file:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(uploaded_file.name).suffix) as tmp:
-            tmp.write(uploaded_file.getvalue())
-            tmp_path = tmp.name
+        tmp_path, content_hash = spool_upload(uploaded_file)
 
         with st.spinner("Converting to Markdown..."):
-            markdown_text = convert_to_markdown(tmp_path)
+            markdown_text = convert_to_markdown(tmp_path, content_hash=content_hash)
             st.success("✅ Document converted!")
 
         with st.expander("🔍 View raw Markdown"):
@@ -72,29 +45,43 @@ def main():
 
         # Chunk the document
         with st.spinner("Splitting into chunks..."):
-            splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-            chunks = splitter.create_documents([markdown_text])
+            chunks = MarkdownChunker().create_documents([markdown_text])
             st.success(f"✅ Split into {len(chunks)} chunks.")
 
         # Embed and store chunks
         with st.spinner("Embedding and indexing..."):
-            embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-            db = Chroma.from_documents(chunks, embedding=embeddings)
+            # langchain takes seconds to import: not before the page is showing
+            from langchain.vectorstores import Chroma
+
+            with metrics.span("index_build"):
+                db = Chroma.from_documents(chunks, embedding=get_embedding_service(), collection_metadata=HNSW_SETTINGS)
             retriever = db.as_retriever()
 
         # Load QA pipeline
         with st.spinner("Loading QA model..."):
-            hf_pipeline = pipeline("text-generation", model="tiiuae/falcon-7b-instruct", max_new_tokens=500)
-            llm = HuggingFacePipeline(pipeline=hf_pipeline)
-            qa_chain = RetrievalQA.from_chain_type(llm=llm, retriever=retriever)
+            hf_pipeline = get_generator("text-generation", "tiiuae/falcon-7b-instruct", max_new_tokens=MAX_NEW_TOKENS)
             st.success("✅ Ready to answer questions!")
 
         # Ask questions
         question = st.text_input("Ask a question about your document:")
         if question:
             with st.spinner("Thinking..."):
-                answer = qa_chain.run(question)
-            st.markdown(f"**Answer:** {answer}")
+                with metrics.span("retrieve"):
+                    docs = retriever.get_relevant_documents(question)
+                # Repeated text dropped and capped at CONTEXT_TOKEN_BUDGET, counted with falcon's own tokenizer
+                context, docs, _ = build_context(
+                    docs,
+                    token_budget=CONTEXT_TOKEN_BUDGET,
+                    count=lambda text: len(hf_pipeline.tokenizer.encode(text, add_special_tokens=False)),
+                )
+
+            # Same "stuff" prompt RetrievalQA used, streamed token by token
+            st.markdown("**Answer:**")
+            stream = TimedStream(pipeline_tokens(hf_pipeline, QA_PROMPT.format(context=context, question=question)))
+            st.write_stream(stream)
+            metrics.observe("stage_seconds", stream.total, stage="answer", mode="stream", status="ok")
+            if stream.ttft is not None:
+                st.caption(f"First token after {stream.ttft * 1000:.0f} ms")
 
 
 if __name__ == "__main__":
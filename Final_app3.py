@@ -1,62 +1,30 @@
 import streamlit as st
-import tempfile
 from pathlib import Path
 import os
-import openai
-client = openai.OpenAI(api_key="your key")
+import time
+import uuid
+from llm_gateway import get_gateway
+# OPENAI_BASE_URL, if set, points the client at another server (e.g. python fake_openai.py for tests)
 # The API key is read from the environment variable "OPENAI_API_KEY".
 # Set it in your terminal before running the app:
 # export OPENAI_API_KEY=your-key-here
 # For example, on macOS/Linux:
 #   export OPENAI_API_KEY="your key"
 
-from docling.document_converter import DocumentConverter, PdfFormatOption
-from docling.backend.docling_parse_v2_backend import DoclingParseV2DocumentBackend
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import PdfPipelineOptions, AcceleratorOptions, AcceleratorDevice
-
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores import Chroma
-from langchain.chains import RetrievalQA
-from langchain_community.llms import HuggingFacePipeline
-
-from transformers import pipeline
-
-# ----------------- CONVERSION TO MARKDOWN -----------------
-def convert_to_markdown(file_path: str) -> str:
-    path = Path(file_path)
-    ext = path.suffix.lower()
-
-    if ext == ".pdf":
-        pdf_opts = PdfPipelineOptions(do_ocr=False)
-        pdf_opts.accelerator_options = AcceleratorOptions(
-            num_threads=4,
-            device=AcceleratorDevice.CPU
-        )
-        converter = DocumentConverter(
-            format_options={
-                InputFormat.PDF: PdfFormatOption(
-                    pipeline_options=pdf_opts,
-                    backend=DoclingParseV2DocumentBackend
-                )
-            }
-        )
-        doc = converter.convert(file_path).document
-        return doc.export_to_markdown(image_mode="placeholder")
-
-    if ext in [".doc", ".docx"]:
-        converter = DocumentConverter()
-        doc = converter.convert(file_path).document
-        return doc.export_to_markdown(image_mode="placeholder")
-    
-    if ext == ".txt":
-        try:
-            return path.read_text(encoding="utf-8")
-        except UnicodeDecodeError:
-            return path.read_text(encoding="latin-1", errors="replace")
-
-    raise ValueError(f"Unsupported extension: {ext}")
+from answer_cache import AnswerCache
+from context_builder import build_context
+from conversion_cache import hash_file
+from converter import PAGES_PER_BATCH, converter_settings, count_pages, iter_markdown, warm_converters
+from doc_index import SESSION_OWNER_PREFIX, DocumentIndex, fingerprint
+from embedding_service import get_embedding_service
+from ingest_jobs import FAILED, INDEXED, IngestQueue
+from markdown_chunker import CHUNK_SETTINGS, MarkdownChunker
+from metrics import metrics, start_exporter
+from reranker import CANDIDATES as RERANK_CANDIDATES, ENABLED as RERANK_ENABLED, get_reranker
+from startup import resource, warm_status, warm_up
+from streaming import TimedStream
+from tokens import count_tokens
+from upload_spool import get_spool, spool_upload, spooled_hash
 
 # ----------------- DOCUMENT MANAGER -----------------
 def document_manager():
@@ -65,10 +33,8 @@ def document_manager():
 
     uploaded_file = st.file_uploader("Uncover the secrets in your documents (.pdf, .docx, .txt)", type=["pdf", "doc", "docx", "txt"])
     if uploaded_file:
-        # Save file to a temporary location
-        temp_path = f"/tmp/{uploaded_file.name}"
-        with open(temp_path, "wb") as f:
-            f.write(uploaded_file.getvalue())
+        # Save file to the upload spool (named by content, cleaned up by age and size)
+        temp_path, _ = spool_upload(uploaded_file)
         # Store file info in session_state
         st.session_state.documents.append({
             "name": uploaded_file.name,
@@ -89,39 +55,328 @@ def document_manager():
         del st.session_state.documents[idx]
         st.experimental_rerun()
 
+# ----------------- VECTOR INDEX -----------------
+# Part of every document fingerprint: changing how documents are chunked re-indexes them
+CHUNK_SALT = "markdown-chunker|" + str(sorted(CHUNK_SETTINGS.items()))
+
+
+def _build_document_index():
+    return DocumentIndex(get_embedding_service())
+
+def get_document_index():
+    # One persistent index per server process, shared by every rerun (usually already built by start_engines)
+    return resource("document_index", _build_document_index)
+
+def _build_llm_gateway():
+    return get_gateway(api_key=os.environ.get("OPENAI_API_KEY", "your key"))
+
+def get_llm_gateway():
+    # One pooled, rate-limited async client per server process (llm_gateway.py), shared by every session
+    return resource("llm_gateway", _build_llm_gateway)
+
+def start_engines():
+    """Build everything slow on background threads once the page is on screen (once per server process)"""
+    warm_up("embedding_model", lambda: get_embedding_service().load())
+    warm_up("document_index", _build_document_index)
+    warm_up("converters", warm_converters)
+    warm_up("llm_gateway", _build_llm_gateway)
+    if RERANK_ENABLED:
+        warm_up("reranker", get_reranker)
+
+
+# ----------------- BACKGROUND INGESTION -----------------
+INGEST_BATCH_CHUNKS = 256
+PREVIEW_CHARS = 20_000
+
+def _build_ingest_queue():
+    embeddings = get_embedding_service()
+    salt = CHUNK_SALT + f"|pages_per_batch={PAGES_PER_BATCH}"
+
+    def fingerprint_file(task):
+        ext = Path(task.name).suffix.lower()
+        # Spooled uploads are named by their hash already: no need to read big files twice
+        content_hash = task.result["content_hash"] = spooled_hash(task.path) or hash_file(task.path)
+        task.result["doc_hash"] = fingerprint(content_hash, salt + str(converter_settings(ext)))
+
+    def ingest(task):
+        """Convert -> split -> embed -> index a few pages at a time, so memory stays flat for any document size"""
+        doc_hash = task.result["doc_hash"]
+        # Looked up per task, not kept: a warm-up rebuild replaces the index, but not this queue
+        index = get_document_index()
+        # Already indexed by an earlier upload or another session: only the preview is needed,
+        # plus the statistics if they weren't recorded back then
+        skip_embedding = index.has(doc_hash)
+        known_stats = index.stats.get(doc_hash) if skip_embedding else None
+        seconds = task.result["stage_seconds"] = {"converting": 0.0, "splitting": 0.0, "embedding": 0.0, "indexing": 0.0}
+        file_bytes = os.path.getsize(task.path)
+        words, tokens, preview, pending, stored = 0, 0, [], [], 0
+        # One chunker per document: headings and an unfinished chunk carry over between page batches
+        chunker = MarkdownChunker()
+
+        def flush(batch):
+            nonlocal stored
+            task.stage = f"embedding chunks {stored + 1}-{stored + len(batch)}"
+            start = time.perf_counter()
+            vectors = embeddings.embed_documents([chunk.page_content for chunk in batch])
+            seconds["embedding"] += time.perf_counter() - start
+
+            task.stage = f"indexing chunks {stored + 1}-{stored + len(batch)}"
+            start = time.perf_counter()
+            index.add_batch(doc_hash, task.name, batch, vectors, offset=stored)
+            seconds["indexing"] += time.perf_counter() - start
+            stored += len(batch)
+
+        sections = iter_markdown(task.path, content_hash=task.result["content_hash"])
+        try:
+            while True:
+                task.stage = "converting" if not stored else f"converting ({stored} chunks indexed)"
+                start = time.perf_counter()
+                section = next(sections, None)
+                seconds["converting"] += time.perf_counter() - start
+                if section is None:
+                    break
+                # Recently used, for spool GC in other server processes too (pins are per process)
+                os.utime(task.path, None)
+
+                pages, markdown = section
+                preview_full = sum(len(p) for p in preview) >= PREVIEW_CHARS
+                if not preview_full:
+                    preview.append(markdown[:PREVIEW_CHARS])
+                if known_stats:
+                    if preview_full:
+                        break
+                    continue
+                words += len(markdown.split())
+                tokens += count_tokens(markdown)
+                if skip_embedding:
+                    continue
+
+                task.stage = f"splitting pages {pages[0]}-{pages[1]}" if pages else "splitting"
+                start = time.perf_counter()
+                metadata = {"pages": f"{pages[0]}-{pages[1]}"} if pages else None
+                pending.extend(chunker.feed(markdown, metadata))
+                seconds["splitting"] += time.perf_counter() - start
+
+                while len(pending) >= INGEST_BATCH_CHUNKS:
+                    flush(pending[:INGEST_BATCH_CHUNKS])
+                    pending = pending[INGEST_BATCH_CHUNKS:]
+            if not skip_embedding:
+                pending.extend(chunker.finish())
+            if pending:
+                flush(pending)
+        except Exception:
+            if not skip_embedding:
+                index.discard_batches(doc_hash, stored)
+            raise
+        finally:
+            # Hands the pooled converter back straight away if we stopped early
+            sections.close()
+
+        if not skip_embedding:
+            index.commit_document(doc_hash, task.name, stored)
+        if not index.share(doc_hash, task.owner, task.name):
+            # Its last owner released it while we were reading it: index it again
+            return ingest(task)
+        if not known_stats:
+            try:
+                page_count = count_pages(task.path)
+            except Exception:
+                page_count = 0
+            known_stats = {"words": words}
+            index.stats.record(
+                doc_hash, source=task.name, file_type=Path(task.name).suffix.lower(), words=words, tokens=tokens,
+                pages=page_count, chunks=index.chunk_count([doc_hash]), convert_seconds=seconds["converting"],
+                bytes=file_bytes,
+            )
+        task.result["words"] = known_stats["words"]
+        task.result["preview"] = "\n\n".join(preview)[:PREVIEW_CHARS]
+        task.result["chunk_count"] = index.chunk_count([doc_hash])
+
+    return IngestQueue([
+        ("fingerprinting", fingerprint_file),
+        ("ingesting", ingest),
+    ], on_finish=lambda task: get_spool().unpin(task.path))
+
+def get_ingest_queue():
+    # One queue and worker pool per server process, shared by every session
+    return resource("ingest_queue", _build_ingest_queue)
+
+def get_user_id():
+    """Who owns this session's uploads: the signed-in user when Streamlit authentication (st.login) is
+    configured, otherwise a random id private to this browser session (its uploads are let go of
+    SESSION_OWNER_TTL_SECONDS after the session was last active). Never taken from the URL, which
+    can be shared, guessed or replayed."""
+    if "user_id" not in st.session_state:
+        try:
+            signed_in = st.user.get("is_logged_in", False)
+        except Exception:
+            signed_in = False
+        if signed_in:
+            st.session_state.user_id = "user:" + (st.user.get("sub") or st.user.get("email"))
+        else:
+            st.session_state.user_id = SESSION_OWNER_PREFIX + uuid.uuid4().hex
+    return st.session_state.user_id
+
+def queue_uploads(uploaded_files):
+    """Queue uploads the session hasn't queued yet and drop the ones taken out of the uploader.
+    Returns (uploaded_file, task) pairs in upload order."""
+    queue = get_ingest_queue()
+    task_ids = st.session_state.setdefault("ingest_tasks", {})
+    # Remembered here too: the queue drops finished tasks after a while
+    doc_hashes = st.session_state.setdefault("ingest_doc_hashes", {})
+    current = {uploaded_file.file_id: uploaded_file for uploaded_file in uploaded_files}
+
+    known = {task.task_id for task in queue.get(task_ids.values())}
+    for file_id, uploaded_file in current.items():
+        # New, or finished so long ago the queue forgot it (again is quick: it is indexed already)
+        if task_ids.get(file_id) not in known:
+            # Pinned until the task is done, so spool GC can't delete it while it waits or converts
+            path, _ = spool_upload(uploaded_file, pin=True)
+            task_ids[file_id] = queue.submit(get_user_id(), uploaded_file.name, path).task_id
+
+    tasks = {task.task_id: task for task in queue.get(task_ids.values())}
+    for file_id, task_id in task_ids.items():
+        task = tasks.get(task_id)
+        if task is not None and task.stage == INDEXED:
+            doc_hashes[file_id] = task.result["doc_hash"]
+
+    removed = [file_id for file_id in task_ids if file_id not in current]
+    if removed:
+        kept = {doc_hashes.get(f) for f in current}
+        for file_id in removed:
+            doc_hash = doc_hashes.pop(file_id, None)
+            if doc_hash is not None and doc_hash not in kept:
+                get_document_index().release(doc_hash, get_user_id())
+        queue.forget([task_ids.pop(f) for f in removed])
+
+    return [(current[f], tasks[task_ids[f]]) for f in current if task_ids[f] in tasks]
+
+def show_ingest_table(tasks):
+    st.dataframe([
+        {
+            "file": task.name,
+            "stage": task.stage,
+            "chunks": task.result.get("chunk_count", ""),
+            "seconds": round(sum(task.timings.values()), 1),
+            **{stage: round(secs, 1) for stage, secs in task.result.get("stage_seconds", {}).items()},
+            "error": task.error or "",
+        }
+        for task in tasks
+    ])
+
+@st.fragment(run_every=1.0)
+def poll_ingest_status(task_ids, ready_before):
+    """Refresh the status table every second; rerun the page whenever another document becomes searchable"""
+    tasks = get_ingest_queue().get(task_ids)
+    show_ingest_table(tasks)
+    ready = sum(task.stage == INDEXED for task in tasks)
+    if ready != ready_before or all(task.done for task in tasks):
+        st.rerun()
+
+def show_document_library():
+    """Everything this user can search (signed-in users: from earlier visits too), with a way to let go of each."""
+    index = get_document_index()
+    visible = index.visible_documents(get_user_id())
+    if not visible:
+        return
+    with st.expander(f"📚 Your searchable documents ({len(visible)})"):
+        for doc_hash, source in visible.items():
+            col1, col2 = st.columns([4, 1])
+            col1.write(f"{source} ({index.chunk_count([doc_hash])} chunks)")
+            if col2.button("Remove", key=f"release_{doc_hash}"):
+                index.release(doc_hash, get_user_id())
+                st.rerun()
+
 # ----------------- DOCUMENT STATS -----------------
 
-def show_document_stats(uploaded_files, all_texts):
+def show_document_stats(doc_hashes):
+    """Totals from the stats recorded at ingest time: no document text is read here"""
     st.subheader("🎶Document Statistics📊🎶")
 
-    if not uploaded_files or not all_texts:
+    summary = get_document_index().stats.summary(doc_hashes)
+    totals = summary["totals"]
+    if not totals["documents"]:
         st.info("No documents to analyze.")
         return
 
-    total_docs = len(uploaded_files)
-    total_words = 0
-    file_types = {}
-
-    for i, uploaded_file in enumerate(uploaded_files):
-        ext = Path(uploaded_file.name).suffix.lower()
-        file_types[ext] = file_types.get(ext, 0) + 1
-        content = all_texts[i]
-        total_words += len(content.split())
-
-    avg_words = total_words // total_docs if total_docs > 0 else 0
+    total_docs = totals["documents"]
+    avg_words = totals["words"] // total_docs
 
     col1, col2, col3 = st.columns(3)
     col1.metric("How many documents?", total_docs)
-    col2.metric("How many words?", f"{total_words:,}")
+    col2.metric("How many words?", f"{totals['words']:,}")
     col3.metric("How many words per doc?", f"{avg_words:,}")
 
+    col1, col2, col3 = st.columns(3)
+    col1.metric("How many tokens?", f"{totals['tokens']:,}")
+    col2.metric("How many pages?", f"{totals['pages']:,}")
+    col3.metric("How many chunks?", f"{totals['chunks']:,}")
+
     st.write("**File Types:**")
-    for ext, count in file_types.items():
-        st.write(f"• {ext}: {count} file(s)")
+    for ext, entry in sorted(summary["by_type"].items()):
+        st.write(
+            f"• {ext}: {entry['documents']} file(s), {entry['words']:,} words, "
+            f"{entry['convert_seconds']:.1f} s converting"
+        )
+
+def show_performance():
+    """Where time goes, per pipeline stage, since this server process started (metrics.py)"""
+    st.subheader("⚡ Performance")
+
+    status = warm_status()
+    if status:
+        st.caption("Background start-up: " + " · ".join(f"{name} {state}" for name, state in status.items()))
+
+    snapshot = metrics.snapshot()
+    stages = sorted(
+        (h for h in snapshot["histograms"] if h["name"] == "stage_seconds"),
+        key=lambda h: -h["sum"],
+    )
+    if not stages:
+        st.info("Nothing measured yet: upload a document or ask a question.")
+        return
+
+    rows = [{
+        "stage": h["labels"]["stage"],
+        "labels": ", ".join(f"{k}={v}" for k, v in h["labels"].items() if k != "stage"),
+        "count": h["count"],
+        "p50 ms": round(1000 * h["p50"], 1),
+        "p95 ms": round(1000 * h["p95"], 1),
+        "total s": round(h["sum"], 2),
+    } for h in stages]
+    st.dataframe(rows, use_container_width=True)
+
+    # One bar pair per stage (label variants of the same stage pooled by their worst p95)
+    worst = {}
+    for row in rows:
+        if row["p95 ms"] >= worst.get(row["stage"], {}).get("p95 ms", -1):
+            worst[row["stage"]] = row
+    st.bar_chart(
+        {"p50 ms": {s: r["p50 ms"] for s, r in worst.items()}, "p95 ms": {s: r["p95 ms"] for s, r in worst.items()}},
+        stack=False,
+    )
+
+    rates = metrics.cache_hit_rates()
+    if rates:
+        columns = st.columns(len(rates))
+        for column, (cache, entry) in zip(columns, sorted(rates.items())):
+            column.metric(f"{cache} cache hit rate", f"{entry['hit_rate']:.0%}", f"{entry['lookups']:,} lookups",
+                          delta_color="off")
+
+    counters = [c for c in snapshot["counters"] if c["name"] != "cache_requests_total"]
+    if counters:
+        st.write("**Volumes:**")
+        for counter in sorted(counters, key=lambda c: (c["name"], sorted(c["labels"].items()))):
+            labels = ", ".join(f"{k}={v}" for k, v in counter["labels"].items())
+            st.write(f"• {counter['name']} ({labels}): {counter['value']:,}")
+
+    col1, col2 = st.columns(2)
+    col1.download_button("⬇️ Prometheus text", metrics.prometheus(), file_name="metrics.prom", mime="text/plain")
+    col2.download_button("⬇️ JSON lines", metrics.jsonl(), file_name="metrics.jsonl", mime="application/x-ndjson")
 
 # ----------------- STREAMLIT APP -----------------
-def ask_openai(question, context):
-    response = client.chat.completions.create(
+def openai_request(question, context):
+    return dict(
         model="gpt-3.5-turbo",
         messages=[
             {"role": "system", "content": "You are a helpful assistant."},
@@ -130,7 +385,54 @@ def ask_openai(question, context):
         max_tokens=500,
         temperature=0.2,
     )
-    return response.choices[0].message.content.strip()
+
+def ask_openai_stream(question, context):
+    """Ask ChatGPT about the context; tokens can be rendered as they arrive"""
+    return TimedStream(get_llm_gateway().stream(**openai_request(question, context)))
+
+def show_streamed_answer(stream, sources):
+    st.markdown("**Answer:**")
+    st.write_stream(stream)
+    st.markdown(f"**Sources:** {', '.join(sources)}")
+    metrics.observe("stage_seconds", stream.total, stage="answer", mode="stream", status="ok")
+    if stream.ttft is not None:
+        metrics.observe("stage_seconds", stream.ttft, stage="first_token", status="ok")
+        st.caption(f"First token after {stream.ttft * 1000:.0f} ms, full answer in {stream.total:.1f} s")
+    llm = get_llm_gateway().metrics()
+    st.caption(
+        f"OpenAI calls: waiting for a slot p50 {llm['queue_p50_ms']:.0f} ms · model p50 {llm['model_p50_ms']:.0f} ms "
+        f"· {llm['retries']} retries · {llm['in_flight']} in flight"
+    )
+    return stream.text
+
+def show_context_report(report):
+    st.caption(
+        f"Context: {report['tokens']:,} tokens from {report['chunks']} chunks "
+        f"({report['merged']} merged, {report['duplicates']} duplicates dropped) — "
+        f"{report['tokens_saved']:,} tokens saved"
+    )
+
+def _build_answer_cache():
+    return AnswerCache(embed=get_embedding_service().embed_query)
+
+def get_answer_cache():
+    # Shared by every session, so one user's question answers the next user's for free
+    return resource("answer_cache", _build_answer_cache)
+
+def answer_question(question, docs, context, sources):
+    """Answer from the cache when the same (or a near-identical) question was asked over the same chunks"""
+    cache = get_answer_cache()
+    chunk_ids = [doc.metadata.get("chunk_id", doc.page_content) for doc in docs]
+
+    cached = cache.get(question, chunk_ids)
+    if cached is not None:
+        st.markdown(f"**Answer:** {cached['answer']}  \n\n**Sources:** {', '.join(sources)}")
+        st.caption(f"⚡ Answered from cache (asked before as “{cached['question']}”)")
+        return cached["answer"]
+
+    answer = show_streamed_answer(ask_openai_stream(question, context), sources)
+    cache.put(question, chunk_ids, answer, sources)
+    return answer
 
 # ----------------- CUSTOM CSS -----------------
 def add_custom_css():
@@ -249,31 +551,25 @@ def enhanced_question_interface():
 
 # Loading animations
 def show_loading_animation(text="Thinking and humming Hakuna Matata..."):
-    """Show professional loading animation"""
-    with st.spinner(text):
-        import time
-        time.sleep(0.5)  # Brief pause for better UX
+    """Spinner for a block of work: `with show_loading_animation("..."):` (no artificial delay)"""
+    return st.spinner(text)
 
 # Example usage:
-# show_loading_animation("Loading your data...")
+# with show_loading_animation("Loading your data..."):
+#     ...
 
 # ----------------- MAIN APP FUNCTION -----------------
 
 def main():
+    start_exporter()
     add_custom_css()
 
 
     st.title("📄 Petrisa's Soundtrack search engine 🎶")
+    # The title is on screen: models, index and converters load while the rest of the page renders
+    start_engines()
 
-    tab1, tab2, tab3 = st.tabs(["📁 Upload & Convert", "❓ Ask Questions", "📊 Doc Stats"])
-
-    if "doc" not in st.session_state:
-        st.session_state.doc = []
-
-    all_texts = []
-    for doc in st.session_state.doc:
-        with open(doc["path"], "r", encoding="utf-8") as f:
-            all_texts.append(f.read())
+    tab1, tab2, tab3, tab4 = st.tabs(["📁 Upload & Convert", "❓ Ask Questions", "📊 Doc Stats", "⚡ Performance"])
 
 # ----------------- TAB 1: Upload & Convert -----------------
 
@@ -286,42 +582,29 @@ def main():
     )
 
         if uploaded_files:
-            all_texts = []
-
-            for uploaded_file in uploaded_files:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=Path(uploaded_file.name).suffix) as tmp:
-                    tmp.write(uploaded_file.getvalue())
-                    tmp_path = tmp.name
-
-                with st.spinner(f"Converting {uploaded_file.name} to Markdown..."):
-                    try:
-                        md_text = convert_to_markdown(tmp_path)
-                        all_texts.append(md_text)
-                    except Exception as e:
-                        st.error(f"Error processing {uploaded_file.name}: {e}")
-
-            markdown_text = "\n\n".join(all_texts)
-            st.success(f"✅ {len(uploaded_files)} documents converted.")
-
-            # Track results for better UX
-            converted_docs = []
-            errors = []
-
-            for i, uploaded_file in enumerate(uploaded_files):
-                try:
-                    word_count = len(all_texts[i].split())
-                    converted_docs.append({
-                        "filename": uploaded_file.name,
-                        "word_count": word_count
-                    })
-                except Exception as e:
-                    errors.append(f"{uploaded_file.name}: {e}")
+            # Converting, splitting, embedding and indexing all happen in the background;
+            # this run only queues new files and shows how far each one got
+            queued = queue_uploads(uploaded_files)
+            tasks = [task for _, task in queued]
+            ready = [(uploaded_file, task) for uploaded_file, task in queued if task.stage == INDEXED]
+
+            uploaded_files = [uploaded_file for uploaded_file, _ in ready]
+            word_counts = [task.result["words"] for _, task in ready]
+            # Only the start of each document is kept for display; the full text never sits in memory
+            markdown_text = "\n\n".join(task.result["preview"] for _, task in ready)
+
+            if all(task.done for task in tasks):
+                show_ingest_table(tasks)
+            else:
+                st.info(f"⏳ Processing in the background: {len(ready)} of {len(tasks)} documents searchable so far.")
+                poll_ingest_status([task.task_id for task in tasks], len(ready))
 
             # Show conversion results
-            if converted_docs:
+            if ready:
                 st.write("### Result of markdown conversion:")
-                for doc in converted_docs:
-                    st.write(f"**{doc['filename']}**: {doc['word_count']} words")
+                for uploaded_file, word_count in zip(uploaded_files, word_counts):
+                    st.write(f"**{uploaded_file.name}**: {word_count} words")
+            errors = [f"{task.name}: {task.error}" for task in tasks if task.stage == FAILED]
             if errors:
                 st.error("Errors occurred during conversion:")
                 for err in errors:
@@ -330,23 +613,12 @@ def main():
             with st.expander("🔍 View raw Markdown"):
                 st.markdown(markdown_text)
 
-            with st.spinner("Splitting into chunks..."):
-                splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-                chunks = []
-                for i, text in enumerate(all_texts):
-                    split = splitter.create_documents([text])
-                    for chunk in split:
-                        chunk.metadata["source"] = uploaded_files[i].name
-                    chunks.extend(split)
-                st.success(f"✅ Split into {len(chunks)} chunks.")
-
-            with st.spinner("Embedding and indexing..."):
-                embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-                db = Chroma.from_documents(chunks, embedding=embeddings)
-                retriever = db.as_retriever()
+            if ready:
+                embed_stats = get_embedding_service().metrics()
+                st.caption(f"Embedded {embed_stats['texts']:,} chunks so far at {embed_stats['texts_per_second']:.0f} chunks/s")
+                st.success("✅ Ready to answer all of your questions!")
 
-            st.success("✅ Ready to answer all of your questions!")
-            st.session_state.retriever = retriever
+        show_document_library()
 
     def show_search_history():
         if "search_history" in st.session_state and st.session_state.search_history:
@@ -362,29 +634,49 @@ def main():
 # ----------------- TAB 2: Ask Questions -----------------
 
     with tab2:
-        if "retriever" not in st.session_state:
+        # Keeps this session's uploads from expiring while it is in use
+        get_document_index().touch(get_user_id())
+        # Built fresh each run from the shared index: sessions only differ in which documents they may see
+        visible = get_document_index().visible_documents(get_user_id())
+        # Nothing to search until this user has a document (the warning below says so)
+        rerank, retriever = False, None
+        if not visible:
             st.warning("Please upload documents first.")
         else:
-            retriever = st.session_state.retriever
+            rerank = st.toggle("🎯 Rerank with a cross-encoder (shorter, more relevant context)", value=RERANK_ENABLED)
+            # Reranking starts from a wider candidate set and keeps the best few that fit the token budget
+            retriever = get_document_index().as_retriever(visible, k=RERANK_CANDIDATES if rerank else 4)
         question, search_button, clear_button = enhanced_question_interface()
-    if search_button and question:
+    if search_button and question and retriever is not None:
         with st.spinner("Thinking and singing Hakuna Matata..."):
             docs = retriever.get_relevant_documents(question)
-            context = "\n\n".join([doc.page_content for doc in docs])
+            rerank_report = None
+            if rerank:
+                docs, rerank_report = resource("reranker", get_reranker).rerank(question, docs)
+                retriever.last_timings["rerank_ms"] = rerank_report["rerank_ms"]
+            # Neighbouring chunks merged, repeats dropped, capped at CONTEXT_TOKEN_BUDGET
+            context, docs, context_report = build_context(docs)
             sources = list({doc.metadata.get("source", "Unknown") for doc in docs})
 
-            answer = ask_openai(question, context)
+        answer = answer_question(question, docs, context, sources)
+        st.caption("Retrieval: " + " · ".join(
+            f"{stage.replace('_ms', '')} {ms:.0f} ms" for stage, ms in retriever.last_timings.items()
+        ))
+        if rerank_report:
+            st.caption(
+                f"Reranked {rerank_report['candidates']} candidates → kept {rerank_report['kept']} "
+                f"({rerank_report['tokens']:,} tokens, {rerank_report['tokens_dropped']:,} left out of the prompt)"
+            )
+        show_context_report(context_report)
 
-            if "search_history" not in st.session_state:
-                st.session_state.search_history = []
-
-            st.session_state.search_history.append({
-                "question": question,
-                "answer": answer,
-                "sources": sources
-            })
+        if "search_history" not in st.session_state:
+            st.session_state.search_history = []
 
-            st.markdown(f"**Answer:** {answer}  \n\n**Sources:** {', '.join(sources)}")
+        st.session_state.search_history.append({
+            "question": question,
+            "answer": answer,
+            "sources": sources
+        })
 
     if clear_button:
         st.session_state.search_history = []
@@ -395,96 +687,13 @@ def main():
     # ----------------- TAB 3: Document Stats -----------------
 
     with tab3:
-        show_document_stats(uploaded_files, all_texts)
+        # Uploads go through tab 1 only: one ingest path, one fingerprint per file
+        show_document_stats(get_document_index().visible_documents(get_user_id()))
 
-        uploaded_files = st.file_uploader(
-        "Upload documents (.pdf, .docx, .txt)",
-        type=["pdf", "doc", "docx", "txt"],
-        accept_multiple_files=True,
-        key="file_upload_tab3"
-    )
-
-    if uploaded_files:
-        all_texts = []
-
-        for uploaded_file in uploaded_files:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=Path(uploaded_file.name).suffix) as tmp:
-                tmp.write(uploaded_file.getvalue())
-                tmp_path = tmp.name
-
-            with st.spinner(f"Converting {uploaded_file.name} to Markdown..."):
-                try:
-                    md_text = convert_to_markdown(tmp_path)
-                    all_texts.append(md_text)
-                except Exception as e:
-                    st.error(f"Error processing {uploaded_file.name}: {e}")
-
-        markdown_text = "\n\n".join(all_texts)
-        st.success(f"✅ {len(uploaded_files)} documents converted.")
-
-        with st.expander("🔍 View raw Markdown"):
-            st.markdown(markdown_text)
-
-        # Chunk the document
-        with st.spinner("Splitting into chunks..."):
-            splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-            chunks = []
-            for i, text in enumerate(all_texts):
-                split = splitter.create_documents([text])
-                # Attach metadata to each chunk
-                for chunk in split:
-                    chunk.metadata["source"] = uploaded_files[i].name
-                chunks.extend(split)
-            st.success(f"✅ Split into {len(chunks)} chunks.")
-
-        # Embed and store chunks
-        with st.spinner("Embedding and indexing..."):
-            embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2") # this is a class and the same for each embedding!!
-            # do i need to calculate embeddings for my chunks??
-            db = Chroma.from_documents(chunks, embedding=embeddings) #poglej dokumentacijo funkcije
-            retriever = db.as_retriever()
-
-        # Load QA pipeline with gemma-2b.Q4_K_M.gguf model using llama-cpp-python
-
-        st.success("✅ Ready to answer questions!")
-
-        # Ask questions
-        if "search_history" not in st.session_state:
-            st.session_state.search_history = []
+    # ----------------- TAB 4: Performance -----------------
 
-        def show_search_history():
-            if st.session_state.search_history:
-                with st.expander("🕑 Search History"):
-                    for i, entry in enumerate(reversed(st.session_state.search_history)):
-                        st.markdown(f"**Q:** {entry['question']}")
-                        st.markdown(f"**A:** {entry['answer']}")
-                        st.markdown(f"**Sources:** {', '.join(entry['sources'])}")
-                        st.markdown("---")
-            else:
-                st.info("No search history yet.")
-
-        question = st.text_input("Ask a question about your document:")
-        if question:
-            with st.spinner("Thinking..."):
-                # Retrieve relevant context from the document
-                docs = retriever.get_relevant_documents(question)
-                context = "\n\n".join([doc.page_content for doc in docs])
-                sources = list({doc.metadata.get("source", "Unknown") for doc in docs})
-
-                # Use the OpenAI Chat API to answer the question
-                answer = ask_openai(question, context)
-
-                # Save to search history
-                st.session_state.search_history.append({
-                    "question": question,
-                    "answer": answer,
-                    "sources": sources
-                })
-
-                st.markdown(f"**Answer:** {answer}  \n\n**Sources:** {', '.join(sources)}")
-
-        #show_search_history()
-        #show_document_stats(uploaded_files, all_texts)
+    with tab4:
+        show_performance()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import metrics
+
+MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+TTL_SECONDS = float(os.environ.get("ANSWER_CACHE_TTL_SECONDS", "86400"))
+# Cosine similarity above which two questions over the same chunks count as the same question
+SIMILARITY = float(os.environ.get("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+def _cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+# ----------------- ANSWER CACHE -----------------
+class AnswerCache:
+    """
+    Answers keyed by the normalized question and the set of chunk ids the
+    retriever returned, so a cached answer is only reused when the LLM
+    would have seen exactly the same context. Chunk ids are derived from
+    their document's content, so adding or removing other documents
+    leaves these answers valid.
+
+    With `embed` set, a question that misses exactly is compared against
+    the other questions cached for the same chunks, and one that is close
+    enough (cosine >= similarity) reuses that answer too. Entries expire
+    after ttl_seconds and the least recently used go first past max_entries.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl_seconds: float = TTL_SECONDS,
+                 similarity: float = SIMILARITY, embed=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self.embed = embed
+        self._entries = OrderedDict()
+        self._scopes = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "near_hits": 0, "misses": 0}
+
+    @staticmethod
+    def _scope(chunk_ids) -> str:
+        blob = "\n".join(sorted(chunk_ids))
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _drop(self, key) -> None:
+        entry = self._entries.pop(key)
+        keys = self._scopes.get(entry["scope"])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._scopes[entry["scope"]]
+
+    def _alive(self, key, now) -> bool:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        if self.ttl_seconds and now - entry["created"] > self.ttl_seconds:
+            self._drop(key)
+            return False
+        return True
+
+    def get(self, question: str, chunk_ids):
+        """The cached {"answer", "sources", "question"} for this question and context, or None."""
+        normalized = normalize_question(question)
+        scope = self._scope(chunk_ids)
+        key = (scope, normalized)
+        now = time.time()
+
+        with self._lock:
+            if self._alive(key, now):
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                metrics.cache("answer", "hit")
+                return self._entries[key]["value"]
+            candidates = [k for k in self._scopes.get(scope, ()) if self._alive(k, now)]
+
+        if self.embed is not None and candidates:
+            vector = self.embed(normalized)
+            with self._lock:
+                best, best_score = None, self.similarity
+                for candidate in candidates:
+                    entry = self._entries.get(candidate)
+                    if entry is None or entry["vector"] is None:
+                        continue
+                    score = _cosine(vector, entry["vector"])
+                    if score >= best_score:
+                        best, best_score = candidate, score
+                if best is not None:
+                    self._entries.move_to_end(best)
+                    self._stats["near_hits"] += 1
+                    metrics.cache("answer", "near_hit")
+                    return self._entries[best]["value"]
+
+        with self._lock:
+            self._stats["misses"] += 1
+        metrics.cache("answer", "miss")
+        return None
+
+    def put(self, question: str, chunk_ids, answer: str, sources=()) -> None:
+        normalized = normalize_question(question)
+        scope = self._scope(chunk_ids)
+        key = (scope, normalized)
+        vector = self.embed(normalized) if self.embed is not None else None
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {
+                "scope": scope,
+                "created": time.time(),
+                "vector": vector,
+                "value": {"answer": answer, "sources": list(sources), "question": question},
+            }
+            self._scopes.setdefault(scope, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries))
+        lookups = stats["hits"] + stats["near_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["near_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -10,9 +10,15 @@ except ImportError:
     pass
 
 # IMPORTS - These are the libraries we need
+import hashlib                 # Fingerprints the documents so we know when they change
 import streamlit as st          # Creates web interface components
-import chromadb                # Stores and searches through documents  
-from transformers import pipeline  # AI model for generating answers
+from model_registry import get_generator  # Loads each AI model once per server, not per question
+from streaming import TimedStream, pipeline_tokens  # Shows the answer word by word as it is generated
+from context_builder import build_context  # Fits the found documents into what the model can read
+from metrics import metrics, start_exporter  # Times every step (export: METRICS_PORT / METRICS_JSONL)
+from startup import warm_up  # Loads the slow parts in the background once the page is showing
+# chromadb, langchain and transformers take seconds to import, so they are imported
+# inside the functions that use them: the page can show up before they are loaded
 
 # Custom CSS for button styling 
 st.markdown("""
@@ -31,17 +37,23 @@ st.markdown("""
 
 # 🎵 Your app starts here
 
+# Serve the timings to Prometheus on METRICS_PORT, if it is set (only once per server)
+start_exporter()
+
+# Folder where the document database is saved between runs
+CHROMA_PATH = ".cache/app_docs"
+
 def setup_documents():
     """
     This function creates our document database
-    NOTE: This runs every time someone uses the app
-    In a real app, you'd want to save this data permanently
+    NOTE: The database is saved in CHROMA_PATH and warm_up() runs this once
+    per server (in the background), and again when you edit this function,
+    so the documents are only embedded again when their text changes
     """
-    client = chromadb.Client()
-    try:
-        collection = client.get_collection(name="docs")
-    except Exception:
-        collection = client.create_collection(name="docs")
+    import chromadb  # Stores and searches through documents
+
+    client = chromadb.PersistentClient(path=CHROMA_PATH)
+    collection = client.get_or_create_collection(name="docs")
     
     # STUDENT TASK: Replace these 5 documents with your own!
     # Pick ONE topic: movies, sports, cooking, travel, technology
@@ -60,26 +72,48 @@ def setup_documents():
         "Soundtrack 5: Underrated Soundtracks That Deserve More Attention: While blockbuster films like Star Wars or Inception dominate the spotlight, many excellent soundtracks fly under the radar. These scores may come from indie films, international cinema, or overlooked genres, yet they offer rich musical experiences worth exploring. One such gem is The Assassination of Jesse James by the Coward Robert Ford (2007), composed by Nick Cave and Warren Ellis. Its sparse, haunting piano melodies perfectly match the film’s slow-burn aesthetic. Another is Moonlight (2016), where Nicholas Britell’s score blends classical elements with chopped-and-screwed hip-hop textures, mirroring the protagonist’s identity struggles. Animated films also produce underrated work. Joe Hisaishi’s collaborations with Studio Ghibli, like Princess Mononoke or Spirited Away, feature sweeping, emotional scores that rival any Hollywood production. Similarly, Her (2013), scored by Arcade Fire, uses ambient textures to explore human-technology relationships. Exploring lesser-known soundtracks broadens our appreciation of film music and highlights composers who innovate outside the mainstream. Whether you're a casual listener or soundtrack enthusiast, these scores offer something fresh and emotionally powerful."
     ]
     
+    my_ids = ["soundtrack1", "soundtrack2", "soundtrack3", "soundtrack4", "soundtrack5"]
+
+    # Fingerprint of the documents: it only changes when you edit them
+    seed_version = hashlib.sha256("\n".join(my_ids + my_documents).encode("utf-8")).hexdigest()
+
+    # Already saved with exactly these documents? Then there is nothing to embed
+    metadata = collection.metadata or {}
+    if metadata.get("seed_version") == seed_version and collection.count() == len(my_ids):
+        return collection
+
+    # Documents changed: remove the old ones and add the new ones
+    old_ids = collection.get(include=[])["ids"]
+    if old_ids:
+        collection.delete(ids=old_ids)
+
     # Add documents to database with unique IDs
     # ChromaDB needs unique identifiers for each document
     collection.add(
         documents=my_documents,
-        ids=["soundtrack1", "soundtrack2", "soundtrack3", "soundtrack4", "soundtrack5"]
+        ids=my_ids
     )
+    collection.modify(metadata={"seed_version": seed_version})
     
     return collection
 
-def get_answer(collection, question):
+# flan-t5-small reads at most 512 tokens: leave room for the question and instructions
+CONTEXT_TOKEN_BUDGET = 400
+
+def get_answer(collection, question, stream=False):
     """
     This function searches documents and generates answers while minimizing hallucination
+    With stream=True it returns a TimedStream of answer pieces for st.write_stream
+    It also returns a report of the context tokens used (None if nothing relevant was found)
     """
     
     # STEP 1: Search for relevant documents in the database
     # We get 3 documents instead of 2 for better context coverage
-    results = collection.query(
-        query_texts=[question],    # The user's question
-        n_results=3               # Get 3 most similar documents
-    )
+    with metrics.span("search"):
+        results = collection.query(
+            query_texts=[question],    # The user's question
+            n_results=3               # Get 3 most similar documents
+        )
     
     # STEP 2: Extract search results
     # docs = the actual document text content
@@ -91,12 +125,25 @@ def get_answer(collection, question):
     # If no documents found OR all documents are too different from question
     # Return early to avoid hallucination
     if not docs or min(distances) > 1.5:  # 1.5 is similarity threshold - adjust as needed
-        return "I don't have information about that topic in my documents."
+        no_answer = "I don't have information about that topic in my documents."
+        return (TimedStream(iter([no_answer])) if stream else no_answer), None
     
     # STEP 4: Create structured context for the AI model
     # Format each document clearly with labels
     # This helps the AI understand document boundaries
-    context = "\n\n".join([f"Document {i+1}: {doc}" for i, doc in enumerate(docs)])
+    # Repeated text is dropped and the documents are cut to what the model can read,
+    # counted with the model's own tokenizer
+    # The model is loaded in the background when the page opens and reused for every question
+    from langchain_core.documents import Document
+
+    ai_model = get_generator("text2text-generation", "google/flan-t5-small")
+    with metrics.span("context"):
+        context, _, context_report = build_context(
+            [Document(page_content=doc, metadata={"source": doc_id}) for doc, doc_id in zip(docs, results["ids"][0])],
+            token_budget=CONTEXT_TOKEN_BUDGET,
+            template="Document {n}: {text}",
+            count=lambda text: len(ai_model.tokenizer.encode(text, add_special_tokens=False)),
+        )
     
     # STEP 5: Build improved prompt to reduce hallucination
     # Key changes from original:
@@ -113,11 +160,14 @@ Instructions: Answer ONLY using the information provided above. If the answer is
 Answer:"""
     
     # STEP 6: Generate answer with anti-hallucination parameters
-    ai_model = pipeline("text2text-generation", model="google/flan-t5-small")
-    response = ai_model(
-        prompt, 
-        max_length=150
-    )
+    if stream:
+        # Hand back the words as the model writes them so the answer starts appearing right away
+        return TimedStream(pipeline_tokens(ai_model, prompt, max_length=150)), context_report
+    with metrics.span("generate"):
+        response = ai_model(
+            prompt, 
+            max_length=150
+        )
     
     # STEP 7: Extract and clean the generated answer
     answer = response[0]['generated_text'].strip()
@@ -125,7 +175,7 @@ Answer:"""
 
     
     # STEP 8: Return the final answer
-    return answer
+    return answer, context_report
 
 # MAIN APP STARTS HERE - This is where we build the user interface
 
@@ -146,9 +196,11 @@ st.write("Welcome to my curated hub for all things soundtrack-related! Dive into
 # This text appears below the title and gives context to the app
 
 # STREAMLIT BUILDING BLOCK 3: FUNCTION CALLS
-# We call our function to set up the document database
-# This happens every time someone uses the app
-collection = setup_documents()
+# We start setting up the document database and the AI model in the background,
+# so the rest of the page shows up right away (this only happens once per server)
+# The first run embeds the documents; every later run reuses the saved copy
+documents_ready = warm_up("app_documents", setup_documents)
+warm_up("flan_t5_small", lambda: get_generator("text2text-generation", "google/flan-t5-small"))
 
 # STREAMLIT BUILDING BLOCK 4: TEXT INPUT BOX
 # st.text_input() creates a box where users can type
@@ -177,15 +229,23 @@ if st.button("🔍 Reveal the Music Magic", type="primary"):
         # - Everything inside the 'with' block runs while spinner shows
         # - Spinner disappears when the code finishes
         with st.spinner("Thinking and humming Hakuna matata..."):
-            answer = get_answer(collection, question)
+            # Waits here only if the database is still being set up
+            collection = documents_ready.result()
+            answer, context_report = get_answer(collection, question, stream=True)
         
         # STREAMLIT BUILDING BLOCK 8: FORMATTED TEXT OUTPUT
         # st.write() can display different types of content
         # - **text** makes text bold (markdown formatting)
         # - First st.write() shows "Answer:" in bold
-        # - Second st.write() shows the actual answer
+        # - st.write_stream() shows the actual answer word by word as it is generated
         st.write("**Answer:**")
-        st.write(answer)
+        st.write_stream(answer)
+        # Streamed answers are generated while they are shown, so they are timed here
+        metrics.observe("stage_seconds", answer.total, stage="generate", mode="stream", status="ok")
+        if answer.ttft is not None:
+            st.caption(f"First words after {answer.ttft * 1000:.0f} ms")
+        if context_report:
+            st.caption(f"Context: {context_report['tokens']} tokens ({context_report['tokens_saved']} saved)")
     
     else:
         # STREAMLIT BUILDING BLOCK 9: SIMPLE MESSAGE
@@ -258,8 +318,8 @@ HOW THE APP FLOW WORKS:
 ======================
 
 1. User opens browser → Streamlit loads the app
-2. setup_documents() runs → Creates document database
-3. st.title() and st.write() → Display app header
+2. st.title() and st.write() → Display app header
+3. setup_documents() starts in the background → Opens the saved document database (embeds it only the first time)
 4. st.text_input() → Shows input box for questions  
 5. st.button() → Shows the "Get Answer" button
 6. User types question and clicks button:
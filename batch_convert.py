@@ -0,0 +1,226 @@
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+
+# Resident memory one conversion worker needs with docling's models loaded: caps the default worker count
+WORKER_MEMORY_MB = int(os.environ.get("CONVERT_WORKER_MEMORY_MB", "1500"))
+
+
+@dataclass
+class BatchResult:
+    path: str
+    markdown: str = None
+    error: str = None
+    seconds: float = 0.0
+    attempts: int = 1
+    worker_pid: int = 0
+    pages: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def default_workers() -> int:
+    """One worker per core, but no more than the available memory can hold (WORKER_MEMORY_MB each)."""
+    workers = os.cpu_count() or 1
+    try:
+        import psutil
+    except ImportError:
+        return workers
+    return max(1, min(workers, psutil.virtual_memory().available // (WORKER_MEMORY_MB * 2 ** 20)))
+
+
+def threads_per_worker(workers: int) -> int:
+    """Split the machine's cores between workers instead of every worker asking for 4."""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+# ----------------- WORKER PROCESS -----------------
+def _init_worker(num_threads: int, warm: bool) -> None:
+    # Must be set before torch is imported, otherwise every worker spins up all cores
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    if warm:
+        from converter import warm_converters
+        warm_converters(extensions=(".pdf",), num_threads=num_threads)
+
+
+def _convert_one(path: str, do_ocr: bool, num_threads: int, use_cache: bool):
+    from converter import convert_to_markdown, count_pages
+
+    start = time.perf_counter()
+    pages = 0
+    try:
+        markdown = convert_to_markdown(path, do_ocr=do_ocr, num_threads=num_threads, use_cache=use_cache)
+        error = None
+    except Exception as e:
+        # Docling exceptions don't always pickle, so only the message crosses back
+        markdown, error = None, f"{type(e).__name__}: {e}"
+    else:
+        try:
+            pages = count_pages(path)
+        except Exception:
+            # Page counts only feed throughput reporting, never fail a file over them
+            pass
+    return markdown, error, time.perf_counter() - start, os.getpid(), pages
+
+
+# ----------------- WORKER POOL -----------------
+_pool = None
+_pool_key = None
+_pool_batches = Counter()  # pool -> batches still submitting to it
+_retired = set()  # replaced pools, shut down when their last batch ends
+_pool_lock = threading.RLock()  # get_pool is also called with it held (_acquire_pool)
+
+
+def _retire(pool) -> None:
+    """Shut down a replaced pool now if no batch is using it, else once the last one is done (_release_pool)."""
+    if _pool_batches[pool]:
+        _retired.add(pool)
+    else:
+        pool.shutdown(wait=False)
+
+
+def get_pool(workers: int, num_threads: int, warm: bool = True) -> ProcessPoolExecutor:
+    """
+    The process-wide pool of conversion workers, kept between batches so
+    docling is loaded once per worker rather than once per batch. Asking
+    for different settings replaces it; a batch still running on the old
+    pool keeps it until that batch is done, then its workers exit.
+    """
+    global _pool, _pool_key
+    key = (workers, num_threads, warm)
+    with _pool_lock:
+        if _pool is not None and _pool_key == key and not getattr(_pool, "_broken", False):
+            return _pool
+        if _pool is not None:
+            _retire(_pool)
+        # docling/torch are not fork-safe once initialized, so workers always start clean.
+        # Workers are only spawned as work arrives, so a small batch starts few of them
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(num_threads, warm),
+        )
+        _pool_key = key
+        return _pool
+
+
+def _acquire_pool(workers: int, num_threads: int, warm: bool) -> ProcessPoolExecutor:
+    """get_pool for a batch: the pool stays up until the batch hands it back with _release_pool."""
+    with _pool_lock:
+        pool = get_pool(workers, num_threads, warm)
+        _pool_batches[pool] += 1
+        return pool
+
+
+def _release_pool(pool) -> None:
+    with _pool_lock:
+        _pool_batches[pool] -= 1
+        if _pool_batches[pool] <= 0:
+            del _pool_batches[pool]
+            if pool in _retired:
+                _retired.discard(pool)
+                pool.shutdown(wait=False)
+
+
+def shutdown_pool() -> None:
+    """Stop the worker pools (at interpreter exit, or to free their memory)."""
+    global _pool, _pool_key
+    with _pool_lock:
+        for pool in _retired | ({_pool} if _pool is not None else set()):
+            pool.shutdown(wait=True, cancel_futures=True)
+        _retired.clear()
+        _pool = _pool_key = None
+
+
+atexit.register(shutdown_pool)
+
+
+# ----------------- BATCH ENGINE -----------------
+def convert_batch(paths, workers: int = None, do_ocr: bool = False, num_threads: int = None,
+                  retries: int = 1, use_cache: bool = True, warm: bool = True):
+    """
+    Convert `paths` on the shared worker pool (see get_pool) and yield a
+    BatchResult for each file as soon as it finishes (not in input order).
+    A failed file is resubmitted up to `retries` times before its failure
+    is reported.
+    """
+    paths = list(paths)
+    workers = workers or default_workers()
+    num_threads = num_threads or threads_per_worker(workers)
+
+    pool = _acquire_pool(workers, num_threads, warm)
+    attempts = {path: 0 for path in paths}
+    pending = {}
+
+    def submit(path):
+        attempts[path] += 1
+        pending[pool.submit(_convert_one, path, do_ocr, num_threads, use_cache)] = path
+
+    try:
+        for path in paths:
+            try:
+                submit(path)
+            except Exception as e:
+                # A worker died and broke the pool: report the file instead of ending the batch
+                yield BatchResult(path, None, f"{type(e).__name__}: {e}", 0.0, attempts[path])
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    markdown, error, seconds, pid, pages = future.result()
+                except Exception as e:
+                    # The worker itself died (e.g. out of memory)
+                    markdown, error, seconds, pid, pages = None, f"{type(e).__name__}: {e}", 0.0, 0, 0
+
+                if error and attempts[path] <= retries:
+                    try:
+                        submit(path)
+                        continue
+                    except Exception:
+                        # Pool is broken, so report the failure instead of retrying
+                        pass
+
+                yield BatchResult(path, markdown, error, seconds, attempts[path], pid, pages)
+    finally:
+        # Abandoned part way (e.g. a Streamlit rerun): drop this batch's queued files, keep the pool
+        for future in pending:
+            future.cancel()
+        _release_pool(pool)
+
+
+def markdown_name(name: str, taken: set = None) -> str:
+    """
+    Where a source file's Markdown goes, relative to the output folder:
+    its relative path with .md added (reports/a.pdf -> reports/a.pdf.md),
+    so a.pdf and a.docx, or a/report.pdf and b/report.pdf, never share an
+    output. `taken` holds the names already used in this batch: a second
+    file with the same name is numbered ("a (2).pdf.md") and every name
+    handed out is added to it.
+    """
+    path = Path(name)
+    candidate, copy = f"{path.as_posix()}.md", 1
+    while taken is not None and candidate in taken:
+        copy += 1
+        candidate = path.with_name(f"{path.stem} ({copy}){path.suffix}").as_posix() + ".md"
+    if taken is not None:
+        taken.add(candidate)
+    return candidate
+
+
+def write_markdown(out_folder, name: str, markdown: str, taken: set = None) -> Path:
+    """Save converted Markdown in out_folder under markdown_name(name, taken), creating subfolders as needed."""
+    out_file = Path(out_folder) / markdown_name(name, taken)
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    out_file.write_text(markdown, encoding="utf-8", errors="replace")
+    return out_file
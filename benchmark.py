@@ -0,0 +1,404 @@
+"""
+Throughput, latency and memory of the whole ingest and query pipeline,
+offline and repeatable.
+
+    python benchmark.py                                   # default corpus, results in pipeline_benchmark.json
+    python benchmark.py --pages 1 10 50 --types pdf txt   # pick the corpus
+    python benchmark.py --save-baseline                   # store this run as the baseline
+    CHUNK_TARGET_TOKENS=300 python benchmark.py           # ...then compare a change against it
+
+A synthetic corpus (PDF, DOCX and TXT at each page count, generated from a
+fixed seed so every run sees the same text) is converted with
+convert_to_markdown (cache off), chunked, embedded and indexed into a
+throwaway index, timing each stage and the peak RSS while it runs. Then
+questions taken from the corpus are retrieved with hybrid_search and
+answered through the LLM gateway against fake_openai.py, so nothing leaves
+the machine and answer latency is the gateway's own overhead plus the
+simulated model.
+
+Every number lands in one flat {name: value} map. Names ending in _per_s
+are better higher; _ms, _seconds and _mb are better lower. With a baseline
+file present, each is compared to it and any that got worse by more than
+--tolerance is reported as a regression (exit status 1, for CI). The
+baseline only means something on the machine that recorded it, so
+pipeline_baseline.json is git-ignored: keep it next to the checkout, or
+in CI cache it between runs of the same runner type. Settings
+that change results (chunk sizes, embedding batch size, converter
+options, vector store) are saved with the run; regressions between runs
+with different settings are expected.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from context_builder import build_context
+from converter import convert_to_markdown, converter_settings, warm_converters
+from doc_index import VECTOR_STORE, DocumentIndex, fingerprint
+from embedding_service import BATCH_SIZE as EMBED_BATCH_SIZE, get_embedding_service
+from fake_openai import serve as serve_fake_openai
+from llm_gateway import LLMGateway
+from markdown_chunker import CHUNK_SETTINGS, MarkdownChunker
+from metrics import metrics
+from streaming import TimedStream
+
+# Roughly what a page of running text holds
+WORDS_PER_PAGE = 350
+_PDF_LINES_PER_PAGE = 48
+_PDF_LINE_CHARS = 90
+_VOCABULARY = (
+    "soundtrack score theme orchestra composer strings brass choir melody motif tempo harmony rhythm "
+    "cue scene film studio recording session conductor piano synth percussion chorus verse bridge "
+    "minor major chord key note bar album release award premiere director sequel trilogy opening "
+    "credits suite overture finale ballad anthem remix soprano tenor violin cello horn timpani"
+).split()
+
+
+# ----------------- SYNTHETIC CORPUS -----------------
+def synthetic_sections(pages: int, seed: int):
+    """(heading, [paragraph, ...]) pairs, about WORDS_PER_PAGE words per page, the same for the same seed."""
+    rng = random.Random(seed)
+    sections, words = [], 0
+    while words < pages * WORDS_PER_PAGE:
+        heading = " ".join(rng.choice(_VOCABULARY) for _ in range(3)).title()
+        paragraphs = []
+        for _ in range(rng.randint(2, 5)):
+            sentences = []
+            for _ in range(rng.randint(3, 7)):
+                sentence = [rng.choice(_VOCABULARY) for _ in range(rng.randint(8, 18))]
+                sentences.append(" ".join(sentence).capitalize() + ".")
+            paragraph = " ".join(sentences)
+            paragraphs.append(paragraph)
+            words += len(paragraph.split())
+        sections.append((heading, paragraphs))
+    return sections
+
+
+def _wrap(text: str, width: int):
+    line = ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            yield line
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        yield line
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: Path, sections) -> None:
+    """A plain text-layer PDF (Helvetica, one content stream per page), written by hand."""
+    lines = []
+    for heading, paragraphs in sections:
+        lines.append(heading)
+        for paragraph in paragraphs:
+            lines.extend(_wrap(paragraph, _PDF_LINE_CHARS))
+            lines.append("")
+    pages = [lines[i:i + _PDF_LINES_PER_PAGE] for i in range(0, len(lines), _PDF_LINES_PER_PAGE)] or [[]]
+
+    # Objects 1-3: catalog, page tree, font; then a page and its content stream per page
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page_lines in pages:
+        text = "".join(f"({_pdf_escape(line)}) Tj T*\n" for line in page_lines)
+        stream = f"BT /F1 10 Tf 14 TL 60 760 Td\n{text}ET".encode("latin-1")
+        content_number = len(objects) + 2
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+            f"/Contents {content_number} 0 R >>".encode("latin-1")
+        )
+        kids.append(f"{len(objects)} 0 R")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode("latin-1")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+
+
+def write_docx(path: Path, sections) -> None:
+    import docx
+
+    document = docx.Document()
+    for heading, paragraphs in sections:
+        document.add_heading(heading, level=2)
+        for paragraph in paragraphs:
+            document.add_paragraph(paragraph)
+    document.save(str(path))
+
+
+def write_txt(path: Path, sections) -> None:
+    path.write_text(
+        "\n\n".join(heading + "\n\n" + "\n\n".join(paragraphs) for heading, paragraphs in sections),
+        encoding="utf-8",
+    )
+
+
+_WRITERS = {"pdf": write_pdf, "docx": write_docx, "txt": write_txt}
+
+
+def build_corpus(directory: Path, types, page_counts, seed: int = 0):
+    """
+    Write one file per (type, page count); returns [(label, path, pages)].
+    Pages are nominal (WORDS_PER_PAGE words each) in every format, however
+    the PDF happens to lay them out, so pages_per_s compares formats on
+    the same amount of text.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    corpus = []
+    for pages in page_counts:
+        # Same text in every format, so formats compare like for like
+        sections = synthetic_sections(pages, seed + pages)
+        for file_type in types:
+            path = directory / f"bench-{pages}p-{seed}.{file_type}"
+            _WRITERS[file_type](path, sections)
+            corpus.append((f"{file_type}.{pages}p", path, pages))
+    return corpus
+
+
+# ----------------- MEASUREMENT -----------------
+class PeakMemory:
+    """Peak resident memory of this process while the block runs, sampled every few milliseconds."""
+
+    def __init__(self, interval: float = 0.005):
+        import psutil
+
+        self._process = psutil.Process()
+        self._interval = interval
+        self.start_mb = self.peak_mb = 0.0
+
+    def _sample(self):
+        while not self._stop.wait(self._interval):
+            self.peak_mb = max(self.peak_mb, self._process.memory_info().rss / 2 ** 20)
+
+    def __enter__(self):
+        self.start_mb = self.peak_mb = self._process.memory_info().rss / 2 ** 20
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, self._process.memory_info().rss / 2 ** 20)
+
+    @property
+    def growth_mb(self) -> float:
+        return self.peak_mb - self.start_mb
+
+
+def _percentile_ms(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return round(1000 * ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+
+def bench_ingest(corpus, index, results: dict):
+    """Convert, chunk, embed and index every file; returns {doc_hash: sentences} for the query stage."""
+    embedding = get_embedding_service()
+    documents = {}
+    for label, path, pages in corpus:
+        size = path.stat().st_size
+
+        with PeakMemory() as memory:
+            start = time.perf_counter()
+            markdown = convert_to_markdown(str(path), use_cache=False)
+            seconds = time.perf_counter() - start
+        results[f"convert.{label}.seconds"] = round(seconds, 4)
+        results[f"convert.{label}.pages_per_s"] = round(pages / seconds, 2)
+        results[f"convert.{label}.mb_per_s"] = round(size / 2 ** 20 / seconds, 3)
+        results[f"convert.{label}.peak_growth_mb"] = round(memory.growth_mb, 1)
+
+        start = time.perf_counter()
+        chunks = MarkdownChunker().create_documents([markdown], [{"source": path.name}])
+        seconds = time.perf_counter() - start
+        results[f"chunk.{label}.chunks_per_s"] = round(len(chunks) / seconds, 1)
+        results[f"chunk.{label}.words_per_s"] = round(len(markdown.split()) / seconds, 1)
+
+        with PeakMemory() as memory:
+            start = time.perf_counter()
+            embeddings = embedding.embed_documents([chunk.page_content for chunk in chunks])
+            seconds = time.perf_counter() - start
+        results[f"embed.{label}.chunks_per_s"] = round(len(chunks) / seconds, 1)
+        results[f"embed.{label}.peak_growth_mb"] = round(memory.growth_mb, 1)
+
+        doc_hash = fingerprint(markdown, salt=label)
+        start = time.perf_counter()
+        index.add_embedded(doc_hash, path.name, chunks, embeddings)
+        seconds = time.perf_counter() - start
+        results[f"index.{label}.chunks_per_s"] = round(len(chunks) / seconds, 1)
+        results[f"index.{label}.chunks"] = len(chunks)
+
+        documents[doc_hash] = [sentence.strip() for sentence in markdown.split(".") if len(sentence.split()) > 6]
+    return documents
+
+
+def bench_queries(index, documents, gateway, queries: int, k: int, seed: int, results: dict):
+    rng = random.Random(seed)
+    doc_hashes = list(documents)
+    # Half a sentence from the corpus: a question with a known, but not verbatim, answer
+    questions = []
+    for _ in range(queries):
+        words = rng.choice(documents[rng.choice(doc_hashes)]).split()
+        questions.append("What does the text say about " + " ".join(words[: len(words) // 2]) + "?")
+
+    retrieve, complete, stream_total, ttft = [], [], [], []
+    for question in questions:
+        start = time.perf_counter()
+        docs, _ = index.hybrid_search(question, doc_hashes, k=k)
+        retrieve.append(time.perf_counter() - start)
+
+        context, docs, _ = build_context(docs)
+        request = dict(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": f"Context: {context}\n\nQuestion: {question}"}],
+            max_tokens=200,
+        )
+        start = time.perf_counter()
+        gateway.complete(**request)
+        complete.append(time.perf_counter() - start)
+
+        stream = TimedStream(gateway.stream(**request))
+        for _ in stream:
+            pass
+        stream_total.append(stream.total)
+        ttft.append(stream.ttft or stream.total)
+
+    for name, samples in (("retrieve", retrieve), ("answer", complete), ("answer_stream", stream_total),
+                          ("first_token", ttft)):
+        results[f"query.{name}.p50_ms"] = _percentile_ms(samples, 0.5)
+        results[f"query.{name}.p95_ms"] = _percentile_ms(samples, 0.95)
+    results["query.retrieve.queries_per_s"] = round(len(retrieve) / sum(retrieve), 2)
+
+
+# ----------------- BASELINE COMPARISON -----------------
+def _higher_is_better(name: str) -> bool:
+    return name.endswith("_per_s")
+
+
+def _comparable(name: str) -> bool:
+    return name.endswith(("_per_s", "_ms", "_seconds", "_mb"))
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """[(name, baseline, now, change)] for every shared metric, and the names that regressed past tolerance."""
+    rows, regressions = [], []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if not _comparable(name) or not old:
+            continue
+        change = (value - old) / old
+        rows.append((name, old, value, change))
+        worse = -change if _higher_is_better(name) else change
+        if worse > tolerance:
+            regressions.append(name)
+    return rows, regressions
+
+
+def run_settings(args) -> dict:
+    """Everything besides the code that moves the numbers, saved next to them."""
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "types": args.types,
+        "pages": args.pages,
+        "seed": args.seed,
+        "queries": args.queries,
+        "k": args.k,
+        "llm_latency": args.llm_latency,
+        "llm_token_delay": args.llm_token_delay,
+        "chunking": CHUNK_SETTINGS,
+        "embed_batch_size": EMBED_BATCH_SIZE,
+        "vector_store": VECTOR_STORE,
+        "converter": {f".{t}": converter_settings(f".{t}") for t in args.types},
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ingest and query throughput, latency and memory.")
+    parser.add_argument("--types", nargs="+", default=["pdf", "docx", "txt"], choices=sorted(_WRITERS))
+    parser.add_argument("--pages", nargs="+", type=int, default=[1, 10, 50], help="corpus file sizes, in pages")
+    parser.add_argument("--corpus-dir", default=".cache/bench_corpus", help="where the generated files are kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("-k", type=int, default=4, help="chunks retrieved per question")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="fake model's seconds before answering")
+    parser.add_argument("--llm-token-delay", type=float, default=0.002, help="fake model's seconds per streamed word")
+    parser.add_argument("--out", default="pipeline_benchmark.json")
+    parser.add_argument("--baseline", default="pipeline_baseline.json", help="results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="relative slowdown reported as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    corpus = build_corpus(Path(args.corpus_dir), args.types, args.pages, args.seed)
+    results = {}
+
+    start = time.perf_counter()
+    warm_converters(tuple(f".{t}" for t in args.types if t != "txt"))
+    get_embedding_service().load()
+    results["startup.warm_seconds"] = round(time.perf_counter() - start, 2)
+
+    server, base_url = serve_fake_openai(latency=args.llm_latency, token_delay=args.llm_token_delay)
+    gateway = LLMGateway(api_key="benchmark", base_url=base_url, tokens_per_minute=0)
+    try:
+        with tempfile.TemporaryDirectory() as index_dir, PeakMemory() as memory:
+            index = DocumentIndex(get_embedding_service(), persist_directory=index_dir,
+                                  collection_name="benchmark")
+            documents = bench_ingest(corpus, index, results)
+            bench_queries(index, documents, gateway, args.queries, args.k, args.seed, results)
+        results["process.peak_rss_mb"] = round(memory.peak_mb, 1)
+    finally:
+        gateway.close()
+        server.shutdown()
+
+    run = {"created": time.time(), "settings": run_settings(args), "results": results,
+           "stages": metrics.snapshot()["histograms"]}
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2)
+    print(f"Saved {args.out}")
+
+    regressions = []
+    if Path(args.baseline).exists() and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["settings"] != run["settings"]:
+            print("Note: the baseline was run with different settings; differences may be expected.")
+        rows, regressions = compare(results, baseline["results"], args.tolerance)
+        for name, old, value, change in rows:
+            flag = "  REGRESSION" if name in regressions else ""
+            print(f"{name:48} {old:>12} -> {value:>12}  {change:+7.1%}{flag}")
+    else:
+        for name, value in results.items():
+            print(f"{name:48} {value:>12}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+        print(f"Saved baseline {args.baseline}")
+    if regressions:
+        raise SystemExit(f"{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Recall vs. latency of Chroma's HNSW index against exact search.
+
+    python benchmark_ann.py                          # chunks already in .cache/chroma
+    python benchmark_ann.py --synthetic 200000       # clustered random vectors instead
+    python benchmark_ann.py --configs 16,100,50 32,200,100 48,400,200
+    python benchmark_ann.py --stores int8 float16    # compact mmap stores (VECTOR_STORE)
+
+Each config is "M,ef_construction,ef_search". For every config the vectors
+are loaded into a fresh in-memory collection, then the same queries are
+run through it and through a NumPy brute-force scan; recall@k is the share
+of the exact top-k that HNSW also returned. Pick the cheapest config whose
+recall is acceptable and set HNSW_M / HNSW_EF_CONSTRUCTION / HNSW_EF_SEARCH.
+The mmap stores are exact scans over quantized vectors, so their recall
+shows what quantization alone costs.
+"""
+import argparse
+import json
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from doc_index import DEFAULT_INDEX_DIR
+from mmap_store import MmapVectorStore
+
+_ADD_BATCH = 5000
+
+
+def load_index_vectors(index_dir, collection_name: str = "documents"):
+    client = chromadb.PersistentClient(path=str(index_dir))
+    collection = client.get_collection(collection_name)
+    vectors, offset = [], 0
+    while True:
+        page = collection.get(include=["embeddings"], limit=_ADD_BATCH, offset=offset)
+        if len(page["ids"]) == 0:
+            break
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    return np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+
+def synthetic_vectors(count: int, dim: int, seed: int = 0):
+    """Clustered vectors, closer to real embeddings than uniform noise (which is ANN's worst case)."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, count // 500), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)] + 0.3 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors, queries, k: int):
+    """Brute-force l2 top-k for every query, and the per-query latency of doing it."""
+    norms = (vectors ** 2).sum(axis=1)
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        distances = norms - 2 * vectors @ query
+        top = np.argpartition(distances, k)[:k]
+        top = top[np.argsort(distances[top])]
+        latencies.append(time.perf_counter() - start)
+        results.append(set(top.tolist()))
+    return results, latencies
+
+
+def percentile_ms(latencies, q):
+    return round(1000 * float(np.percentile(latencies, q)), 3)
+
+
+def bench_config(vectors, queries, truth, k: int, m: int, ef_construction: int, ef_search: int):
+    client = chromadb.EphemeralClient()
+    name = f"bench_{m}_{ef_construction}_{ef_search}"
+    collection = client.create_collection(name, metadata={
+        "hnsw:space": "l2",
+        "hnsw:M": m,
+        "hnsw:construction_ef": ef_construction,
+        "hnsw:search_ef": ef_search,
+    })
+
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), _ADD_BATCH):
+        batch = vectors[offset:offset + _ADD_BATCH]
+        collection.add(ids=[str(i) for i in range(offset, offset + len(batch))], embeddings=batch.tolist())
+    build_seconds = time.perf_counter() - start
+
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(expected & {int(i) for i in found["ids"][0]}) / k)
+
+    client.delete_collection(name)
+    return {
+        "index": "hnsw",
+        "M": m,
+        "ef_construction": ef_construction,
+        "ef_search": ef_search,
+        "build_seconds": round(build_seconds, 2),
+        f"recall@{k}": round(float(np.mean(recalls)), 4),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+    }
+
+
+def bench_mmap(vectors, queries, truth, k: int, dtype: str):
+    with tempfile.TemporaryDirectory() as directory:
+        store = MmapVectorStore(directory, dtype=dtype)
+        # Segment name -> index of its first vector, to map (segment, row) hits back
+        first_row = {}
+        start = time.perf_counter()
+        for offset in range(0, len(vectors), _ADD_BATCH):
+            batch = vectors[offset:offset + _ADD_BATCH]
+            ids = [f"bench:{i}" for i in range(offset, offset + len(batch))]
+            first_row[store.upsert(ids, batch, [{"doc_hash": "bench"}] * len(batch), [""] * len(batch))] = offset
+        build_seconds = time.perf_counter() - start
+
+        latencies, recalls = [], []
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            found = store.search(query, k)
+            latencies.append(time.perf_counter() - start)
+            recalls.append(len(expected & {first_row[name] + row for name, row, _ in found}) / k)
+
+    bytes_per_vector = vectors.shape[1] * (1 if dtype == "int8" else 2) + (4 if dtype == "int8" else 0)
+    return {
+        "index": f"mmap-{dtype}",
+        "bytes_per_vector": bytes_per_vector,
+        "build_seconds": round(build_seconds, 2),
+        f"recall@{k}": round(float(np.mean(recalls)), 4),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark HNSW settings against exact search.")
+    parser.add_argument("--index-dir", default=str(DEFAULT_INDEX_DIR), help="persisted Chroma directory to read chunks from")
+    parser.add_argument("--synthetic", type=int, default=0, help="use this many synthetic vectors instead")
+    parser.add_argument("--dim", type=int, default=384, help="synthetic vector size (all-MiniLM-L6-v2: 384)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=4, help="results per query (the retriever's k)")
+    parser.add_argument("--configs", nargs="+", default=["16,100,10", "16,100,50", "16,100,100", "32,200,100"],
+                        help="M,ef_construction,ef_search triples")
+    parser.add_argument("--stores", nargs="*", default=["int8", "float16"], choices=["int8", "float16"],
+                        help="compact mmap stores to compare as well")
+    parser.add_argument("--out", default="ann_benchmark.json")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim)
+    else:
+        vectors = load_index_vectors(args.index_dir)
+    if len(vectors) <= args.k:
+        raise SystemExit("Not enough vectors to benchmark; index some documents or pass --synthetic N.")
+
+    rng = np.random.default_rng(1)
+    # Perturbed copies of stored chunks, so queries have near but not exact matches
+    picks = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = (picks + 0.05 * rng.standard_normal(picks.shape)).astype(np.float32)
+
+    truth, exact_latencies = exact_top_k(vectors, queries, args.k)
+    results = [{
+        "index": "exact",
+        "bytes_per_vector": 4 * int(vectors.shape[1]),
+        f"recall@{args.k}": 1.0,
+        "p50_ms": percentile_ms(exact_latencies, 50),
+        "p95_ms": percentile_ms(exact_latencies, 95),
+    }]
+    for config in args.configs:
+        m, ef_construction, ef_search = (int(v) for v in config.split(","))
+        results.append(bench_config(vectors, queries, truth, args.k, m, ef_construction, ef_search))
+    for dtype in args.stores:
+        results.append(bench_mmap(vectors, queries, truth, args.k, dtype))
+
+    print(f"{len(vectors):,} vectors x {vectors.shape[1]} dims, {args.queries} queries, k={args.k}")
+    for row in results:
+        print("  ".join(f"{key}={value}" for key, value in row.items()))
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"vectors": len(vectors), "dim": int(vectors.shape[1]), "k": args.k, "results": results}, f, indent=2)
+    print(f"Saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import os
+import re
+
+from metrics import metrics
+from tokens import count_tokens, truncate_tokens
+
+# Prompt tokens the retrieved context may use (the question and instructions come on top)
+TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "2000"))
+# Pieces whose word-shingle overlap with an earlier piece is at least this are dropped
+DUPLICATE_SIMILARITY = float(os.environ.get("CONTEXT_DUPLICATE_SIMILARITY", "0.85"))
+
+# Longest repeated text looked for between neighbouring chunks (splitters with a chunk_overlap)
+_MAX_OVERLAP_CHARS = 1000
+_MIN_OVERLAP_CHARS = 20
+_SHINGLE = 3
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _chunk_position(doc):
+    """(doc_hash, n) from a DocumentIndex chunk id "doc_hash:n", or None for chunks without one."""
+    chunk_id = doc.metadata.get("chunk_id", "")
+    doc_hash, _, n = chunk_id.rpartition(":")
+    return (doc_hash, int(n)) if doc_hash and n.isdigit() else None
+
+
+def _overlap(left: str, right: str) -> int:
+    """Characters at the end of left that repeat at the start of right (what chunk_overlap duplicates)."""
+    head = right[:_MIN_OVERLAP_CHARS]
+    if len(head) < _MIN_OVERLAP_CHARS:
+        return 0
+    start = max(0, len(left) - _MAX_OVERLAP_CHARS)
+    position = left.find(head, start)
+    while position != -1:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(head, position + 1)
+    return 0
+
+
+def _shingles(text: str) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < _SHINGLE:
+        return {tuple(words)}
+    return {tuple(words[i:i + _SHINGLE]) for i in range(len(words) - _SHINGLE + 1)}
+
+
+def _similarity(a: set, b: set) -> float:
+    """How much of the smaller piece is contained in the other one."""
+    return len(a & b) / max(1, min(len(a), len(b)))
+
+
+def _merge_neighbours(docs):
+    """
+    Join chunks that sat next to each other in the same document into one
+    piece, without the text the splitter repeated between them. Pieces keep
+    the rank of their best chunk.
+    """
+    pieces = []
+    by_position = {}
+    for rank, doc in enumerate(docs):
+        position = _chunk_position(doc)
+        if position is not None and position in by_position:
+            continue  # the same chunk twice
+        piece = {"rank": rank, "docs": [doc], "text": doc.page_content, "first": position, "last": position}
+        pieces.append(piece)
+        if position is not None:
+            by_position[position] = piece
+
+    merged = 0
+    for piece in sorted(pieces, key=lambda p: p["first"] or ("", -1)):
+        if piece["first"] is None or piece.get("absorbed"):
+            continue
+        while True:
+            doc_hash, n = piece["last"]
+            following = by_position.get((doc_hash, n + 1))
+            if following is None or following.get("absorbed"):
+                break
+            cut = _overlap(piece["text"], following["text"])
+            piece["text"] += following["text"][cut:] if cut else "\n" + following["text"]
+            piece["docs"] += following["docs"]
+            piece["rank"] = min(piece["rank"], following["rank"])
+            piece["last"] = following["last"]
+            following["absorbed"] = True
+            merged += 1
+    return sorted((p for p in pieces if not p.get("absorbed")), key=lambda p: p["rank"]), merged
+
+
+def build_context(docs, token_budget: int = TOKEN_BUDGET, template: str = "{text}", separator: str = "\n\n",
+                  count=None, duplicate_similarity: float = DUPLICATE_SIMILARITY):
+    """
+    Prompt context from retrieved docs (best first): neighbouring chunks
+    merged, near-duplicates dropped, and pieces added in rank order while
+    they fit in token_budget, as counted by `count` (tiktoken for OpenAI
+    models by default). Each piece is rendered with `template`, which may
+    use {n}, {source} and {text}.
+
+    Returns the context, the docs it was built from and a report of the
+    tokens used versus a plain join of every doc.
+    """
+    count = count or count_tokens
+    pieces, merged = _merge_neighbours(docs)
+
+    parts, used_docs, seen, duplicates, over_budget = [], [], [], 0, 0
+    tokens, separator_tokens = 0, count(separator)
+    for piece in pieces:
+        shingles = _shingles(piece["text"])
+        if any(_similarity(shingles, other) >= duplicate_similarity for other in seen):
+            duplicates += 1
+            continue
+
+        source = piece["docs"][0].metadata.get("source", "Unknown")
+        part = template.format(n=len(parts) + 1, source=source, text=piece["text"])
+        part_tokens = count(part) + (separator_tokens if parts else 0)
+        if tokens + part_tokens > token_budget:
+            if parts:
+                over_budget += 1
+                continue
+            # Not even the best piece fits: keep as much of it as does
+            part = truncate_tokens(part, token_budget, count)
+            part_tokens = count(part)
+
+        seen.append(shingles)
+        parts.append(part)
+        used_docs.extend(piece["docs"])
+        tokens += part_tokens
+
+    context = separator.join(parts)
+    raw_tokens = count(separator.join(doc.page_content for doc in docs))
+    metrics.inc("tokens_total", tokens, stage="context")
+    metrics.inc("tokens_saved_total", max(0, raw_tokens - tokens), stage="context")
+    return context, used_docs, {
+        "chunks": len(docs),
+        "pieces": len(parts),
+        "merged": merged,
+        "duplicates": duplicates,
+        "over_budget": over_budget,
+        "tokens": tokens,
+        "raw_tokens": raw_tokens,
+        "tokens_saved": max(0, raw_tokens - tokens),
+    }
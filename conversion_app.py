@@ -1,49 +1,15 @@
+import os
+
 import streamlit as st
 from pathlib import Path
-import tempfile
-
-from docling.document_converter import DocumentConverter, PdfFormatOption
-from docling.backend.docling_parse_v2_backend import DoclingParseV2DocumentBackend
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import PdfPipelineOptions, AcceleratorOptions, AcceleratorDevice
-
-
-def convert_to_markdown(file_path: str) -> str:
-    path = Path(file_path)
-    ext = path.suffix.lower()
-
-    if ext == ".pdf":
-        pdf_opts = PdfPipelineOptions(do_ocr=False)
-        pdf_opts.accelerator_options = AcceleratorOptions(
-            num_threads=4,
-            device=AcceleratorDevice.CPU
-        )
-        converter = DocumentConverter(
-            format_options={
-                InputFormat.PDF: PdfFormatOption(
-                    pipeline_options=pdf_opts,
-                    backend=DoclingParseV2DocumentBackend
-                )
-            }
-        )
-        doc = converter.convert(file_path).document
-        return doc.export_to_markdown(image_mode="placeholder")
-
-    if ext in [".doc", ".docx"]:
-        converter = DocumentConverter()
-        doc = converter.convert(file_path).document
-        return doc.export_to_markdown(image_mode="placeholder")
-
-    if ext == ".txt":
-        try:
-            return path.read_text(encoding="utf-8")
-        except UnicodeDecodeError:
-            return path.read_text(encoding="latin-1", errors="replace")
 
-    raise ValueError(f"Unsupported extension: {ext}")
+from batch_convert import convert_batch, default_workers, write_markdown
+from metrics import start_exporter
+from upload_spool import get_spool, spool_upload
 
 
 def main():
+    start_exporter()
     st.title("Batch Document to Markdown")
 
     uploaded = st.file_uploader(
@@ -57,6 +23,14 @@ def main():
         value="output_markdown"
     )
 
+    # Default: one per core, as many as free memory allows
+    workers = st.number_input(
+        "Parallel workers",
+        min_value=1,
+        max_value=os.cpu_count() or 1,
+        value=default_workers()
+    )
+
     # prepare session state for downloads
     if "downloads" not in st.session_state:
         st.session_state.downloads = []
@@ -75,30 +49,51 @@ def main():
         progress = st.progress(0)
         status = st.empty()
 
-        total = len(uploaded)
-
-        for idx, up in enumerate(uploaded, start=1):
-            name = up.name
-            status.text(f"Converting {name} ({idx}/{total})")
-            with tempfile.NamedTemporaryFile(delete=False, suffix=Path(name).suffix) as tmp:
-                tmp.write(up.getvalue())
-                tmp_path = tmp.name
+        # Each worker process converts from disk, so spool every upload first, pinned so the
+        # spool's gc() leaves the files alone until the batch is done with them.
+        # Identical files share one spooled copy and are converted (and saved) once per name
+        names = {}
+        pinned = []
+        for up in uploaded:
+            path, _ = spool_upload(up, pin=True)
+            pinned.append(path)
+            upload_names = names.setdefault(path, [])
+            if up.name not in upload_names:
+                upload_names.append(up.name)
+        # Output names used so far: different files uploaded under one name get numbered copies
+        taken = set()
+        total = len(names)
+
+        status.text(f"Converting {total} files on {workers} workers...")
+        timings = []
 
-            try:
-                md = convert_to_markdown(tmp_path)
-                out_file = out_folder / f"{Path(name).stem}.md"
-                out_file.write_text(md, encoding="utf-8", errors="replace")
-
-                # store for download
-                st.session_state.downloads.append((out_file.name, md))
-
-            except Exception as e:
-                st.warning(f"Failed: {name}: {e}")
-
-            progress.progress(idx / total)
+        try:
+            for idx, result in enumerate(convert_batch(list(names), workers=workers), start=1):
+                name = ", ".join(names[result.path])
+                if result.ok:
+                    for upload_name in names[result.path]:
+                        out_file = write_markdown(out_folder, upload_name, result.markdown, taken)
+
+                        # store for download
+                        st.session_state.downloads.append((out_file.name, result.markdown))
+                else:
+                    st.warning(f"Failed: {name}: {result.error}")
+
+                timings.append({
+                    "file": name,
+                    "seconds": round(result.seconds, 2),
+                    "attempts": result.attempts,
+                    "status": "ok" if result.ok else "failed"
+                })
+                progress.progress(idx / total)
+                status.text(f"Finished {name} in {result.seconds:.1f}s ({idx}/{total}, {workers} workers)")
+        finally:
+            for path in pinned:
+                get_spool().unpin(path)
 
         status.text("Conversion done.")
         st.success(f"Saved markdown files to {out_folder.resolve()}")
+        st.dataframe(timings)
 
     # show download buttons after conversion
     if st.session_state.downloads:
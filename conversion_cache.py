@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from metrics import metrics
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("MARKDOWN_CACHE_DIR", ".cache/markdown"))
+DEFAULT_MAX_BYTES = int(os.environ.get("MARKDOWN_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+_READ_BLOCK = 1024 * 1024
+
+
+# ----------------- CONTENT HASHING -----------------
+def hash_file(file_path) -> str:
+    """SHA-256 of a file's bytes, read in blocks so large PDFs never sit in memory."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(_READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ----------------- ON-DISK LRU CACHE -----------------
+class ConversionCache:
+    """
+    Markdown output of convert_to_markdown, stored on disk and keyed by
+    the file contents plus the converter settings used to produce it.
+
+    Entries are plain .md files. Reading an entry bumps its mtime, so the
+    oldest mtime is always the least recently used entry and eviction
+    works the same no matter which app (or process) touched it last.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def make_key(self, file_path, settings: dict, content_hash: str = None) -> str:
+        content_hash = content_hash or hash_file(file_path)
+        settings_blob = json.dumps(settings, sort_keys=True, default=str)
+        return hashlib.sha256(f"{content_hash}:{settings_blob}".encode("utf-8")).hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.md"
+
+    def get(self, key: str):
+        entry = self._entry(key)
+        try:
+            markdown = entry.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            metrics.cache("markdown", "miss")
+            return None
+        metrics.cache("markdown", "hit")
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            # Evicted by another process between the read and the touch
+            pass
+        return markdown
+
+    def put(self, key: str, markdown: str) -> None:
+        entry = self._entry(key)
+        tmp = entry.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(markdown, encoding="utf-8", errors="replace")
+        os.replace(tmp, entry)
+        self.evict()
+
+    def evict(self) -> None:
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in self.cache_dir.glob("*.md"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry))
+                total += stat.st_size
+
+            entries.sort()
+            for _, size, entry in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    entry.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            for entry in self.cache_dir.glob("*.md"):
+                entry.unlink(missing_ok=True)
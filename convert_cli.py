@@ -0,0 +1,108 @@
+"""
+Headless bulk conversion to Markdown, for cron jobs and large corpora.
+
+    python convert_cli.py docs/ "scans/**/*.pdf" report.docx -o output_markdown -j 8
+
+Directories are expanded to every supported file inside them (add
+--recursive to include subfolders) and quoted globs are expanded here, so
+they also work where the shell doesn't. The output folder mirrors the
+inputs below their common folder, each file saved with .md added to its
+name (docs/a/report.pdf -> output_markdown/a/report.pdf.md), so files
+with the same name in different folders, or the same stem in different
+formats, never overwrite each other.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from pathlib import Path
+
+from batch_convert import convert_batch, default_workers, write_markdown
+from converter import SUPPORTED_EXTENSIONS
+
+
+def collect_inputs(inputs, recursive: bool = False):
+    """Expand files, directories and glob patterns into a sorted, de-duplicated list of paths."""
+    found = set()
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            candidates = path.rglob("*") if recursive else path.glob("*")
+        elif glob.has_magic(item):
+            candidates = (Path(p) for p in glob.glob(item, recursive=True))
+        else:
+            candidates = [path]
+
+        for candidate in candidates:
+            if candidate.is_file() and candidate.suffix.lower() in SUPPORTED_EXTENSIONS:
+                found.add(str(candidate.resolve()))
+    return sorted(found)
+
+
+def relative_names(paths) -> dict:
+    """path -> its path relative to the deepest folder containing every input."""
+    root = os.path.commonpath([str(Path(path).parent) for path in paths])
+    return {path: Path(os.path.relpath(path, root)).as_posix() for path in paths}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Convert PDF, DOC, DOCX and TXT files to Markdown.")
+    parser.add_argument("inputs", nargs="+", help="files, directories or glob patterns")
+    parser.add_argument("-o", "--output", default="output_markdown", help="destination folder (default: output_markdown)")
+    parser.add_argument("-j", "--workers", type=int, default=default_workers(), help="parallel worker processes (default: all cores, capped by free memory)")
+    parser.add_argument("--threads", type=int, default=None, help="docling threads per worker (default: cores / workers)")
+    parser.add_argument("--retries", type=int, default=1, help="times to retry a failed file (default: 1)")
+    parser.add_argument("--ocr", action="store_true", help="run OCR on PDFs")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the on-disk conversion cache")
+    parser.add_argument("-r", "--recursive", action="store_true", help="include subfolders of input directories")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print the summary")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    paths = collect_inputs(args.inputs, recursive=args.recursive)
+    if not paths:
+        print("No supported files found.", file=sys.stderr)
+        return 2
+
+    out_folder = Path(args.output)
+    out_folder.mkdir(parents=True, exist_ok=True)
+    names = relative_names(paths)
+
+    converted = failed = pages = 0
+    start = time.perf_counter()
+
+    results = convert_batch(
+        paths,
+        workers=args.workers,
+        do_ocr=args.ocr,
+        num_threads=args.threads,
+        retries=args.retries,
+        use_cache=not args.no_cache,
+    )
+    for idx, result in enumerate(results, start=1):
+        name = names[result.path]
+        if result.ok:
+            # Written and dropped straight away, so memory doesn't grow with the corpus
+            write_markdown(out_folder, name, result.markdown)
+            converted += 1
+            pages += result.pages
+            if not args.quiet:
+                print(f"[{idx}/{len(paths)}] {name}: {result.seconds:.1f}s, {result.pages} pages")
+        else:
+            failed += 1
+            print(f"[{idx}/{len(paths)}] FAILED {name} after {result.attempts} attempt(s): {result.error}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Converted {converted}/{len(paths)} files ({pages} pages) in {elapsed:.1f}s: "
+        f"{converted / elapsed:.2f} files/s, {pages / elapsed:.2f} pages/s -> {out_folder.resolve()}"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+import os
+import queue
+import re
+import threading
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+
+from conversion_cache import ConversionCache, hash_file
+from metrics import metrics
+
+_cache = None
+
+POOL_SIZE = int(os.environ.get("CONVERTER_POOL_SIZE", "2"))
+
+SUPPORTED_EXTENSIONS = [".pdf", ".doc", ".docx", ".txt"]
+
+# iter_markdown converts PDFs this many pages at a time and plain text in blocks of about this size
+PAGES_PER_BATCH = int(os.environ.get("CONVERT_PAGES_PER_BATCH", "8"))
+TEXT_BLOCK_CHARS = 64 * 1024
+
+
+def get_cache() -> ConversionCache:
+    """Process-wide conversion cache shared by all the Streamlit apps."""
+    global _cache
+    if _cache is None:
+        _cache = ConversionCache()
+    return _cache
+
+
+def converter_settings(ext: str, do_ocr: bool = False, num_threads: int = 4) -> dict:
+    """Everything that changes the Markdown produced for a file, besides its bytes."""
+    if ext == ".pdf":
+        return {
+            "format": "pdf",
+            "do_ocr": do_ocr,
+            "backend": "DoclingParseV2DocumentBackend",
+            "num_threads": num_threads,
+            "image_mode": "placeholder",
+        }
+    return {"format": ext.lstrip("."), "image_mode": "placeholder"}
+
+
+# ----------------- CONVERTER POOL -----------------
+class ConverterPool:
+    """
+    Up to `size` DocumentConverters built from one factory. Converters are
+    built lazily on first demand and then reused; a caller that finds every
+    converter busy waits for one to be handed back, so a converter is never
+    used by two Streamlit sessions at the same time.
+    """
+
+    def __init__(self, factory, size: int = POOL_SIZE):
+        self._factory = factory
+        self._size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            build = self._created < self._size
+            if build:
+                self._created += 1
+        if not build:
+            return self._idle.get()
+
+        try:
+            return self._factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextmanager
+    def borrow(self):
+        converter = self._checkout()
+        try:
+            yield converter
+        finally:
+            self._idle.put(converter)
+
+    def warm(self) -> None:
+        """Build one converter ahead of time so the first request doesn't pay for it."""
+        with self.borrow():
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+# docling takes seconds to import: it is only loaded when the first converter is built
+def _build_pdf_converter(do_ocr: bool, num_threads: int):
+    from docling.backend.docling_parse_v2_backend import DoclingParseV2DocumentBackend
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import AcceleratorDevice, AcceleratorOptions, PdfPipelineOptions
+    from docling.document_converter import DocumentConverter, PdfFormatOption
+
+    pdf_opts = PdfPipelineOptions(do_ocr=do_ocr)
+    pdf_opts.accelerator_options = AcceleratorOptions(
+        num_threads=num_threads,
+        device=AcceleratorDevice.CPU
+    )
+    converter = DocumentConverter(
+        format_options={
+            InputFormat.PDF: PdfFormatOption(
+                pipeline_options=pdf_opts,
+                backend=DoclingParseV2DocumentBackend
+            )
+        }
+    )
+    # Loads the layout/table models now instead of inside the first convert()
+    converter.initialize_pipeline(InputFormat.PDF)
+    return converter
+
+
+def _build_docx_converter():
+    from docling.datamodel.base_models import InputFormat
+    from docling.document_converter import DocumentConverter
+
+    converter = DocumentConverter()
+    converter.initialize_pipeline(InputFormat.DOCX)
+    return converter
+
+
+def get_converter_pool(ext: str, do_ocr: bool = False, num_threads: int = 4) -> ConverterPool:
+    """Process-wide pool for one format and set of pipeline options."""
+    if ext == ".pdf":
+        key = ("pdf", do_ocr, num_threads)
+        factory = lambda: _build_pdf_converter(do_ocr, num_threads)
+    elif ext in [".doc", ".docx"]:
+        key = ("docx",)
+        factory = _build_docx_converter
+    else:
+        raise ValueError(f"Unsupported extension: {ext}")
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConverterPool(factory)
+    return pool
+
+
+def warm_converters(extensions=(".pdf", ".docx"), do_ocr: bool = False, num_threads: int = 4) -> None:
+    for ext in extensions:
+        get_converter_pool(ext, do_ocr, num_threads).warm()
+
+
+# ----------------- CONVERSION TO MARKDOWN -----------------
+def _convert_uncached(file_path: str, ext: str, do_ocr: bool, num_threads: int, page_range=None) -> str:
+    with metrics.span("docling", ext=ext):
+        with get_converter_pool(ext, do_ocr, num_threads).borrow() as converter:
+            if page_range is None:
+                doc = converter.convert(file_path).document
+            else:
+                doc = converter.convert(file_path, page_range=page_range).document
+        return doc.export_to_markdown(image_mode="placeholder")
+
+
+def convert_to_markdown(file_path: str, do_ocr: bool = False, num_threads: int = 4,
+                        use_cache: bool = True, content_hash: str = None) -> str:
+    ext = Path(file_path).suffix.lower()
+    metrics.inc("bytes_total", os.path.getsize(file_path), stage="convert")
+    with metrics.span("convert", ext=ext):
+        return _convert_to_markdown(file_path, do_ocr, num_threads, use_cache, content_hash)
+
+
+def _convert_to_markdown(file_path: str, do_ocr: bool, num_threads: int, use_cache: bool, content_hash: str) -> str:
+    path = Path(file_path)
+    ext = path.suffix.lower()
+
+    if ext == ".txt":
+        # Reading the file is as cheap as hashing it, so plain text skips the cache
+        try:
+            return path.read_text(encoding="utf-8")
+        except UnicodeDecodeError:
+            return path.read_text(encoding="latin-1", errors="replace")
+
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported extension: {ext}")
+
+    if ext == ".pdf":
+        # Assembled from the page-batch entries iter_markdown reads and writes, so every app
+        # (whole-file or streaming) shares one cached conversion of a PDF
+        return "\n\n".join(
+            markdown for _, markdown in _iter_pdf(file_path, do_ocr, num_threads, PAGES_PER_BATCH, use_cache, content_hash)
+        )
+
+    if not use_cache:
+        return _convert_uncached(file_path, ext, do_ocr, num_threads)
+
+    cache = get_cache()
+    key = cache.make_key(file_path, converter_settings(ext, do_ocr, num_threads), content_hash)
+    markdown = cache.get(key)
+    if markdown is None:
+        markdown = _convert_uncached(file_path, ext, do_ocr, num_threads)
+        cache.put(key, markdown)
+    return markdown
+
+
+def _text_encoding(path: Path) -> str:
+    """utf-8 if the whole file decodes as utf-8, else latin-1, checked without loading the file."""
+    import codecs
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(TEXT_BLOCK_CHARS), b""):
+                decoder.decode(block)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return "latin-1"
+    return "utf-8"
+
+
+def _iter_text_blocks(path: Path):
+    """Plain text in blocks of roughly TEXT_BLOCK_CHARS, cut at blank lines so paragraphs stay whole."""
+    block, size = [], 0
+    with open(path, "r", encoding=_text_encoding(path), errors="replace") as f:
+        for line in f:
+            block.append(line)
+            size += len(line)
+            if size >= TEXT_BLOCK_CHARS and not line.strip():
+                yield "".join(block)
+                block, size = [], 0
+    if block:
+        yield "".join(block)
+
+
+def _iter_pdf(file_path: str, do_ocr: bool, num_threads: int, pages_per_batch: int, use_cache: bool,
+              content_hash: str = None):
+    """(page range, markdown) of a PDF, `pages_per_batch` pages at a time, each batch cached on its own."""
+    ext = ".pdf"
+    total = count_pages(file_path)
+    cache = get_cache() if use_cache else None
+    if cache is not None:
+        content_hash = content_hash or hash_file(file_path)
+
+    for first in range(1, total + 1, pages_per_batch):
+        page_range = (first, min(first + pages_per_batch - 1, total))
+        if cache is None:
+            yield page_range, _convert_uncached(file_path, ext, do_ocr, num_threads, page_range)
+            continue
+
+        settings = dict(converter_settings(ext, do_ocr, num_threads), page_range=list(page_range))
+        key = cache.make_key(file_path, settings, content_hash)
+        markdown = cache.get(key)
+        if markdown is None:
+            markdown = _convert_uncached(file_path, ext, do_ocr, num_threads, page_range)
+            cache.put(key, markdown)
+        yield page_range, markdown
+
+
+def iter_markdown(file_path: str, do_ocr: bool = False, num_threads: int = 4,
+                  pages_per_batch: int = PAGES_PER_BATCH, use_cache: bool = True, content_hash: str = None):
+    """
+    Streaming version of convert_to_markdown: yields (pages, markdown) one
+    piece at a time so a 1,000-page manual is never held in memory whole.
+    PDFs are converted `pages_per_batch` pages at a time and `pages` is the
+    1-based (first, last) page range; plain text comes in paragraph-aligned
+    blocks and DOC/DOCX as one piece, both with pages=None. Pass the
+    file's content_hash if it is known, so it isn't read twice.
+    """
+    path = Path(file_path)
+    ext = path.suffix.lower()
+    metrics.inc("bytes_total", path.stat().st_size, stage="convert")
+
+    if ext == ".txt":
+        for block in _iter_text_blocks(path):
+            yield None, block
+        return
+
+    if ext != ".pdf":
+        with metrics.span("convert", ext=ext):
+            markdown = _convert_to_markdown(file_path, do_ocr, num_threads, use_cache, content_hash)
+        yield None, markdown
+        return
+
+    yield from _iter_pdf(file_path, do_ocr, num_threads, pages_per_batch, use_cache, content_hash)
+
+
+def count_pages(file_path: str) -> int:
+    """Page count without converting: the PDF page tree, or the page count Word stores in DOCX."""
+    ext = Path(file_path).suffix.lower()
+    if ext == ".pdf":
+        import pypdfium2
+
+        pdf = pypdfium2.PdfDocument(file_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    if ext == ".docx":
+        try:
+            with zipfile.ZipFile(file_path) as docx:
+                app_xml = docx.read("docProps/app.xml").decode("utf-8", errors="replace")
+        except (KeyError, zipfile.BadZipFile):
+            return 0
+        match = re.search(r"<Pages>(\d+)</Pages>", app_xml)
+        return int(match.group(1)) if match else 0
+    return 0
@@ -0,0 +1,414 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+from doc_stats import DocumentStats
+from keyword_index import KeywordIndex, reciprocal_rank_fusion
+from metrics import metrics
+
+DEFAULT_INDEX_DIR = Path(os.environ.get("VECTOR_INDEX_DIR", ".cache/chroma"))
+
+# HNSW build/search parameters for new collections (Chroma's own defaults unless overridden).
+# M and ef_construction are fixed once a collection exists; use a new VECTOR_INDEX_DIR to rebuild.
+# benchmark_ann.py measures recall vs. latency for candidate values on your own chunks.
+HNSW_SETTINGS = {
+    "hnsw:space": os.environ.get("HNSW_SPACE", "l2"),
+    "hnsw:M": int(os.environ.get("HNSW_M", "16")),
+    "hnsw:construction_ef": int(os.environ.get("HNSW_EF_CONSTRUCTION", "100")),
+    "hnsw:search_ef": int(os.environ.get("HNSW_EF_SEARCH", "10")),
+}
+
+# "chroma" (HNSW, float32) or a compact memory-mapped store: "int8" (4x smaller) or "float16" (2x).
+# Changing it starts a separate store in the same VECTOR_INDEX_DIR; documents are re-embedded on upload.
+VECTOR_STORE = os.environ.get("VECTOR_STORE", "chroma")
+
+# Compact the memory-mapped store once this share of its rows is dead (removed or replaced documents)
+COMPACT_DEAD_FRACTION = float(os.environ.get("VECTOR_COMPACT_DEAD_FRACTION", "0.25"))
+
+# Owners of anonymous uploads: one browser session each, gone for good once the tab closes
+SESSION_OWNER_PREFIX = "session:"
+# ...so their documents are let go of after this long without the session being seen
+SESSION_OWNER_TTL_SECONDS = float(os.environ.get("SESSION_OWNER_TTL_SECONDS", "43200"))
+
+_PAGE_SIZE = 5000
+
+
+def fingerprint(text: str, salt: str = "") -> str:
+    """Identity of a document's chunks: its Markdown plus whatever decides how it's split."""
+    return hashlib.sha256(f"{salt}\0{text}".encode("utf-8", errors="replace")).hexdigest()
+
+
+# ----------------- VECTOR BACKENDS -----------------
+class ChromaVectors:
+    """Chroma (HNSW) behind the same small interface as mmap_store.MmapVectorStore."""
+
+    def __init__(self, persist_directory, collection_name: str, hnsw_settings: dict = None):
+        # langchain_community and chromadb are slow to import: only when this backend is used
+        from langchain_community.vectorstores import Chroma
+
+        self.db = Chroma(
+            collection_name=collection_name,
+            persist_directory=str(persist_directory),
+            collection_metadata=dict(hnsw_settings or HNSW_SETTINGS),
+        )
+
+    def documents(self) -> dict:
+        """doc_hash -> {"source", "chunks"} for everything already on disk."""
+        docs = {}
+        offset = 0
+        while True:
+            page = self.db.get(include=["metadatas"], limit=_PAGE_SIZE, offset=offset)
+            for metadata in page["metadatas"]:
+                entry = docs.setdefault(metadata["doc_hash"], {"source": metadata.get("source", "Unknown"), "chunks": 0})
+                entry["chunks"] += 1
+            if len(page["ids"]) < _PAGE_SIZE:
+                return docs
+            offset += _PAGE_SIZE
+
+    def texts(self, doc_hash: str):
+        stored = self.db.get(where={"doc_hash": doc_hash}, include=["documents"])
+        return stored["ids"], stored["documents"]
+
+    def upsert(self, ids, vectors, metadatas, texts) -> None:
+        self.db._collection.upsert(ids=ids, embeddings=vectors, metadatas=metadatas, documents=texts)
+
+    def delete(self, ids) -> None:
+        self.db.delete(ids=ids)
+
+    @staticmethod
+    def _doc_filter(doc_hashes):
+        if len(doc_hashes) == 1:
+            return {"doc_hash": doc_hashes[0]}
+        return {"doc_hash": {"$in": doc_hashes}}
+
+    def search_documents(self, query_vector, k: int = 4, doc_hashes=None):
+        doc_filter = None if doc_hashes is None else self._doc_filter(list(doc_hashes))
+        return self.db.similarity_search_by_vector(query_vector, k=k, filter=doc_filter)
+
+    def get(self, chunk_ids):
+        stored = self.db.get(ids=list(chunk_ids), include=["documents", "metadatas"])
+        return [Document(page_content=text, metadata=metadata)
+                for text, metadata in zip(stored["documents"], stored["metadatas"])]
+
+
+def open_vectors(persist_directory, collection_name: str, store: str = VECTOR_STORE, hnsw_settings: dict = None):
+    if store == "chroma":
+        return ChromaVectors(persist_directory, collection_name, hnsw_settings)
+    from mmap_store import MmapVectorStore
+    return MmapVectorStore(Path(persist_directory) / f"{collection_name}_{store}", dtype=store)
+
+
+# ----------------- DOCUMENT OWNERSHIP -----------------
+class DocumentOwners:
+    """
+    Which users can see which indexed documents, in a SQLite file next to
+    the index so every server process agrees. A document is stored once
+    however many users upload it; each upload adds an owner, and the
+    document is only deleted when its last owner lets go of it. Each row
+    also records when its owner was last seen, so owners that will never
+    come back (anonymous sessions) can be expired.
+    """
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS owners ("
+                "doc_hash TEXT NOT NULL, owner TEXT NOT NULL, source TEXT, added REAL NOT NULL, "
+                "PRIMARY KEY (owner, doc_hash)) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS owners_doc ON owners(doc_hash)")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(owners)")}
+            if "seen" not in columns:
+                self._conn.execute("ALTER TABLE owners ADD COLUMN seen REAL")
+
+    def grant(self, doc_hash: str, owner: str, source: str) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO owners (doc_hash, owner, source, added, seen) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (owner, doc_hash) DO UPDATE SET seen = excluded.seen",
+                (doc_hash, owner, source, now, now),
+            )
+
+    def touch(self, owner: str) -> None:
+        """Record that owner is still around."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE owners SET seen = ? WHERE owner = ?", (time.time(), owner))
+
+    def expire(self, prefix: str, seen_before: float) -> list:
+        """Drop owners named prefix... last seen before seen_before; returns the documents they owned."""
+        where = "substr(owner, 1, ?) = ? AND COALESCE(seen, added) < ?"
+        args = (len(prefix), prefix, seen_before)
+        with self._lock, self._conn:
+            doc_hashes = [row[0] for row in self._conn.execute(f"SELECT DISTINCT doc_hash FROM owners WHERE {where}", args)]
+            self._conn.execute(f"DELETE FROM owners WHERE {where}", args)
+        return doc_hashes
+
+    def owner_count(self, doc_hash: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM owners WHERE doc_hash = ?", (doc_hash,)).fetchone()[0]
+
+    def revoke(self, doc_hash: str, owner: str) -> int:
+        """Drop one owner; returns how many owners the document still has."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM owners WHERE owner = ? AND doc_hash = ?", (owner, doc_hash))
+            return self._conn.execute("SELECT COUNT(*) FROM owners WHERE doc_hash = ?", (doc_hash,)).fetchone()[0]
+
+    def visible(self, owner: str) -> dict:
+        """doc_hash -> source name for everything this owner uploaded, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_hash, source FROM owners WHERE owner = ? ORDER BY added", (owner,)
+            ).fetchall()
+        return dict(rows)
+
+    def counts(self) -> dict:
+        with self._lock:
+            return dict(self._conn.execute("SELECT doc_hash, COUNT(*) FROM owners GROUP BY doc_hash"))
+
+
+# ----------------- PERSISTENT DOCUMENT INDEX -----------------
+class DocumentIndex:
+    """
+    A vector store on disk (Chroma, or the compact mmap store) where every
+    chunk carries the fingerprint (doc_hash) of the document it came from.
+    Documents are added and removed as a whole, so only new documents are
+    ever embedded and unchanged ones survive reruns and server restarts.
+
+    One index serves every session: users see documents through ownership
+    (share / release / visible_documents) rather than private copies, so
+    memory and embedding work grow with unique documents, not with users.
+    Anonymous sessions never release what they don't remove by hand, so
+    their ownership expires session_ttl seconds after they were last seen
+    (see touch), and documents nobody owns any more are deleted.
+    """
+
+    def __init__(self, embedding, persist_directory=DEFAULT_INDEX_DIR, collection_name: str = "documents",
+                 hnsw_settings: dict = None, store: str = VECTOR_STORE,
+                 session_ttl: float = SESSION_OWNER_TTL_SECONDS):
+        Path(persist_directory).mkdir(parents=True, exist_ok=True)
+        self.embedding = embedding
+        self.vectors = open_vectors(persist_directory, collection_name, store, hnsw_settings)
+        # Each store gets its own keyword index so the two never disagree about what's indexed
+        suffix = "" if store == "chroma" else f"_{store}"
+        self.keywords = KeywordIndex(Path(persist_directory) / f"{collection_name}{suffix}_keywords.sqlite")
+        self.owners = DocumentOwners(Path(persist_directory) / f"{collection_name}_owners.sqlite")
+        self.stats = DocumentStats(Path(persist_directory) / f"{collection_name}_stats.sqlite")
+        self._lock = threading.Lock()
+        self.session_ttl = session_ttl
+        self._last_expiry = float("-inf")
+        self._docs = self._load_committed()
+        self._backfill_keywords()
+        self._compact_if_needed()
+
+    def _load_committed(self) -> dict:
+        """
+        Documents on disk that were committed. Chunks of an ingest that
+        died before commit_document stay unlisted (invisible to has() and
+        to every search, which only covers shared, committed documents);
+        ingesting that document again overwrites them, as chunk ids are
+        deterministic.
+        """
+        on_disk = self.vectors.documents()
+        if not self.keywords.had_commit_log:
+            for doc_hash, entry in on_disk.items():
+                self.keywords.commit(doc_hash, entry["source"], entry["chunks"])
+        return self.keywords.committed()
+
+    def _compact_if_needed(self) -> None:
+        """Free the files of deleted rows once enough have piled up (only the mmap store keeps them)."""
+        compact = getattr(self.vectors, "compact", None)
+        if compact is not None and self.vectors.dead_fraction() > COMPACT_DEAD_FRACTION:
+            with metrics.span("index_compact"):
+                compact()
+
+    def _backfill_keywords(self) -> None:
+        """Give documents indexed before the keyword index existed their postings."""
+        for doc_hash in set(self._docs) - self.keywords.doc_hashes():
+            self.keywords.add(doc_hash, *self.vectors.texts(doc_hash))
+
+    def has(self, doc_hash: str) -> bool:
+        return doc_hash in self._docs
+
+    def chunk_count(self, doc_hashes) -> int:
+        return sum(self._docs[h]["chunks"] for h in doc_hashes if h in self._docs)
+
+    def embed_chunks(self, chunks):
+        return self.embedding.embed_documents([chunk.page_content for chunk in chunks])
+
+    def add_document(self, doc_hash: str, source: str, chunks) -> int:
+        """Embed and store one document's chunks. Returns how many were added (0 if already indexed)."""
+        if self.has(doc_hash):
+            return 0
+        return self.add_embedded(doc_hash, source, chunks, self.embed_chunks(chunks) if chunks else [])
+
+    def add_embedded(self, doc_hash: str, source: str, chunks, embeddings) -> int:
+        """Store chunks whose vectors were computed elsewhere (e.g. a separate ingest stage)."""
+        if self.has(doc_hash):
+            return 0
+        self.add_batch(doc_hash, source, chunks, embeddings)
+        self.commit_document(doc_hash, source, len(chunks))
+        return len(chunks)
+
+    def add_batch(self, doc_hash: str, source: str, chunks, embeddings, offset: int = 0) -> None:
+        """
+        Store one batch of a document's chunks as chunks offset.. offset+len-1.
+        The document isn't listed as indexed until commit_document, so a
+        large document can be streamed in without holding all its chunks.
+        """
+        if not chunks:
+            return
+        ids = [f"{doc_hash}:{i}" for i in range(offset, offset + len(chunks))]
+        metadatas = []
+        for chunk_id, chunk in zip(ids, chunks):
+            metadata = dict(chunk.metadata)
+            metadata.update({"source": source, "doc_hash": doc_hash, "chunk_id": chunk_id})
+            metadatas.append(metadata)
+        texts = [chunk.page_content for chunk in chunks]
+        with metrics.span("index_add"):
+            self.vectors.upsert(ids, embeddings, metadatas, texts)
+            self.keywords.add(doc_hash, ids, texts)
+
+    def commit_document(self, doc_hash: str, source: str, chunk_count: int) -> None:
+        with self._lock:
+            if doc_hash not in self._docs:
+                # Persisted last: a crash before this line leaves the document uncommitted on restart
+                self.keywords.commit(doc_hash, source, chunk_count)
+                self._docs[doc_hash] = {"source": source, "chunks": chunk_count}
+
+    def discard_batches(self, doc_hash: str, chunk_count: int) -> None:
+        """Undo add_batch calls for a document that failed before commit_document."""
+        if chunk_count and not self.has(doc_hash):
+            self.vectors.delete([f"{doc_hash}:{i}" for i in range(chunk_count)])
+            self.keywords.remove(doc_hash)
+            self._compact_if_needed()
+
+    def remove_document(self, doc_hash: str) -> int:
+        """Delete one document's vectors and nothing else."""
+        with self._lock:
+            return self._remove_locked(doc_hash)
+
+    def _remove_locked(self, doc_hash: str) -> int:
+        entry = self._docs.pop(doc_hash, None)
+        if entry is None:
+            return 0
+        ids = [f"{doc_hash}:{i}" for i in range(entry["chunks"])]
+        # Commit record first: a crash part way leaves leftovers that are merely uncommitted
+        self.keywords.remove(doc_hash)
+        if ids:
+            self.vectors.delete(ids)
+            self._compact_if_needed()
+        self.stats.remove(doc_hash)
+        return len(ids)
+
+    def share(self, doc_hash: str, owner: str, source: str) -> bool:
+        """
+        Make an indexed document visible to owner (what an upload does once
+        indexing is done). Returns False, sharing nothing, if the document
+        isn't indexed (any more): its last owner may have just released it.
+        """
+        with self._lock:
+            if doc_hash not in self._docs:
+                return False
+            self.owners.grant(doc_hash, owner, source)
+            return True
+
+    def release(self, doc_hash: str, owner: str) -> bool:
+        """Hide a document from owner; delete it once nobody owns it. Returns True if it was deleted."""
+        # One critical section with share(): nobody can be granted the document between
+        # the last owner leaving and its deletion
+        with self._lock:
+            if self.owners.revoke(doc_hash, owner):
+                return False
+            return bool(self._remove_locked(doc_hash))
+
+    def touch(self, owner: str) -> None:
+        """
+        Note that owner is still active (call it on every page run). Also
+        expires idle anonymous sessions, at most every tenth of session_ttl,
+        so the check rides along with normal traffic.
+        """
+        self.owners.touch(owner)
+        now = time.monotonic()
+        if now - self._last_expiry >= self.session_ttl / 10:
+            self._last_expiry = now
+            self.expire_sessions()
+
+    def expire_sessions(self) -> int:
+        """
+        Drop anonymous ("session:") owners not seen for session_ttl
+        seconds, then delete the documents that left without any owner.
+        Returns how many documents were deleted.
+        """
+        removed = 0
+        with self._lock:
+            for doc_hash in self.owners.expire(SESSION_OWNER_PREFIX, time.time() - self.session_ttl):
+                if not self.owners.owner_count(doc_hash):
+                    removed += bool(self._remove_locked(doc_hash))
+        return removed
+
+    def visible_documents(self, owner: str) -> dict:
+        """doc_hash -> source name of every document owner can search."""
+        return self.owners.visible(owner)
+
+    def hybrid_search(self, question: str, doc_hashes, k: int = 4, candidates: int = 20):
+        """
+        Top-k chunks of the given documents by reciprocal rank fusion of
+        dense (vector store) and BM25 (keyword index) rankings, plus how long each
+        stage took in milliseconds.
+        """
+        doc_hashes = list(doc_hashes)
+        timings = {}
+        if not doc_hashes:
+            return [], timings
+
+        start = time.perf_counter()
+        dense = self.vectors.search_documents(self.embedding.embed_query(question), candidates, doc_hashes)
+        timings["vector_ms"] = 1000 * (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        keyword = self.keywords.search(question, doc_hashes, k=candidates)
+        timings["bm25_ms"] = 1000 * (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        by_id = {doc.metadata["chunk_id"]: doc for doc in dense}
+        fused = reciprocal_rank_fusion(list(by_id), [chunk_id for chunk_id, _ in keyword])[:k]
+        # Chunks only BM25 found still need their text and metadata
+        missing = [chunk_id for chunk_id in fused if chunk_id not in by_id]
+        if missing:
+            for doc in self.vectors.get(missing):
+                by_id[doc.metadata["chunk_id"]] = doc
+        results = [by_id[chunk_id] for chunk_id in fused if chunk_id in by_id]
+        timings["fusion_ms"] = 1000 * (time.perf_counter() - start)
+        for stage, ms in timings.items():
+            metrics.observe("stage_seconds", ms / 1000, stage=stage[:-len("_ms")], status="ok")
+        return results, timings
+
+    def as_retriever(self, doc_hashes, k: int = 4, candidates: int = 20):
+        """Hybrid retriever that only searches the given documents."""
+        return HybridRetriever(self, list(doc_hashes), k, candidates)
+
+
+class HybridRetriever:
+    """What the apps keep in st.session_state.retriever: a fixed document set to search hybrid-style."""
+
+    def __init__(self, index: DocumentIndex, doc_hashes, k: int = 4, candidates: int = 20):
+        self.index = index
+        self.doc_hashes = doc_hashes
+        self.k = k
+        self.candidates = candidates
+        self.last_timings = {}
+
+    def get_relevant_documents(self, question: str):
+        with metrics.span("retrieve"):
+            docs, self.last_timings = self.index.hybrid_search(question, self.doc_hashes, self.k, self.candidates)
+        return docs
@@ -0,0 +1,75 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+FIELDS = ("source", "file_type", "words", "tokens", "pages", "chunks", "convert_seconds", "bytes")
+
+# SQLite's limit on ? parameters is 32766 (999 before 3.32): query document lists in slices
+_IN_BATCH = 900
+
+
+# ----------------- DOCUMENT STATISTICS -----------------
+class DocumentStats:
+    """
+    Per-document numbers (words, tokens, pages, chunks, conversion time,
+    file type, size) worked out once while the document is ingested and
+    kept in SQLite next to the index. The stats tab only ever aggregates
+    these rows, so it never reads document text and stays fast however
+    many documents there are.
+    """
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats ("
+                "doc_hash TEXT PRIMARY KEY, source TEXT, file_type TEXT, words INTEGER, tokens INTEGER, "
+                "pages INTEGER, chunks INTEGER, convert_seconds REAL, bytes INTEGER, recorded REAL NOT NULL)"
+            )
+
+    def record(self, doc_hash: str, **stats) -> None:
+        values = [stats.get(field) for field in FIELDS]
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO stats (doc_hash, {', '.join(FIELDS)}, recorded) "
+                f"VALUES (?, {', '.join('?' * len(FIELDS))}, ?)",
+                [doc_hash, *values, time.time()],
+            )
+
+    def has(self, doc_hash: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM stats WHERE doc_hash = ?", (doc_hash,)).fetchone() is not None
+
+    def get(self, doc_hash: str) -> dict:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(FIELDS)} FROM stats WHERE doc_hash = ?", (doc_hash,)).fetchone()
+        return dict(zip(FIELDS, row)) if row else None
+
+    def remove(self, doc_hash: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM stats WHERE doc_hash = ?", (doc_hash,))
+
+    def summary(self, doc_hashes) -> dict:
+        """Totals over the given documents, and a per-file-type breakdown."""
+        doc_hashes = list(doc_hashes)
+        totals = {"documents": 0, "words": 0, "tokens": 0, "pages": 0, "chunks": 0, "convert_seconds": 0.0, "bytes": 0}
+        by_type = {}
+        with self._lock:
+            for start in range(0, len(doc_hashes), _IN_BATCH):
+                batch = doc_hashes[start:start + _IN_BATCH]
+                rows = self._conn.execute(
+                    "SELECT file_type, COUNT(*), SUM(words), SUM(tokens), SUM(pages), SUM(chunks), "
+                    f"SUM(convert_seconds), SUM(bytes) FROM stats WHERE doc_hash IN ({','.join('?' * len(batch))}) "
+                    "GROUP BY file_type",
+                    batch,
+                )
+                for file_type, *sums in rows:
+                    entry = by_type.setdefault(file_type or "", dict.fromkeys(totals, 0))
+                    for key, value in zip(totals, sums):
+                        entry[key] += value or 0
+                        totals[key] += value or 0
+        return {"totals": totals, "by_type": by_type}
@@ -0,0 +1,135 @@
+import atexit
+import os
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from metrics import metrics
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "64"))
+# Worker processes for large ingests; 0 keeps all encoding in-process
+WORKERS = int(os.environ.get("EMBED_WORKERS", "0"))
+MULTI_PROCESS_MIN_TEXTS = int(os.environ.get("EMBED_MULTI_PROCESS_MIN_TEXTS", "2000"))
+
+
+# ----------------- EMBEDDING SERVICE -----------------
+class EmbeddingService(Embeddings):
+    """
+    One loaded SentenceTransformer that every session encodes through.
+    Drop-in for HuggingFaceEmbeddings (same model, same unnormalized
+    vectors), plus tunable batching, an optional multi-process pool for
+    big ingests and running throughput counters.
+
+    Creating the service is instant: the model is loaded by the first
+    encode, or ahead of time by load() (e.g. on a background thread while
+    the page renders).
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, batch_size: int = BATCH_SIZE,
+                 workers: int = WORKERS, multi_process_min_texts: int = MULTI_PROCESS_MIN_TEXTS):
+        self.model_name = model_name
+        self._model = None
+        self._load_lock = threading.Lock()
+        self.load_seconds = 0.0
+
+        self.batch_size = batch_size
+        self.workers = workers
+        self.multi_process_min_texts = multi_process_min_texts
+        self._pool = None
+        self._lock = threading.Lock()
+        self._stats = {"texts": 0, "batches": 0, "seconds": 0.0, "queries": 0, "query_seconds": 0.0}
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+
+                    start = time.perf_counter()
+                    self._model = SentenceTransformer(self.model_name, device="cpu")
+                    self.load_seconds = time.perf_counter() - start
+        return self._model
+
+    def load(self) -> "EmbeddingService":
+        """Load the model now rather than on the first encode."""
+        self.model
+        return self
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = self.model.start_multi_process_pool(target_devices=["cpu"] * self.workers)
+                atexit.register(self.close)
+            return self._pool
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self.model.stop_multi_process_pool(self._pool)
+                self._pool = None
+
+    def count_tokens_batch(self, texts):
+        """Word pieces the model reads for each text (not counting [CLS]/[SEP]), with its own tokenizer."""
+        texts = list(texts)
+        if not texts:
+            return []
+        # verbose=False: texts longer than the model reads are expected here, that is what's being measured
+        encoded = self.model.tokenizer(texts, add_special_tokens=False, return_attention_mask=False,
+                                       return_token_type_ids=False, verbose=False)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def encode(self, texts, batch_size: int = None):
+        batch_size = batch_size or self.batch_size
+        if self.workers > 1 and len(texts) >= self.multi_process_min_texts:
+            return self.model.encode_multi_process(texts, self._get_pool(), batch_size=batch_size)
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        start = time.perf_counter()
+        vectors = self.encode(texts)
+        elapsed = time.perf_counter() - start
+        metrics.observe("stage_seconds", elapsed, stage="embed", kind="documents", status="ok")
+        metrics.inc("texts_total", len(texts), stage="embed")
+        with self._lock:
+            self._stats["texts"] += len(texts)
+            self._stats["batches"] += -(-len(texts) // self.batch_size)
+            self._stats["seconds"] += elapsed
+        return vectors.tolist()
+
+    def embed_query(self, text: str):
+        start = time.perf_counter()
+        vector = self.encode([text])[0]
+        elapsed = time.perf_counter() - start
+        metrics.observe("stage_seconds", elapsed, stage="embed", kind="query", status="ok")
+        with self._lock:
+            self._stats["queries"] += 1
+            self._stats["query_seconds"] += elapsed
+        return vector.tolist()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["texts_per_second"] = stats["texts"] / stats["seconds"] if stats["seconds"] else 0.0
+        stats["avg_query_ms"] = 1000 * stats["query_seconds"] / stats["queries"] if stats["queries"] else 0.0
+        stats["load_seconds"] = self.load_seconds
+        return stats
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(model_name: str = DEFAULT_MODEL) -> EmbeddingService:
+    """The process-wide service for `model_name`, loading the model on first use only."""
+    with _services_lock:
+        service = _services.get(model_name)
+        if service is None:
+            service = _services[model_name] = EmbeddingService(model_name)
+    return service
@@ -0,0 +1,116 @@
+"""
+A stand-in for the OpenAI chat completions endpoint, for trying the apps
+and llm_gateway.py without an API key, network or cost.
+
+    python fake_openai.py --port 8001 --latency 0.3 --fail-every 5
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=fake streamlit run Final_app3.py
+
+Answers echo the question, streamed word by word when stream=true.
+--fail-every N answers every Nth request with a 429 (and a short
+Retry-After), so retries and backoff can be watched too.
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(latency: float = 0.0, token_delay: float = 0.0, fail_every: int = 0, words: int = 40):
+    counter = itertools.count(1)
+    counter_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status: int, body: dict, headers: dict = None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": f"No route {self.path}"}})
+                return
+            with counter_lock:
+                n = next(counter)
+            if fail_every and n % fail_every == 0:
+                self._send_json(429, {"error": {"message": "Rate limit reached (fake)", "type": "rate_limit"}},
+                                {"Retry-After": "0.1"})
+                return
+
+            question = str(request.get("messages", [{}])[-1].get("content", ""))[-200:]
+            answer = (f"Fake answer to: {question} " + "lorem " * words).split()[:words]
+            model = request.get("model", "fake")
+            time.sleep(latency)
+
+            if not request.get("stream"):
+                self._send_json(200, {
+                    "id": f"fake-{n}", "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": " ".join(answer)}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": len(answer), "total_tokens": len(answer)},
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send_event(payload: str):
+                data = f"data: {payload}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            for i, word in enumerate(answer):
+                send_event(json.dumps({
+                    "id": f"fake-{n}", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "finish_reason": None,
+                                 "delta": {"content": word if i == 0 else " " + word}}],
+                }))
+                time.sleep(token_delay)
+            send_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+def serve(port: int = 0, **options):
+    """Start the fake server on a background thread; returns it and its base_url."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(**options))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server.")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the answer starts")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed words")
+    parser.add_argument("--fail-every", type=int, default=0, help="answer every Nth request with a 429")
+    parser.add_argument("--words", type=int, default=40, help="words per answer")
+    args = parser.parse_args(argv)
+
+    server, base_url = serve(args.port, latency=args.latency, token_delay=args.token_delay,
+                             fail_every=args.fail_every, words=args.words)
+    print(f"Fake OpenAI API at {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+# Finished tasks are dropped from the status table after this long, and beyond this many
+# (sessions that ended never call forget(), and each task holds a preview of its document)
+FINISHED_TTL_SECONDS = float(os.environ.get("INGEST_FINISHED_TTL_SECONDS", "3600"))
+MAX_FINISHED = int(os.environ.get("INGEST_MAX_FINISHED", "500"))
+
+QUEUED = "queued"
+INDEXED = "indexed"
+FAILED = "failed"
+
+
+@dataclass
+class IngestTask:
+    task_id: int
+    owner: str
+    name: str
+    path: str
+    stage: str = QUEUED
+    error: str = None
+    # Whatever the stages hand to each other (markdown, doc_hash, chunks, ...)
+    result: dict = field(default_factory=dict)
+    timings: dict = field(default_factory=dict)
+    submitted: float = field(default_factory=time.time)
+    finished: float = None
+
+    @property
+    def done(self) -> bool:
+        return self.stage in (INDEXED, FAILED)
+
+
+# ----------------- INGESTION QUEUE -----------------
+class IngestQueue:
+    """
+    Background document ingestion. Each task runs through `stages`, a list
+    of (name, fn) pairs where fn(task) reads and writes task.result; the
+    task's stage is updated as it goes so the UI can poll it, and a task
+    that reaches INDEXED is searchable straight away.
+
+    A small pool of worker threads takes tasks round-robin across owners
+    (one Streamlit session each), so a user uploading 200 files doesn't
+    hold up someone uploading one, and the pool size caps how much CPU
+    ingestion can take from queries.
+    """
+
+    def __init__(self, stages, workers: int = WORKERS, finished_ttl: float = FINISHED_TTL_SECONDS,
+                 max_finished: int = MAX_FINISHED, on_finish=None):
+        self.stages = list(stages)
+        # Called with each task once it is indexed, failed or cancelled (e.g. to release its file)
+        self.on_finish = on_finish
+        self.finished_ttl = finished_ttl
+        self.max_finished = max_finished
+        self._queues = OrderedDict()
+        self._tasks = {}
+        # Finished task ids, oldest first
+        self._finished = OrderedDict()
+        self._ids = itertools.count(1)
+        self._cv = threading.Condition()
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._work, name=f"ingest-{i}", daemon=True).start()
+
+    def submit(self, owner: str, name: str, path: str) -> IngestTask:
+        with self._cv:
+            self._evict()
+            task = IngestTask(next(self._ids), owner, name, path)
+            self._tasks[task.task_id] = task
+            self._queues.setdefault(owner, deque()).append(task)
+            self._cv.notify()
+            return task
+
+    def get(self, task_ids) -> list:
+        """The tasks still known; finished ones may have been evicted (see FINISHED_TTL_SECONDS)."""
+        with self._cv:
+            self._evict()
+            return [self._tasks[i] for i in task_ids if i in self._tasks]
+
+    def forget(self, task_ids) -> None:
+        """Drop finished tasks from the status table (queued ones are cancelled)."""
+        cancelled = []
+        with self._cv:
+            for task_id in task_ids:
+                task = self._tasks.pop(task_id, None)
+                self._finished.pop(task_id, None)
+                if task is not None and task.stage == QUEUED:
+                    queue = self._queues.get(task.owner)
+                    if queue is not None and task in queue:
+                        queue.remove(task)
+                        cancelled.append(task)
+        if self.on_finish is not None:
+            for task in cancelled:
+                self.on_finish(task)
+
+    def _evict(self) -> None:
+        # Called with self._cv held
+        cutoff = time.time() - self.finished_ttl
+        while self._finished:
+            task_id, finished = next(iter(self._finished.items()))
+            if finished >= cutoff and len(self._finished) <= self.max_finished:
+                break
+            del self._finished[task_id]
+            self._tasks.pop(task_id, None)
+
+    def pending(self) -> int:
+        with self._cv:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def _next_task(self):
+        # Rotate owners: take one task from the owner at the front, then send them to the back
+        while self._queues:
+            owner, queue = next(iter(self._queues.items()))
+            if not queue:
+                del self._queues[owner]
+                continue
+            task = queue.popleft()
+            if queue:
+                self._queues.move_to_end(owner)
+            else:
+                del self._queues[owner]
+            return task
+        return None
+
+    def _work(self) -> None:
+        while True:
+            with self._cv:
+                task = self._next_task()
+                while task is None:
+                    self._cv.wait()
+                    task = self._next_task()
+
+            for stage, fn in self.stages:
+                task.stage = stage
+                start = time.perf_counter()
+                try:
+                    fn(task)
+                except Exception as e:
+                    task.error = f"{type(e).__name__}: {e}"
+                    task.stage = FAILED
+                    break
+                finally:
+                    task.timings[stage] = time.perf_counter() - start
+            else:
+                task.stage = INDEXED
+            with self._cv:
+                task.finished = time.time()
+                if task.task_id in self._tasks:
+                    self._finished[task.task_id] = task.finished
+            if self.on_finish is not None:
+                self.on_finish(task)
@@ -0,0 +1,137 @@
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+
+# Standard BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were "
+    "what when where which who why will with how do does did i you he she they we".split()
+)
+
+
+def tokenize(text: str):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+# ----------------- KEYWORD (BM25) INDEX -----------------
+class KeywordIndex:
+    """
+    Inverted index in a SQLite file next to the vector store: one posting
+    (term, chunk_id, tf) per distinct term in a chunk, plus each chunk's
+    length for BM25 length normalization. Chunks are added and removed per
+    document, mirroring DocumentIndex, so it stays in step incrementally.
+
+    It also holds the commit log of the store it sits next to: a document
+    is only indexed once commit() recorded it, so one whose ingest died
+    half way (batches on disk, no commit) isn't mistaken for a whole one.
+    """
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # Indexes from before the commit log existed have every document on disk committed
+            self.had_commit_log = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'documents'"
+            ).fetchone() is not None
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "doc_hash TEXT PRIMARY KEY, source TEXT, chunks INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "chunk_id TEXT PRIMARY KEY, doc_hash TEXT NOT NULL, length INTEGER NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_doc ON chunks(doc_hash)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                "term TEXT NOT NULL, chunk_id TEXT NOT NULL, tf INTEGER NOT NULL, "
+                "PRIMARY KEY (term, chunk_id)) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS postings_chunk ON postings(chunk_id)")
+
+    def commit(self, doc_hash: str, source: str, chunks: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?)", (doc_hash, source, chunks))
+
+    def committed(self) -> dict:
+        """doc_hash -> {"source", "chunks"} of every committed document."""
+        with self._lock:
+            rows = self._conn.execute("SELECT doc_hash, source, chunks FROM documents").fetchall()
+        return {doc_hash: {"source": source, "chunks": chunks} for doc_hash, source, chunks in rows}
+
+    def doc_hashes(self) -> set:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT DISTINCT doc_hash FROM chunks")}
+
+    def add(self, doc_hash: str, chunk_ids, texts) -> None:
+        chunk_rows, posting_rows = [], []
+        for chunk_id, text in zip(chunk_ids, texts):
+            terms = Counter(tokenize(text))
+            chunk_rows.append((chunk_id, doc_hash, sum(terms.values())))
+            posting_rows.extend((term, chunk_id, tf) for term, tf in terms.items())
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)", chunk_rows)
+            self._conn.executemany("INSERT OR REPLACE INTO postings VALUES (?, ?, ?)", posting_rows)
+
+    def remove(self, doc_hash: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM documents WHERE doc_hash = ?", (doc_hash,))
+            self._conn.execute(
+                "DELETE FROM postings WHERE chunk_id IN (SELECT chunk_id FROM chunks WHERE doc_hash = ?)",
+                (doc_hash,),
+            )
+            self._conn.execute("DELETE FROM chunks WHERE doc_hash = ?", (doc_hash,))
+
+    def search(self, query: str, doc_hashes=None, k: int = 20):
+        """Top-k (chunk_id, bm25 score), optionally only within the given documents."""
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        term_marks = ",".join("?" * len(terms))
+        doc_filter, doc_args = "", []
+        if doc_hashes is not None:
+            doc_hashes = list(doc_hashes)
+            if not doc_hashes:
+                return []
+            doc_filter = f" AND c.doc_hash IN ({','.join('?' * len(doc_hashes))})"
+            doc_args = doc_hashes
+
+        with self._lock:
+            total, avg_length = self._conn.execute("SELECT COUNT(*), AVG(length) FROM chunks").fetchone()
+            if not total:
+                return []
+            df = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({term_marks}) GROUP BY term", terms
+            ))
+            rows = self._conn.execute(
+                "SELECT p.term, p.chunk_id, p.tf, c.length FROM postings p "
+                f"JOIN chunks c ON c.chunk_id = p.chunk_id WHERE p.term IN ({term_marks}){doc_filter}",
+                terms + doc_args,
+            ).fetchall()
+
+        avg_length = avg_length or 1.0
+        idf = {term: math.log(1 + (total - n + 0.5) / (n + 0.5)) for term, n in df.items()}
+        scores = {}
+        for term, chunk_id, tf, length in rows:
+            norm = tf + K1 * (1 - B + B * length / avg_length)
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf[term] * tf * (K1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def reciprocal_rank_fusion(*rankings, k: int = 60):
+    """Fuse ranked lists of ids into one: score = sum of 1 / (k + rank) over the lists an id is in."""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return [item for item, _ in sorted(scores.items(), key=lambda pair: pair[1], reverse=True)]
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+from metrics import metrics
+from tokens import count_tokens
+
+# Requests one server process may have in flight at once; the rest wait their turn
+MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+TIMEOUT_SECONDS = float(os.environ.get("LLM_TIMEOUT_SECONDS", "30"))
+MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "4"))
+# Backoff before retry n is a random delay up to min(BACKOFF_MAX, BACKOFF_BASE * 2**n)
+BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX_SECONDS", "20"))
+# Prompt + completion tokens per minute this process may use (your account's TPM limit); 0 = no limit
+TOKENS_PER_MINUTE = int(os.environ.get("LLM_TOKENS_PER_MINUTE", "90000"))
+
+_SAMPLES = 1000
+_DONE = object()
+
+
+class TokenBucket:
+    """Token-rate budget: tokens_per_minute, refilled continuously, bursting up to one minute's worth."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.available = float(tokens_per_minute)
+        self.updated = time.monotonic()
+
+    async def acquire(self, tokens: int) -> None:
+        if not self.capacity:
+            return
+        tokens = min(tokens, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.available = min(self.capacity, self.available + (now - self.updated) * self.capacity / 60)
+            self.updated = now
+            if self.available >= tokens:
+                self.available -= tokens
+                return
+            await asyncio.sleep((tokens - self.available) * 60 / self.capacity)
+
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """Full-jitter exponential backoff, or the server's Retry-After when it sent one."""
+    if retry_after:
+        return min(BACKOFF_MAX, retry_after)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def _retry_after(error) -> float:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# ----------------- LLM GATEWAY -----------------
+class LLMGateway:
+    """
+    Every chat completion of the process goes through here. One
+    AsyncOpenAI client with a pooled httpx connection pool runs on its own
+    event loop thread, so Streamlit script threads just block on (or
+    iterate over) the result while other sessions' requests proceed.
+
+    Requests wait for a concurrency slot and for room in the token-rate
+    budget (that wait is "queue time"), then are sent with a timeout;
+    429s, timeouts, dropped connections and 5xx are retried with jittered
+    exponential backoff. Point base_url (or OPENAI_BASE_URL) at
+    fake_openai.py to exercise all of it without the real API.
+    """
+
+    def __init__(self, api_key: str = None, base_url: str = None, max_concurrency: int = MAX_CONCURRENCY,
+                 timeout: float = TIMEOUT_SECONDS, max_retries: int = MAX_RETRIES,
+                 tokens_per_minute: int = TOKENS_PER_MINUTE):
+        import httpx
+        import openai
+
+        self._openai = openai
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True).start()
+
+        async def setup():
+            # Loop-bound objects have to be created on the loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._bucket = TokenBucket(tokens_per_minute)
+            self._client = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=0,  # retries happen here, with backoff and metrics
+                http_client=httpx.AsyncClient(
+                    timeout=httpx.Timeout(timeout, connect=min(timeout, 10.0)),
+                    limits=httpx.Limits(max_connections=self.max_concurrency,
+                                        max_keepalive_connections=self.max_concurrency),
+                ),
+            )
+
+        asyncio.run_coroutine_threadsafe(setup(), self._loop).result()
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "errors": 0, "in_flight": 0, "tokens": 0}
+        self._queue_seconds = deque(maxlen=_SAMPLES)
+        self._model_seconds = deque(maxlen=_SAMPLES)
+
+    @property
+    def _retryable(self):
+        o = self._openai
+        return (o.RateLimitError, o.APITimeoutError, o.APIConnectionError, o.InternalServerError)
+
+    @staticmethod
+    def _estimate_tokens(request: dict) -> int:
+        prompt = sum(count_tokens(str(m.get("content", ""))) for m in request.get("messages", []))
+        return prompt + request.get("max_tokens", 0)
+
+    def _record(self, **values) -> None:
+        with self._lock:
+            for key, value in values.items():
+                self._stats[key] += value
+
+    async def _run(self, request: dict, on_token=None) -> str:
+        """Send one request (streamed if on_token is given), retrying what can be retried."""
+        queued, tokens = time.perf_counter(), self._estimate_tokens(request)
+        async with self._semaphore:
+            await self._bucket.acquire(tokens)
+            self._queue_seconds.append(time.perf_counter() - queued)
+            metrics.observe("stage_seconds", self._queue_seconds[-1], stage="llm_queue", status="ok")
+            metrics.inc("tokens_total", tokens, stage="llm")
+            self._record(requests=1, in_flight=1, tokens=tokens)
+            try:
+                for attempt in range(self.max_retries + 1):
+                    started, sent_any = time.perf_counter(), False
+                    try:
+                        if on_token is None:
+                            response = await self._client.chat.completions.create(**request)
+                            text = response.choices[0].message.content or ""
+                        else:
+                            parts = []
+                            async for chunk in await self._client.chat.completions.create(stream=True, **request):
+                                if chunk.choices and chunk.choices[0].delta.content:
+                                    sent_any = True
+                                    parts.append(chunk.choices[0].delta.content)
+                                    on_token(chunk.choices[0].delta.content)
+                            text = "".join(parts)
+                        self._model_seconds.append(time.perf_counter() - started)
+                        metrics.observe("stage_seconds", self._model_seconds[-1], stage="llm_model", status="ok")
+                        return text
+                    except self._retryable as e:
+                        # Half an answer is already on screen: retrying would repeat it
+                        if sent_any or attempt == self.max_retries:
+                            raise
+                        self._record(retries=1)
+                        metrics.inc("llm_retries_total", error=type(e).__name__)
+                        await asyncio.sleep(backoff_delay(attempt, _retry_after(e)))
+            except Exception:
+                self._record(errors=1)
+                raise
+            finally:
+                self._record(in_flight=-1)
+
+    def complete(self, **request) -> str:
+        """The answer text of one chat completion (blocks the calling thread, not the others)."""
+        return asyncio.run_coroutine_threadsafe(self._run(request), self._loop).result()
+
+    def stream(self, **request):
+        """Content deltas of one chat completion, as a plain iterator for TimedStream / st.write_stream."""
+        tokens = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._run(request, on_token=tokens.put), self._loop)
+        future.add_done_callback(lambda _: tokens.put(_DONE))
+        try:
+            while True:
+                token = tokens.get()
+                if token is _DONE:
+                    break
+                yield token
+            future.result()  # re-raise whatever ended the request
+        finally:
+            # The reader stopped early (rerun, closed tab): stop generating what nobody will read
+            future.cancel()
+
+    def metrics(self) -> dict:
+        """Request counts, and where time goes: waiting for a slot / budget vs. waiting for the model."""
+        with self._lock:
+            stats = dict(self._stats)
+            queue_seconds, model_seconds = list(self._queue_seconds), list(self._model_seconds)
+        stats.update({
+            "queue_p50_ms": 1000 * _percentile(queue_seconds, 0.5),
+            "queue_p95_ms": 1000 * _percentile(queue_seconds, 0.95),
+            "model_p50_ms": 1000 * _percentile(model_seconds, 0.5),
+            "model_p95_ms": 1000 * _percentile(model_seconds, 0.95),
+        })
+        return stats
+
+    def close(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway(api_key: str = None, base_url: str = None) -> LLMGateway:
+    """The process-wide gateway for this key and server, created on first use only."""
+    with _gateways_lock:
+        gateway = _gateways.get((api_key, base_url))
+        if gateway is None:
+            gateway = _gateways[(api_key, base_url)] = LLMGateway(api_key, base_url)
+    return gateway
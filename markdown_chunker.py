@@ -0,0 +1,252 @@
+import importlib.util
+import os
+import re
+
+from langchain_core.documents import Document
+
+from metrics import metrics
+from tokens import count_tokens_batch
+
+# Chunk size in tokens of the embedding model. all-MiniLM-L6-v2 reads at most 256 word pieces,
+# [CLS] and [SEP] included, so longer chunks would only be embedded by their beginning
+CHUNK_SETTINGS = {
+    "target_tokens": int(os.environ.get("CHUNK_TARGET_TOKENS", "200")),
+    "max_tokens": int(os.environ.get("CHUNK_MAX_TOKENS", "254")),
+}
+
+HEADING = "heading"
+TABLE = "table"
+CODE = "code"
+TEXT = "text"
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{2,}")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+# The "\n\n" between a chunk's blocks: at most one token in any tokenizer
+_JOINER_TOKENS = 1
+
+
+def count_embedder_tokens(texts):
+    """
+    Tokens per text as the embedding model counts them, with its own
+    tokenizer, so max_tokens means what the model will actually read.
+    Where sentence-transformers isn't installed there is no such model,
+    and tiktoken's count stands in.
+    """
+    if importlib.util.find_spec("sentence_transformers") is None:
+        return count_tokens_batch(texts)
+    # Imported here: the embedding service pulls in the model libraries
+    from embedding_service import get_embedding_service
+    return get_embedding_service().count_tokens_batch(texts)
+
+
+def _is_table_row(line: str) -> bool:
+    return line.lstrip().startswith("|")
+
+
+def iter_blocks(markdown: str):
+    """Split Markdown into (kind, text, heading level) blocks: headings, whole tables, code fences, paragraphs."""
+    lines = markdown.split("\n")
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if not line.strip():
+            i += 1
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            yield HEADING, heading.group(2), len(heading.group(1))
+            i += 1
+            continue
+
+        start = i
+        if _FENCE.match(line):
+            fence = _FENCE.match(line).group(1)
+            i += 1
+            while i < len(lines) and not lines[i].lstrip().startswith(fence):
+                i += 1
+            i += 1
+            yield CODE, "\n".join(lines[start:i]), 0
+        elif _is_table_row(line):
+            while i < len(lines) and _is_table_row(lines[i]):
+                i += 1
+            yield TABLE, "\n".join(lines[start:i]), 0
+        else:
+            # A paragraph or list runs until a blank line or the next block of another kind
+            while (i < len(lines) and lines[i].strip() and not _HEADING.match(lines[i])
+                   and not _FENCE.match(lines[i]) and not _is_table_row(lines[i])):
+                i += 1
+            yield TEXT, "\n".join(lines[start:i]), 0
+
+
+# ----------------- MARKDOWN CHUNKER -----------------
+class MarkdownChunker:
+    """
+    Chunks docling Markdown along its structure instead of every N
+    characters: a chunk never crosses into a new section unless the one
+    it's in is still small, tables stay whole (or are split between rows,
+    repeating the header row), and every chunk carries its heading path
+    ("Report > Results > Q3") as metadata. Sizes are in tokens of the
+    embedding model (count_embedder_tokens, unless count_batch is given),
+    counted a whole section's blocks at a time.
+
+    One chunker per document: feed() it the Markdown piece by piece as
+    it is converted, then finish() for the last chunk. Headings and a
+    half-filled chunk carry over from one piece to the next.
+    """
+
+    def __init__(self, target_tokens: int = CHUNK_SETTINGS["target_tokens"],
+                 max_tokens: int = CHUNK_SETTINGS["max_tokens"], count_batch=None):
+        self.target_tokens = target_tokens
+        self.max_tokens = max(max_tokens, target_tokens)
+        self.count_batch = count_batch or count_embedder_tokens
+        self._headings = []
+        self._reset()
+
+    def _reset(self) -> None:
+        self._parts = []
+        self._tokens = 0
+        self._has_body = False
+        self._path = None
+        self._metadata = None
+        self._last_metadata = None
+
+    def _emit(self, chunks) -> None:
+        # Headings at the very end introduce what comes next: move them to the next chunk
+        carried = []
+        while self._has_body and self._parts and not self._parts[-1][2]:
+            carried.insert(0, self._parts.pop())
+        if self._has_body:
+            metadata = dict(self._metadata or {})
+            if self._path:
+                metadata["headings"] = " > ".join(self._path)
+            # A chunk that spans two converted page ranges covers both
+            first_pages = metadata.get("pages")
+            last_pages = (self._last_metadata or {}).get("pages")
+            if first_pages and last_pages and first_pages != last_pages:
+                metadata["pages"] = f"{first_pages.split('-')[0]}-{last_pages.split('-')[-1]}"
+            chunks.append(Document(page_content="\n\n".join(text for text, _, _ in self._parts), metadata=metadata))
+        last_metadata = self._last_metadata
+        self._reset()
+        for text, tokens, _ in carried:
+            self._append(text, tokens, last_metadata, body=False)
+
+    def _size(self, extra_tokens: int = 0) -> int:
+        """Tokens of the open chunk, joiners included, if a block of extra_tokens were added to it."""
+        parts = len(self._parts) + bool(extra_tokens)
+        return self._tokens + extra_tokens + _JOINER_TOKENS * max(0, parts - 1)
+
+    def _heading_overhead(self) -> int:
+        """Tokens the headings waiting at the end of the open chunk add to whatever block comes next."""
+        overhead = 0
+        for _, tokens, body in reversed(self._parts):
+            if body:
+                break
+            overhead += tokens + _JOINER_TOKENS
+        return overhead
+
+    def _append(self, text: str, tokens: int, metadata, body: bool = True) -> None:
+        if not self._parts:
+            self._metadata = metadata
+        if body and not self._has_body:
+            # The path of the text, not of the title the chunk may open with
+            self._path = [title for _, title in self._headings]
+        self._parts.append((text, tokens, body))
+        self._tokens += tokens
+        self._has_body = self._has_body or body
+        self._last_metadata = metadata
+
+    def _split_table(self, table: str, limit: int):
+        rows = table.split("\n")
+        header = []
+        if len(rows) > 1 and _TABLE_SEPARATOR.match(rows[1]):
+            header, rows = rows[:2], rows[2:]
+        header_text = "\n".join(header)
+        header_tokens = self.count_batch([header_text])[0] if header else 0
+        return self._group(rows, "\n", min(limit, self.target_tokens), prefix=header_text, prefix_tokens=header_tokens)
+
+    def _split_text(self, text: str, limit: int):
+        sentences = _SENTENCE_END.split(text)
+        counts = self.count_batch(sentences)
+        units = []
+        for sentence, tokens in zip(sentences, counts):
+            if tokens <= limit:
+                units.append(sentence)
+                continue
+            # One enormous "sentence" (e.g. extracted text without punctuation): cut it by words
+            words = sentence.split()
+            step = max(1, len(words) * min(limit, self.target_tokens) // tokens)
+            units.extend(" ".join(words[i:i + step]) for i in range(0, len(words), step))
+        return self._group(units, " ", min(limit, self.target_tokens))
+
+    def _group(self, units, joiner: str, budget: int, prefix: str = "", prefix_tokens: int = 0):
+        """Pack units into pieces of up to budget tokens (each piece starting with `prefix`)."""
+        pieces, current, tokens = [], [], prefix_tokens
+        for unit, unit_tokens in zip(units, self.count_batch(units)):
+            if current and tokens + unit_tokens > budget:
+                pieces.append(joiner.join(([prefix] if prefix else []) + current))
+                current, tokens = [], prefix_tokens
+            current.append(unit)
+            tokens += unit_tokens
+        if current:
+            pieces.append(joiner.join(([prefix] if prefix else []) + current))
+        return list(zip(pieces, self.count_batch(pieces)))
+
+    def feed(self, markdown: str, metadata: dict = None) -> list:
+        """Chunks completed by this piece of Markdown (the last one stays open for the next piece)."""
+        with metrics.span("split"):
+            chunks = self._feed(markdown, metadata)
+        metrics.inc("chunks_total", len(chunks), stage="split")
+        return chunks
+
+    def _feed(self, markdown: str, metadata: dict) -> list:
+        chunks = []
+        blocks = list(iter_blocks(markdown))
+        # Headings counted as they appear in the chunk, "#"s included
+        counts = self.count_batch(["#" * level + " " + text if kind == HEADING else text for kind, text, level in blocks])
+        metrics.inc("tokens_total", sum(counts), stage="split")
+        for (kind, text, level), tokens in zip(blocks, counts):
+            if kind == HEADING:
+                # New section: close the current chunk unless it's too small to stand on its own
+                if self._has_body and self._size() >= self.target_tokens // 2:
+                    self._emit(chunks)
+                while self._headings and self._headings[-1][0] >= level:
+                    self._headings.pop()
+                self._headings.append((level, text))
+                self._append("#" * level + " " + text, tokens, metadata, body=False)
+                continue
+
+            # Headings waiting for this block go in front of it: leave them room under max_tokens
+            limit = max(self.max_tokens - self._heading_overhead(), self.target_tokens // 2)
+            if tokens > limit:
+                pieces = self._split_table(text, limit) if kind == TABLE else self._split_text(text, limit)
+            else:
+                pieces = [(text, tokens)]
+            for piece, piece_tokens in pieces:
+                if self._has_body and self._size(piece_tokens) > self.target_tokens:
+                    self._emit(chunks)
+                # Still too big with its headings: drop the outermost ones from the text
+                # (the heading path in the metadata keeps them)
+                while not self._has_body and self._parts and self._size(piece_tokens) > self.max_tokens:
+                    _, heading_tokens, _ = self._parts.pop(0)
+                    self._tokens -= heading_tokens
+                self._append(piece, piece_tokens, metadata)
+        return chunks
+
+    def finish(self) -> list:
+        """The last, still open chunk (if it has any content)."""
+        chunks = []
+        self._emit(chunks)
+        self._headings = []
+        metrics.inc("chunks_total", len(chunks), stage="split")
+        return chunks
+
+    def create_documents(self, texts, metadatas=None) -> list:
+        """Same call as RecursiveCharacterTextSplitter.create_documents: each text chunked on its own."""
+        chunks = []
+        for i, text in enumerate(texts):
+            chunks.extend(self.feed(text, metadatas[i] if metadatas else None))
+            chunks.extend(self.finish())
+        return chunks
@@ -0,0 +1,211 @@
+import errno
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Append every observation here as one JSON line (empty: don't write a log)
+JSONL_PATH = os.environ.get("METRICS_JSONL", "")
+# Serve /metrics in Prometheus text format on this port (0: don't); see start_exporter()
+PROMETHEUS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+
+# Upper bounds (seconds) of the Prometheus histogram buckets for stage durations
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Recent observations kept per series for p50 / p95
+_SAMPLES = 2048
+
+
+def _series_key(name: str, labels: dict):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _label_text(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def _percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# ----------------- METRICS REGISTRY -----------------
+class Metrics:
+    """
+    Process-wide timings and counters for the whole pipeline. Durations
+    go into stage_seconds histograms (one series per stage and label set,
+    with Prometheus buckets plus recent samples for percentiles); bytes,
+    tokens and cache lookups are plain counters. Everything can be read
+    back as a snapshot, rendered as Prometheus text, or streamed to a
+    JSON lines file as it happens.
+    """
+
+    def __init__(self, jsonl_path: str = JSONL_PATH):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._jsonl = open(jsonl_path, "a", encoding="utf-8", buffering=1) if jsonl_path else None
+
+    def _log(self, kind: str, name: str, labels: dict, value: float) -> None:
+        if self._jsonl is not None:
+            line = json.dumps({"ts": time.time(), "kind": kind, "name": name, "labels": labels, "value": value})
+            with self._lock:
+                self._jsonl.write(line + "\n")
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _series_key(name, labels)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = {
+                    "count": 0, "sum": 0.0, "buckets": [0] * len(BUCKETS), "samples": deque(maxlen=_SAMPLES),
+                }
+            series["count"] += 1
+            series["sum"] += value
+            series["samples"].append(value)
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    series["buckets"][i] += 1
+        self._log("histogram", name, labels, value)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _series_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._log("counter", name, labels, value)
+
+    @contextmanager
+    def span(self, stage: str, **labels):
+        """Time the block as stage_seconds{stage=...}; failures are timed too, under status="error"."""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=stage, status=status, **labels)
+
+    def cache(self, cache: str, result: str) -> None:
+        """One lookup in a cache: result is "hit", "miss" (or e.g. "near_hit")."""
+        self.inc("cache_requests_total", cache=cache, result=result)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": series["count"],
+                    "sum": series["sum"],
+                    "p50": _percentile(series["samples"], 0.5),
+                    "p95": _percentile(series["samples"], 0.95),
+                    "buckets": list(series["buckets"]),
+                }
+                for (name, labels), series in self._histograms.items()
+            ]
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in self._counters.items()
+            ]
+        return {"histograms": histograms, "counters": counters}
+
+    def cache_hit_rates(self) -> dict:
+        """cache name -> {"hits", "lookups", "hit_rate"}; near hits count as hits."""
+        rates = {}
+        for counter in self.snapshot()["counters"]:
+            if counter["name"] != "cache_requests_total":
+                continue
+            entry = rates.setdefault(counter["labels"]["cache"], {"hits": 0, "lookups": 0})
+            entry["lookups"] += counter["value"]
+            if counter["labels"]["result"] != "miss":
+                entry["hits"] += counter["value"]
+        for entry in rates.values():
+            entry["hit_rate"] = entry["hits"] / entry["lookups"] if entry["lookups"] else 0.0
+        return rates
+
+    def prometheus(self) -> str:
+        """Everything in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        for name in sorted({h["name"] for h in snapshot["histograms"]}):
+            lines.append(f"# TYPE {name} histogram")
+            for h in (h for h in snapshot["histograms"] if h["name"] == name):
+                labels = sorted(h["labels"].items())
+                for bound, count in zip(BUCKETS, h["buckets"]):
+                    lines.append(f"{name}_bucket{_label_text(labels + [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{_label_text(labels + [('le', '+Inf')])} {h['count']}")
+                lines.append(f"{name}_sum{_label_text(labels)} {h['sum']}")
+                lines.append(f"{name}_count{_label_text(labels)} {h['count']}")
+        for name in sorted({c["name"] for c in snapshot["counters"]}):
+            lines.append(f"# TYPE {name} counter")
+            for c in (c for c in snapshot["counters"] if c["name"] == name):
+                lines.append(f"{name}{_label_text(sorted(c['labels'].items()))} {c['value']}")
+        return "\n".join(lines) + "\n"
+
+    def jsonl(self) -> str:
+        """The current snapshot as JSON lines (one series per line)."""
+        snapshot = self.snapshot()
+        return "".join(
+            json.dumps({"kind": kind, **series}) + "\n"
+            for kind in ("histograms", "counters")
+            for series in snapshot[kind]
+        )
+
+
+metrics = Metrics()
+
+logger = logging.getLogger(__name__)
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def serve_prometheus(port: int = PROMETHEUS_PORT):
+    """Expose metrics.prometheus() at http://<host>:port/metrics from a background thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            body = metrics.prometheus().encode("utf-8")
+            self.send_response(200 if self.path.startswith("/metrics") else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def start_exporter(port: int = PROMETHEUS_PORT):
+    """
+    Serve /metrics from this process if METRICS_PORT is set. Called by the
+    app entry points, not on import: worker processes (spawned converters)
+    import this module too and must not compete for the port. Starts once
+    per process; a port someone else already holds is logged and skipped.
+    """
+    global _exporter
+    if not port or multiprocessing.parent_process() is not None:
+        return None
+    with _exporter_lock:
+        if _exporter is None:
+            try:
+                _exporter = serve_prometheus(port)
+            except OSError as e:
+                if e.errno != errno.EADDRINUSE:
+                    raise
+                logger.warning("Metrics port %s is already in use; not exporting from this process", port)
+                _exporter = False  # don't retry on every rerun
+        return _exporter or None
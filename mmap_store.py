@@ -0,0 +1,266 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+from langchain_core.documents import Document
+
+# Rows scored per step: bounds the float32 scratch space whatever the index size
+_SCORE_BLOCK = 65536
+
+
+def quantize(vectors, dtype: str):
+    """Unit-normalize rows, then store as float16, or int8 with one float32 scale per row."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"Unsupported dtype: {dtype}")
+
+
+# ----------------- MEMORY-MAPPED VECTOR STORE -----------------
+class MmapVectorStore:
+    """
+    Embeddings as float16 or int8 .npy segments opened with mmap, plus a
+    SQLite table with each row's chunk id, document, source, chunk offset,
+    text and metadata.
+
+    Segments are write-once: every upsert adds a segment and deletes only
+    mark rows dead in SQLite, so any number of Streamlit worker processes
+    can map the same files and share them through the OS page cache. Each
+    write bumps a generation counter that readers check before searching.
+    Cosine scores are computed block by block straight over the mapped
+    arrays.
+    """
+
+    def __init__(self, directory, dtype: str = "int8"):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.directory / "metadata.sqlite"), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('dtype', ?)", (dtype,))
+            self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('generation', '0')")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS segments (name TEXT PRIMARY KEY, rows INTEGER NOT NULL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs (code INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "doc_hash TEXT UNIQUE NOT NULL, source TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "chunk_id TEXT NOT NULL, segment TEXT NOT NULL, row INTEGER NOT NULL, doc_code INTEGER NOT NULL, "
+                "chunk_offset INTEGER, text TEXT, metadata TEXT, live INTEGER NOT NULL DEFAULT 1, "
+                "PRIMARY KEY (segment, row))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_id ON chunks(chunk_id, live)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_doc ON chunks(doc_code, live)")
+            self.dtype = self._conn.execute("SELECT value FROM meta WHERE key = 'dtype'").fetchone()[0]
+        self._generation = None
+        self._segments = []
+
+    # ----- reading -----
+    def _refresh(self) -> None:
+        """Re-map segments and reload dead-row masks if any process wrote since we last looked."""
+        generation = self._conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+        if generation == self._generation:
+            return
+        segments = []
+        for name, rows in self._conn.execute("SELECT name, rows FROM segments ORDER BY rowid"):
+            live = np.ones(rows, dtype=bool)
+            dead = [r for (r,) in self._conn.execute("SELECT row FROM chunks WHERE segment = ? AND live = 0", (name,))]
+            live[dead] = False
+            if not live.any():
+                continue
+            scales_path = self.directory / f"{name}.scales.npy"
+            segments.append({
+                "name": name,
+                "vectors": np.load(self.directory / f"{name}.vectors.npy", mmap_mode="r"),
+                "scales": np.load(scales_path, mmap_mode="r") if scales_path.exists() else None,
+                "doc_codes": np.load(self.directory / f"{name}.docs.npy", mmap_mode="r"),
+                "live": live,
+            })
+        self._segments = segments
+        self._generation = generation
+
+    def _doc_codes(self, doc_hashes):
+        marks = ",".join("?" * len(doc_hashes))
+        rows = self._conn.execute(f"SELECT code FROM docs WHERE doc_hash IN ({marks})", list(doc_hashes))
+        return np.array([code for (code,) in rows], dtype=np.int64)
+
+    def search(self, query_vector, k: int = 4, doc_hashes=None):
+        """Top-k (segment, row, cosine score), optionally only within the given documents."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        with self._lock:
+            self._refresh()
+            codes = None if doc_hashes is None else self._doc_codes(list(doc_hashes))
+            segments = list(self._segments)
+        if codes is not None and not len(codes):
+            return []
+
+        best_scores = np.empty(0, dtype=np.float32)
+        best_refs = []
+        for segment in segments:
+            vectors, scales = segment["vectors"], segment["scales"]
+            for start in range(0, len(vectors), _SCORE_BLOCK):
+                stop = min(start + _SCORE_BLOCK, len(vectors))
+                mask = segment["live"][start:stop]
+                if codes is not None:
+                    mask = mask & np.isin(segment["doc_codes"][start:stop], codes)
+                if not mask.any():
+                    continue
+                scores = vectors[start:stop].astype(np.float32) @ query
+                if scales is not None:
+                    scores *= scales[start:stop]
+                scores[~mask] = -np.inf
+
+                top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+                top = top[np.isfinite(scores[top])]
+                best_scores = np.concatenate([best_scores, scores[top]])
+                best_refs.extend((segment["name"], int(start + i)) for i in top)
+                if len(best_refs) > k:
+                    keep = np.argsort(-best_scores)[:k]
+                    best_scores = best_scores[keep]
+                    best_refs = [best_refs[i] for i in keep]
+
+        order = np.argsort(-best_scores)
+        return [(best_refs[i][0], best_refs[i][1], float(best_scores[i])) for i in order]
+
+    def search_documents(self, query_vector, k: int = 4, doc_hashes=None):
+        """search() resolved to LangChain Documents, best first."""
+        hits = self.search(query_vector, k, doc_hashes)
+        with self._lock:
+            rows = {
+                (segment, row): (text, metadata)
+                for segment, row, text, metadata in (
+                    self._conn.execute(
+                        "SELECT segment, row, text, metadata FROM chunks WHERE segment = ? AND row = ?", (segment, row)
+                    ).fetchone()
+                    for segment, row, _ in hits
+                )
+            }
+        return [
+            Document(page_content=rows[(segment, row)][0], metadata=json.loads(rows[(segment, row)][1]))
+            for segment, row, _ in hits
+        ]
+
+    def get(self, chunk_ids):
+        if not chunk_ids:
+            return []
+        marks = ",".join("?" * len(chunk_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT chunk_id, text, metadata FROM chunks WHERE live = 1 AND chunk_id IN ({marks})", list(chunk_ids)
+            ).fetchall()
+        return [Document(page_content=text, metadata=json.loads(metadata)) for _, text, metadata in rows]
+
+    def documents(self) -> dict:
+        """doc_hash -> {"source", "chunks"} for every document with live rows."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT d.doc_hash, d.source, COUNT(*) FROM chunks c JOIN docs d ON d.code = c.doc_code "
+                "WHERE c.live = 1 GROUP BY d.doc_hash"
+            ).fetchall()
+        return {doc_hash: {"source": source, "chunks": count} for doc_hash, source, count in rows}
+
+    def texts(self, doc_hash: str):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.chunk_id, c.text FROM chunks c JOIN docs d ON d.code = c.doc_code "
+                "WHERE d.doc_hash = ? AND c.live = 1 ORDER BY c.chunk_offset", (doc_hash,)
+            ).fetchall()
+        return [r[0] for r in rows], [r[1] for r in rows]
+
+    # ----- writing -----
+    def _bump(self) -> None:
+        self._conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'generation'")
+
+    def upsert(self, ids, vectors, metadatas, texts):
+        """Write the vectors as a new segment and return its name."""
+        if not ids:
+            return None
+        codes, scales = quantize(vectors, self.dtype)
+        name = f"seg-{uuid.uuid4().hex[:12]}"
+
+        with self._lock:
+            doc_codes = []
+            for metadata in metadatas:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO docs (doc_hash, source) VALUES (?, ?)",
+                    (metadata["doc_hash"], metadata.get("source")),
+                )
+                doc_codes.append(self._conn.execute(
+                    "SELECT code FROM docs WHERE doc_hash = ?", (metadata["doc_hash"],)
+                ).fetchone()[0])
+
+            # Files first, then the rows that point at them, so readers never see a missing segment
+            np.save(self.directory / f"{name}.vectors.npy", codes)
+            np.save(self.directory / f"{name}.docs.npy", np.asarray(doc_codes, dtype=np.int64))
+            if scales is not None:
+                np.save(self.directory / f"{name}.scales.npy", scales)
+
+            with self._conn:
+                marks = ",".join("?" * len(ids))
+                self._conn.execute(f"UPDATE chunks SET live = 0 WHERE live = 1 AND chunk_id IN ({marks})", list(ids))
+                self._conn.executemany(
+                    "INSERT INTO chunks (chunk_id, segment, row, doc_code, chunk_offset, text, metadata) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (chunk_id, name, row, doc_code, int(chunk_id.rsplit(":", 1)[-1]), text, json.dumps(metadata))
+                        for row, (chunk_id, doc_code, text, metadata) in enumerate(zip(ids, doc_codes, texts, metadatas))
+                    ],
+                )
+                self._conn.execute("INSERT INTO segments VALUES (?, ?)", (name, len(ids)))
+                self._bump()
+        return name
+
+    def delete(self, ids) -> None:
+        if not ids:
+            return
+        marks = ",".join("?" * len(ids))
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE chunks SET live = 0 WHERE live = 1 AND chunk_id IN ({marks})", list(ids))
+            self._bump()
+
+    def dead_fraction(self) -> float:
+        """Share of stored rows that compact() would free: rows of segments with no live rows left."""
+        with self._lock:
+            total, dead = self._conn.execute(
+                "SELECT COALESCE(SUM(s.rows), 0), COALESCE(SUM(CASE WHEN NOT EXISTS "
+                "(SELECT 1 FROM chunks c WHERE c.segment = s.name AND c.live = 1) THEN s.rows ELSE 0 END), 0) "
+                "FROM segments s"
+            ).fetchone()
+        return dead / total if total else 0.0
+
+    def compact(self) -> None:
+        """Drop segments with no live rows left (their files and rows)."""
+        with self._lock:
+            dead = [
+                name for (name,) in self._conn.execute(
+                    "SELECT s.name FROM segments s WHERE NOT EXISTS "
+                    "(SELECT 1 FROM chunks c WHERE c.segment = s.name AND c.live = 1)"
+                )
+            ]
+            with self._conn:
+                for name in dead:
+                    self._conn.execute("DELETE FROM chunks WHERE segment = ?", (name,))
+                    self._conn.execute("DELETE FROM segments WHERE name = ?", (name,))
+                self._bump()
+            for name in dead:
+                for suffix in ("vectors", "docs", "scales"):
+                    try:
+                        os.remove(self.directory / f"{name}.{suffix}.npy")
+                    except OSError:
+                        # Gone already, or still mapped by another process on Windows: its rows are
+                        # gone, so nothing reads it again; the orphan file is only wasted space
+                        pass
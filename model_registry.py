@@ -0,0 +1,130 @@
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MAX_LOADED = int(os.environ.get("MAX_LOADED_MODELS", "2"))
+# Unload a model nobody has used for this long; 0 keeps models forever
+IDLE_SECONDS = float(os.environ.get("MODEL_IDLE_SECONDS", "1800"))
+
+
+# ----------------- MODEL REGISTRY -----------------
+class ModelRegistry:
+    """
+    Process-wide cache of transformers pipelines. Each (task, model,
+    options) is loaded on first use only, and concurrent sessions asking
+    for the same model wait for one load instead of starting their own.
+    At most `max_loaded` models stay in memory (least recently used goes
+    first) and models idle for longer than `idle_seconds` are dropped:
+    checked on every get(), and by a background thread so a model is
+    freed even if nobody asks for anything again.
+    """
+
+    def __init__(self, max_loaded: int = MAX_LOADED, idle_seconds: float = IDLE_SECONDS):
+        self.max_loaded = max(1, max_loaded)
+        self.idle_seconds = idle_seconds
+        self._models = OrderedDict()
+        self._load_locks = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    @staticmethod
+    def _key(task: str, model: str, kwargs: dict):
+        return (task, model, tuple(sorted(kwargs.items())))
+
+    def _lookup(self, key):
+        entry = self._models.get(key)
+        if entry is not None:
+            entry["last_used"] = time.monotonic()
+            self._models.move_to_end(key)
+            return entry["pipeline"]
+        return None
+
+    def get(self, task: str, model: str, **kwargs):
+        key = self._key(task, model, kwargs)
+        with self._lock:
+            generator = self._lookup(key)
+            self._evict()
+            if generator is not None:
+                return generator
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                generator = self._lookup(key)
+                if generator is not None:
+                    return generator
+
+            from transformers import pipeline
+
+            start = time.perf_counter()
+            generator = pipeline(task, model=model, **kwargs)
+            load_seconds = time.perf_counter() - start
+
+            with self._lock:
+                self._models[key] = {
+                    "pipeline": generator,
+                    "last_used": time.monotonic(),
+                    "load_seconds": load_seconds,
+                }
+                self._evict()
+                self._start_reaper()
+            return generator
+
+    def _evict(self) -> None:
+        # Called with self._lock held
+        now = time.monotonic()
+        evicted = 0
+        if self.idle_seconds:
+            for key in [k for k, e in self._models.items() if now - e["last_used"] > self.idle_seconds]:
+                del self._models[key]
+                evicted += 1
+        while len(self._models) > self.max_loaded:
+            self._models.popitem(last=False)
+            evicted += 1
+        if evicted:
+            gc.collect()
+
+    def _start_reaper(self) -> None:
+        # Called with self._lock held, once a model is loaded
+        if self.idle_seconds and self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap, name="model-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap(self) -> None:
+        while True:
+            time.sleep(max(1.0, self.idle_seconds / 4))
+            self.unload_idle()
+
+    def unload_idle(self) -> None:
+        with self._lock:
+            self._evict()
+
+    def unload(self, model: str = None) -> None:
+        """Drop one model (every task/option variant of it), or everything if model is None."""
+        with self._lock:
+            for key in [k for k in self._models if model is None or k[1] == model]:
+                del self._models[key]
+            gc.collect()
+
+    def loaded(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "task": key[0],
+                    "model": key[1],
+                    "load_seconds": round(entry["load_seconds"], 2),
+                    "idle_seconds": round(now - entry["last_used"], 1),
+                }
+                for key, entry in self._models.items()
+            ]
+
+
+registry = ModelRegistry()
+
+
+def get_generator(task: str, model: str, **kwargs):
+    """Shortcut for registry.get: the loaded pipeline, loading it on first use."""
+    return registry.get(task, model, **kwargs)
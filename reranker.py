@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+
+from metrics import metrics
+from tokens import count_tokens
+
+DEFAULT_MODEL = os.environ.get("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+# Off unless turned on here or in the UI: it adds a model load and some CPU per question
+ENABLED = os.environ.get("RERANK_ENABLED", "0") == "1"
+# Retrieve this many chunks, then keep the best TOP_N that fit in TOKEN_BUDGET
+CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", "20"))
+TOP_N = int(os.environ.get("RERANK_TOP_N", "4"))
+TOKEN_BUDGET = int(os.environ.get("RERANK_TOKEN_BUDGET", "1500"))
+BATCH_SIZE = int(os.environ.get("RERANK_BATCH_SIZE", "32"))
+
+
+# ----------------- CROSS-ENCODER RERANKER -----------------
+class Reranker:
+    """
+    A small cross-encoder on CPU that reads question and chunk together,
+    which ranks far better than comparing two separate embeddings. All of
+    a question's candidates are scored in one batched predict call.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, batch_size: int = BATCH_SIZE):
+        from sentence_transformers import CrossEncoder
+
+        start = time.perf_counter()
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.load_seconds = time.perf_counter() - start
+        self.batch_size = batch_size
+
+    def rerank(self, question: str, docs, top_n: int = TOP_N, token_budget: int = TOKEN_BUDGET):
+        """
+        The best-scoring docs, at most top_n of them and at most token_budget
+        tokens in total (the best one is always kept), plus a report of what
+        the stage cost and saved.
+        """
+        start = time.perf_counter()
+        scores = []
+        if docs:
+            scores = self.model.predict(
+                [(question, doc.page_content) for doc in docs],
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+            )
+        ranked = sorted(zip(docs, scores), key=lambda pair: pair[1], reverse=True)
+        rerank_ms = 1000 * (time.perf_counter() - start)
+        metrics.observe("stage_seconds", rerank_ms / 1000, stage="rerank", status="ok")
+
+        kept, tokens, total_tokens = [], 0, 0
+        for doc, score in ranked:
+            doc_tokens = count_tokens(doc.page_content)
+            total_tokens += doc_tokens
+            if len(kept) >= top_n or (kept and tokens + doc_tokens > token_budget):
+                continue
+            doc.metadata["rerank_score"] = float(score)
+            kept.append(doc)
+            tokens += doc_tokens
+
+        return kept, {
+            "rerank_ms": rerank_ms,
+            "candidates": len(docs),
+            "kept": len(kept),
+            "tokens": tokens,
+            "tokens_dropped": total_tokens - tokens,
+        }
+
+
+_rerankers = {}
+_rerankers_lock = threading.Lock()
+
+
+def get_reranker(model_name: str = DEFAULT_MODEL) -> Reranker:
+    """The process-wide reranker for `model_name`, loading the model on first use only."""
+    with _rerankers_lock:
+        reranker = _rerankers.get(model_name)
+        if reranker is None:
+            reranker = _rerankers[model_name] = Reranker(model_name)
+    return reranker
@@ -0,0 +1,209 @@
+"""
+Cold start: heavy engines built in the background, and a report of what
+the app scripts cost to import.
+
+    python startup.py                          # Final_app3.py, app.py, Final_app.py against the budget
+    python startup.py app.py --budget 1.5 --top 20
+
+The report imports everything a script imports at module level (what has
+to happen before Streamlit can draw anything) in a fresh interpreter with
+-X importtime, lists the slowest packages, and exits with status 1 when a
+script takes longer than COLD_START_BUDGET_SECONDS. Anything slow should
+be imported inside the function that needs it, and built with warm_up()
+once the page is on screen.
+"""
+import argparse
+import ast
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+
+from metrics import metrics
+
+# Module-level imports an app script may spend before its first paint
+IMPORT_BUDGET_SECONDS = float(os.environ.get("COLD_START_BUDGET_SECONDS", "2.0"))
+
+_IMPORT_TIME = re.compile(r"^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|( *)(\S+)")
+
+
+# ----------------- BACKGROUND WARM-UP -----------------
+_tasks = {}  # name -> (code version, Future) of the build under way or done
+_failed = {}  # name -> Future of the last failed build, kept for warm_status until a retry starts
+_tasks_lock = threading.Lock()
+
+
+def code_version(factory) -> str:
+    """
+    Fingerprint of what factory() runs: its bytecode, names and constants
+    (nested functions and lambdas included), like st.cache_resource
+    hashing a function's source. Editing the factory, or data written
+    into it such as seed documents, changes it; a rerun that just defines
+    the same function again does not.
+    """
+    code = getattr(factory, "__code__", None)
+    if code is None:
+        return ""
+    digest = hashlib.sha256()
+
+    def feed(code):
+        digest.update(code.co_code)
+        digest.update(repr(code.co_names).encode("utf-8"))
+        for const in code.co_consts:
+            if hasattr(const, "co_code"):
+                feed(const)
+            else:
+                digest.update(repr(const).encode("utf-8"))
+
+    feed(code)
+    return digest.hexdigest()[:16]
+
+
+def warm_up(name: str, factory) -> Future:
+    """
+    Start factory() on a background thread, once per server process, and
+    return its Future. Later calls with the same name (from any session or
+    rerun) get the same Future, so whoever needs the result first just
+    waits for the build already under way. A factory whose code changed
+    (see code_version) is built again. A failed build stays visible in
+    warm_status(), but the next call tries again.
+    """
+    version = code_version(factory)
+    with _tasks_lock:
+        version_future = _tasks.get(name)
+        if version_future is not None and version_future[0] == version:
+            return version_future[1]
+        future = Future()
+        _tasks[name] = (version, future)
+
+    def build():
+        try:
+            with metrics.span("warm_up", task=name):
+                result = factory()
+        except BaseException as e:
+            with _tasks_lock:
+                if _tasks.get(name, (None, None))[1] is future:
+                    del _tasks[name]
+                    _failed[name] = future
+            future.set_exception(e)
+        else:
+            with _tasks_lock:
+                _failed.pop(name, None)
+            future.set_result(result)
+
+    threading.Thread(target=build, name=f"warm-up-{name}", daemon=True).start()
+    return future
+
+
+def resource(name: str, factory):
+    """The process-wide result of factory(), built by warm_up (waits if it is still being built)."""
+    return warm_up(name, factory).result()
+
+
+def warm_status() -> dict:
+    """name -> "ready", "loading" or "failed: <error>" for everything warm_up started."""
+    with _tasks_lock:
+        tasks = dict(_failed)
+        tasks.update((name, future) for name, (_, future) in _tasks.items())
+    status = {}
+    for name, future in tasks.items():
+        if not future.done():
+            status[name] = "loading"
+        elif future.exception() is not None:
+            status[name] = f"failed: {future.exception()}"
+        else:
+            status[name] = "ready"
+    return status
+
+
+# ----------------- IMPORT-TIME REPORT -----------------
+def _module_level(statements):
+    """Statements that run at import time: the module body, including if / try / with blocks, not defs."""
+    for node in statements:
+        yield node
+        if isinstance(node, (ast.If, ast.Try, ast.With)):
+            for block in ("body", "orelse", "finalbody"):
+                yield from _module_level(getattr(node, block, []))
+            for handler in getattr(node, "handlers", []):
+                yield from _module_level(handler.body)
+
+
+def script_imports(path) -> list:
+    """Modules a script imports at module level, in order."""
+    tree = ast.parse(Path(path).read_text(encoding="utf-8"))
+    modules = []
+    for node in _module_level(tree.body):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names = [node.module]
+        else:
+            continue
+        modules.extend(name for name in names if name not in modules)
+    return modules
+
+
+def import_report(path, top: int = 10) -> dict:
+    """
+    Time a script's module-level imports in a fresh interpreter: the
+    total, each direct import (a package already loaded by an earlier
+    one counts there), and the packages with the most self time.
+    """
+    modules = script_imports(path)
+    # Optional imports (e.g. pysqlite3) may be missing: skip them, as the script does, but say so
+    code = "\n".join(f"try:\n    import {name}\nexcept ImportError:\n    print({name!r})" for name in modules)
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=str(Path(path).resolve().parent), capture_output=True, text=True,
+    )
+    rows = []
+    for line in process.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append({"name": name, "level": (len(indent) - 1) // 2,
+                         "self": int(self_us) / 1e6, "cumulative": int(cumulative_us) / 1e6})
+
+    top_level = [row for row in rows if row["level"] == 0]
+    direct = {row["name"]: round(row["cumulative"], 3) for row in top_level if row["name"] in modules}
+    slowest = sorted(rows, key=lambda row: -row["self"])[:top]
+    return {
+        "script": str(path),
+        "seconds": round(sum(row["cumulative"] for row in top_level), 3),
+        "imports": direct,
+        "slowest": [(row["name"], round(row["self"], 3)) for row in slowest],
+        "missing": process.stdout.split(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report how long each app script spends importing.")
+    parser.add_argument("scripts", nargs="*", default=["Final_app3.py", "app.py", "Final_app.py"])
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS, help="seconds allowed per script")
+    parser.add_argument("--top", type=int, default=10, help="slowest packages to list")
+    args = parser.parse_args(argv)
+
+    over = []
+    for script in args.scripts:
+        report = import_report(script, args.top)
+        verdict = "OK" if report["seconds"] <= args.budget else "OVER BUDGET"
+        print(f"{script}: {report['seconds']:.2f} s of imports (budget {args.budget:.2f} s) {verdict}")
+        if report["missing"]:
+            print(f"  not installed (not timed): {', '.join(report['missing'])}")
+        for name, seconds in sorted(report["imports"].items(), key=lambda item: -item[1]):
+            print(f"    {seconds:7.3f} s  import {name}")
+        print("  slowest packages (self time):")
+        for name, seconds in report["slowest"]:
+            print(f"    {seconds:7.3f} s  {name}")
+        if verdict != "OK":
+            over.append(script)
+    if over:
+        raise SystemExit(f"Over the cold start budget: {', '.join(over)}")
+
+
+if __name__ == "__main__":
+    main()
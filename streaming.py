@@ -0,0 +1,56 @@
+import threading
+import time
+
+
+# ----------------- TIMED TOKEN STREAM -----------------
+class TimedStream:
+    """
+    Wraps a token iterator for st.write_stream and records how long the
+    first token took (ttft) and how long the whole answer took, both
+    measured from when the stream was created.
+    """
+
+    def __init__(self, tokens):
+        self._tokens = tokens
+        self.started = time.perf_counter()
+        self.ttft = None
+        self.total = None
+        self._parts = []
+
+    def __iter__(self):
+        for token in self._tokens:
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - self.started
+            self._parts.append(token)
+            yield token
+        self.total = time.perf_counter() - self.started
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts).strip()
+
+
+# ----------------- TOKEN SOURCES -----------------
+def pipeline_tokens(generator, prompt: str, **generate_kwargs):
+    """Text pieces from a transformers pipeline as generate() produces them."""
+    from transformers import TextIteratorStreamer
+
+    streamer = TextIteratorStreamer(generator.tokenizer, skip_prompt=True, skip_special_tokens=True)
+    errors = []
+
+    def run():
+        try:
+            generator(prompt, streamer=streamer, **generate_kwargs)
+        except Exception as e:
+            errors.append(e)
+            # Unblock the consumer, which is waiting on the streamer queue
+            streamer.end()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    for text in streamer:
+        if text:
+            yield text
+    thread.join()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,66 @@
+import time
+
+from answer_cache import AnswerCache, normalize_question
+
+CHUNKS = ["doc-a:0", "doc-a:1"]
+
+
+def fake_embed(question):
+    """Questions about the same composer point the same way."""
+    return [1.0, 0.0] if "zimmer" in question else [0.0, 1.0]
+
+
+def test_normalize_question():
+    assert normalize_question("  Who scored   INCEPTION?? ") == "who scored inception"
+
+
+def test_hit_needs_the_same_question_and_chunks():
+    cache = AnswerCache()
+    cache.put("Who scored Inception?", CHUNKS, "Hans Zimmer", ["a.pdf"])
+
+    assert cache.get("who scored inception", list(reversed(CHUNKS)))["answer"] == "Hans Zimmer"
+    assert cache.get("Who scored Inception?", ["doc-a:0"]) is None
+    assert cache.get("Who scored Dune?", CHUNKS) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_near_duplicate_questions_reuse_the_answer():
+    cache = AnswerCache(embed=fake_embed)
+    cache.put("Which film did Zimmer score in 2010?", CHUNKS, "Inception")
+
+    hit = cache.get("What did zimmer compose in 2010", CHUNKS)
+    assert hit["answer"] == "Inception"
+    assert hit["question"] == "Which film did Zimmer score in 2010?"
+    assert cache.stats()["near_hits"] == 1
+    # Only within the same chunks, and only when close enough
+    assert cache.get("What did zimmer compose in 2010", ["doc-b:0"]) is None
+    assert cache.get("Who wrote Jaws?", CHUNKS) is None
+
+
+def test_entries_expire_after_the_ttl():
+    cache = AnswerCache(ttl_seconds=0.05)
+    cache.put("q", CHUNKS, "a")
+    assert cache.get("q", CHUNKS) is not None
+    time.sleep(0.1)
+    assert cache.get("q", CHUNKS) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_goes_past_max_entries():
+    cache = AnswerCache(max_entries=2)
+    cache.put("first", CHUNKS, "1")
+    cache.put("second", CHUNKS, "2")
+    cache.get("first", CHUNKS)
+    cache.put("third", CHUNKS, "3")
+    assert cache.get("second", CHUNKS) is None
+    assert cache.get("first", CHUNKS)["answer"] == "1"
+    assert cache.get("third", CHUNKS)["answer"] == "3"
+
+
+def test_hit_rate():
+    cache = AnswerCache()
+    assert cache.stats()["hit_rate"] == 0.0
+    cache.put("q", CHUNKS, "a")
+    cache.get("q", CHUNKS)
+    cache.get("other", CHUNKS)
+    assert cache.stats()["hit_rate"] == 0.5
@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import batch_convert
+from batch_convert import convert_batch, get_pool, markdown_name, shutdown_pool, write_markdown
+from convert_cli import collect_inputs, relative_names
+
+
+def test_markdown_name_keeps_formats_and_folders_apart():
+    assert markdown_name("report.pdf") == "report.pdf.md"
+    assert markdown_name("report.docx") == "report.docx.md"
+    assert markdown_name("a/report.pdf") == "a/report.pdf.md"
+
+
+def test_markdown_name_numbers_repeats_within_a_batch():
+    taken = set()
+    names = [markdown_name(name, taken) for name in ("report.pdf", "report.pdf", "a/report.pdf", "report.pdf")]
+    assert names == ["report.pdf.md", "report (2).pdf.md", "a/report.pdf.md", "report (3).pdf.md"]
+    assert taken == set(names)
+
+
+def test_write_markdown_creates_subfolders(tmp_path):
+    out_file = write_markdown(tmp_path, "a/b/report.pdf", "# Report")
+    assert out_file == tmp_path / "a" / "b" / "report.pdf.md"
+    assert out_file.read_text(encoding="utf-8") == "# Report"
+
+
+def test_relative_names_mirror_the_inputs_below_their_common_folder(tmp_path):
+    paths = [str(tmp_path / "docs" / "a" / "report.pdf"), str(tmp_path / "docs" / "b" / "report.pdf")]
+    assert relative_names(paths) == {paths[0]: "a/report.pdf", paths[1]: "b/report.pdf"}
+    assert relative_names(paths[:1]) == {paths[0]: "report.pdf"}
+
+
+def test_collect_inputs(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for name in ("a.pdf", "b.txt", "skip.png", "sub/c.docx"):
+        (tmp_path / name).write_bytes(b"x")
+
+    flat = collect_inputs([str(tmp_path)])
+    assert [p.rsplit("/", 1)[-1] for p in flat] == ["a.pdf", "b.txt"]
+    assert len(collect_inputs([str(tmp_path)], recursive=True)) == 3
+    assert len(collect_inputs([str(tmp_path / "*.pdf"), str(tmp_path / "a.pdf")])) == 1
+
+
+class ThreadPool(ThreadPoolExecutor):
+    """Stands in for the spawned process pool: same constructor, no docling."""
+
+    def __init__(self, max_workers, mp_context=None, initializer=None, initargs=()):
+        super().__init__(max_workers)
+
+
+def test_replacing_the_pool_lets_running_batches_finish(monkeypatch):
+    failed_once = set()
+
+    def convert_one(path, do_ocr, num_threads, use_cache):
+        if path == "flaky.pdf" and path not in failed_once:
+            failed_once.add(path)
+            return None, "RuntimeError: flaky", 0.0, 0, 0
+        return f"# {path}", None, 0.0, 0, 1
+
+    monkeypatch.setattr(batch_convert, "ProcessPoolExecutor", ThreadPool)
+    monkeypatch.setattr(batch_convert, "_convert_one", convert_one)
+    shutdown_pool()
+    try:
+        batch = convert_batch(["a.pdf", "flaky.pdf", "b.pdf"], workers=1, num_threads=1)
+        results = [next(batch)]
+        old_pool = get_pool(1, 1)
+        # Another caller asks for other settings while the batch still has a retry to submit
+        assert get_pool(2, 1) is not old_pool
+        assert not old_pool._shutdown
+        results.extend(batch)
+        assert sorted(result.path for result in results) == ["a.pdf", "b.pdf", "flaky.pdf"]
+        assert all(result.ok for result in results)
+        assert old_pool._shutdown
+    finally:
+        shutdown_pool()
@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+from context_builder import build_context
+
+
+def doc(text, chunk_id=None, source="a.pdf"):
+    metadata = {"source": source}
+    if chunk_id:
+        metadata["chunk_id"] = chunk_id
+    return SimpleNamespace(page_content=text, metadata=metadata)
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def test_neighbouring_chunks_are_merged_without_their_overlap():
+    overlap = "the shared sentence between both chunks"
+    first = doc("Opening words of the section, then " + overlap, "h:0")
+    second = doc(overlap + " and the rest of the section.", "h:1")
+    context, used, report = build_context([second, first], count=count_words)
+    assert context.count(overlap) == 1
+    assert report["merged"] == 1 and report["pieces"] == 1
+    assert used == [first, second]
+
+
+def test_near_duplicates_are_dropped():
+    text = "Hans Zimmer scored Inception and Interstellar for Christopher Nolan"
+    context, used, report = build_context([doc(text, "a:0"), doc(text + ".", "b:3", "b.pdf")], count=count_words)
+    assert report["duplicates"] == 1
+    assert len(used) == 1
+    assert context == text
+
+
+def test_pieces_are_added_in_rank_order_within_the_budget():
+    docs = [doc("one two three four", "a:0"), doc("five six seven eight nine", "b:0"), doc("ten", "c:0")]
+    context, used, report = build_context(docs, token_budget=6, count=count_words)
+    # The second piece doesn't fit, the third still does
+    assert context == "one two three four\n\nten"
+    assert report["over_budget"] == 1
+    assert report["tokens"] <= 6
+
+
+def test_best_piece_is_truncated_when_nothing_fits():
+    context, _, report = build_context([doc("a b c d e f g h", "a:0")], token_budget=3, count=count_words)
+    assert context == "a b c"
+    assert report["tokens"] == 3
+
+
+def test_template_numbers_and_names_sources():
+    context, _, _ = build_context([doc("alpha", "a:0"), doc("beta gamma", "b:0", "b.pdf")],
+                                  template="[{n}] {source}: {text}", count=count_words)
+    assert context == "[1] a.pdf: alpha\n\n[2] b.pdf: beta gamma"
@@ -0,0 +1,49 @@
+import os
+import time
+
+from conversion_cache import ConversionCache, hash_file
+
+
+def age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_keys_follow_content_and_settings(tmp_path):
+    cache = ConversionCache(tmp_path / "cache")
+    first, copy, other = tmp_path / "a.pdf", tmp_path / "copy.pdf", tmp_path / "b.pdf"
+    first.write_bytes(b"same bytes")
+    copy.write_bytes(b"same bytes")
+    other.write_bytes(b"other bytes")
+
+    assert hash_file(first) == hash_file(copy) != hash_file(other)
+    assert cache.make_key(first, {"ocr": False}) == cache.make_key(copy, {"ocr": False})
+    assert cache.make_key(first, {"ocr": False}) != cache.make_key(first, {"ocr": True})
+    assert cache.make_key(first, {}) != cache.make_key(other, {})
+    assert cache.make_key(first, {}, content_hash=hash_file(first)) == cache.make_key(first, {})
+
+
+def test_get_and_put(tmp_path):
+    cache = ConversionCache(tmp_path / "cache")
+    assert cache.get("missing") is None
+    cache.put("key", "# Title\n\nBody")
+    assert cache.get("key") == "# Title\n\nBody"
+    cache.clear()
+    assert cache.get("key") is None
+
+
+def test_evicts_least_recently_used_past_max_bytes(tmp_path):
+    cache = ConversionCache(tmp_path / "cache")
+    for key in ("old", "used", "new"):
+        cache.put(key, "x" * 10)
+    cache.max_bytes = 25
+    # "used" was read most recently, so "old" is the one to go
+    age(cache.cache_dir / "old.md", 30)
+    age(cache.cache_dir / "used.md", 20)
+    age(cache.cache_dir / "new.md", 10)
+    cache.get("used")
+    cache.evict()
+
+    assert cache.get("old") is None
+    assert cache.get("used") == "x" * 10
+    assert cache.get("new") == "x" * 10
@@ -0,0 +1,87 @@
+import pytest
+
+import converter
+from conversion_cache import ConversionCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ConversionCache(tmp_path / "cache")
+    monkeypatch.setattr(converter, "_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def docling(monkeypatch):
+    """Stands in for docling: records each conversion, returns one line per page."""
+    calls = []
+
+    def convert(file_path, ext, do_ocr, num_threads, page_range=None):
+        calls.append((ext, page_range))
+        if page_range is None:
+            return f"whole {ext}"
+        return "\n".join(f"page {page}" for page in range(page_range[0], page_range[1] + 1))
+
+    monkeypatch.setattr(converter, "_convert_uncached", convert)
+    monkeypatch.setattr(converter, "count_pages", lambda file_path: 5)
+    return calls
+
+
+def test_text_comes_in_paragraph_aligned_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(converter, "TEXT_BLOCK_CHARS", 20)
+    path = tmp_path / "notes.txt"
+    path.write_text("first paragraph is long\n\nsecond one\nstill second\n\nthird\n", encoding="utf-8")
+
+    blocks = list(converter.iter_markdown(str(path)))
+    assert all(pages is None for pages, _ in blocks)
+    assert "".join(block for _, block in blocks) == path.read_text(encoding="utf-8")
+    assert [block for _, block in blocks][1].startswith("second one")
+
+
+def test_text_that_is_not_utf8_falls_back_to_latin1(tmp_path):
+    path = tmp_path / "old.txt"
+    path.write_bytes("café".encode("latin-1"))
+    assert list(converter.iter_markdown(str(path))) == [(None, "café")]
+
+
+def test_pdf_comes_in_page_batches(tmp_path, cache, docling):
+    path = tmp_path / "manual.pdf"
+    path.write_bytes(b"%PDF fake")
+    pieces = list(converter.iter_markdown(str(path), pages_per_batch=2))
+    assert [pages for pages, _ in pieces] == [(1, 2), (3, 4), (5, 5)]
+    assert pieces[2][1] == "page 5"
+
+    # Cached per batch: a second read converts nothing
+    assert list(converter.iter_markdown(str(path), pages_per_batch=2)) == pieces
+    assert len(docling) == 3
+
+
+def test_whole_file_and_streaming_share_the_cache(tmp_path, cache, docling, monkeypatch):
+    monkeypatch.setattr(converter, "PAGES_PER_BATCH", 2)
+    path = tmp_path / "manual.pdf"
+    path.write_bytes(b"%PDF fake")
+
+    markdown = converter.convert_to_markdown(str(path))
+    assert markdown == "page 1\npage 2\n\npage 3\npage 4\n\npage 5"
+    assert "\n\n".join(piece for _, piece in converter.iter_markdown(str(path), pages_per_batch=2)) == markdown
+    assert len(docling) == 3
+
+
+def test_docx_uses_the_given_content_hash(tmp_path, cache, docling, monkeypatch):
+    def no_hashing(file_path):
+        raise AssertionError("the file was hashed again")
+
+    monkeypatch.setattr(converter, "hash_file", no_hashing)
+    monkeypatch.setattr("conversion_cache.hash_file", no_hashing)
+    path = tmp_path / "letter.docx"
+    path.write_bytes(b"PK fake")
+    assert list(converter.iter_markdown(str(path), content_hash="abc")) == [(None, "whole .docx")]
+    assert list(converter.iter_markdown(str(path), content_hash="abc")) == [(None, "whole .docx")]
+    assert len(docling) == 1
+
+
+def test_unsupported_files_are_refused(tmp_path):
+    path = tmp_path / "image.png"
+    path.write_bytes(b"png")
+    with pytest.raises(ValueError):
+        converter.convert_to_markdown(str(path))
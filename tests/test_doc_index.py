@@ -0,0 +1,126 @@
+import sqlite3
+import zlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document  # noqa: E402
+
+from doc_index import DocumentIndex  # noqa: E402
+
+DIMENSIONS = 32
+
+
+class HashEmbedding:
+    """Bag of words hashed into a small vector: texts sharing words point the same way."""
+
+    @staticmethod
+    def _embed(text):
+        vector = [0.0] * DIMENSIONS
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode()) % DIMENSIONS] += 1.0
+        return vector
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def chunks(*texts):
+    return [Document(page_content=text, metadata={}) for text in texts]
+
+
+def open_index(path):
+    return DocumentIndex(HashEmbedding(), persist_directory=path, store="int8")
+
+
+def test_share_and_release(tmp_path):
+    index = open_index(tmp_path)
+    assert not index.share("doc-a", "alice", "a.pdf")  # not indexed yet
+    index.add_document("doc-a", "a.pdf", chunks("opening theme"))
+
+    assert index.share("doc-a", "alice", "a.pdf")
+    assert index.share("doc-a", "bob", "mine.pdf")
+    assert index.visible_documents("bob") == {"doc-a": "mine.pdf"}
+
+    assert not index.release("doc-a", "alice")  # bob still has it
+    assert index.has("doc-a")
+    assert index.release("doc-a", "bob")
+    assert not index.has("doc-a")
+    assert not index.share("doc-a", "carol", "a.pdf")  # gone: whoever uploads it again re-ingests
+    assert not open_index(tmp_path).has("doc-a")
+
+
+def test_idle_session_owners_expire(tmp_path):
+    index = open_index(tmp_path)
+    index.add_document("doc-a", "a.pdf", chunks("opening theme"))
+    index.add_document("doc-b", "b.pdf", chunks("closing credits"))
+    index.share("doc-a", "session:gone", "a.pdf")
+    index.share("doc-b", "session:gone", "b.pdf")
+    index.share("doc-b", "user:alice", "b.pdf")
+
+    index.session_ttl = 3600
+    assert index.expire_sessions() == 0  # seen just now
+    index.session_ttl = 0
+    assert index.expire_sessions() == 1
+
+    assert not index.has("doc-a")  # nobody else owned it
+    assert index.has("doc-b")  # alice still does
+    assert index.visible_documents("session:gone") == {}
+    assert index.visible_documents("user:alice") == {"doc-b": "b.pdf"}
+
+
+def test_hybrid_search_only_covers_the_given_documents(tmp_path):
+    index = open_index(tmp_path)
+    index.add_document("doc-a", "a.pdf", chunks("hans zimmer wrote the inception score", "piano ballad"))
+    index.add_document("doc-b", "b.pdf", chunks("hans zimmer also scored dune"))
+
+    docs, timings = index.hybrid_search("hans zimmer score", ["doc-a"], k=2)
+    assert docs and {doc.metadata["doc_hash"] for doc in docs} == {"doc-a"}
+    assert docs[0].metadata["chunk_id"] == "doc-a:0"
+    assert set(timings) == {"vector_ms", "bm25_ms", "fusion_ms"}
+    assert index.hybrid_search("hans zimmer", [], k=2) == ([], {})
+
+
+def test_documents_survive_reopening(tmp_path):
+    index = open_index(tmp_path)
+    assert index.add_document("doc-a", "a.pdf", chunks("opening theme", "closing credits")) == 2
+    assert index.add_document("doc-a", "a.pdf", chunks("opening theme")) == 0
+
+    reopened = open_index(tmp_path)
+    assert reopened.has("doc-a")
+    assert reopened.chunk_count(["doc-a"]) == 2
+    assert reopened.remove_document("doc-a") == 2
+    assert not open_index(tmp_path).has("doc-a")
+
+
+def test_uncommitted_batches_are_not_listed_after_a_crash(tmp_path):
+    index = open_index(tmp_path)
+    index.add_batch("doc-a", "a.pdf", chunks("first half"), index.embed_chunks(chunks("first half")))
+    # The process dies here, before commit_document
+
+    reopened = open_index(tmp_path)
+    assert not reopened.has("doc-a")
+    reopened.add_document("doc-a", "a.pdf", chunks("first half", "second half"))
+    assert reopened.chunk_count(["doc-a"]) == 2
+
+
+def test_indexes_from_before_the_commit_log_keep_their_documents(tmp_path):
+    open_index(tmp_path).add_document("doc-a", "a.pdf", chunks("opening theme"))
+    with sqlite3.connect(str(tmp_path / "documents_int8_keywords.sqlite")) as conn:
+        conn.execute("DROP TABLE documents")
+
+    assert open_index(tmp_path).has("doc-a")
+
+
+def test_removing_documents_compacts_the_store(tmp_path):
+    index = open_index(tmp_path)
+    index.add_document("doc-a", "a.pdf", chunks("one", "two", "three"))
+    index.add_document("doc-b", "b.pdf", chunks("four"))
+    index.remove_document("doc-a")
+    assert index.vectors.dead_fraction() == 0.0
+    assert index.vectors.documents() == {"doc-b": {"source": "b.pdf", "chunks": 1}}
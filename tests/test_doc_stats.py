@@ -0,0 +1,37 @@
+from doc_stats import DocumentStats
+
+
+def test_record_get_and_remove(tmp_path):
+    stats = DocumentStats(tmp_path / "stats.sqlite")
+    stats.record("doc-a", source="a.pdf", file_type=".pdf", words=100, tokens=130, pages=2, chunks=3,
+                 convert_seconds=1.5, bytes=2048)
+    assert stats.has("doc-a")
+    assert stats.get("doc-a")["words"] == 100
+    assert stats.get("doc-a")["source"] == "a.pdf"
+
+    stats.remove("doc-a")
+    assert not stats.has("doc-a")
+    assert stats.get("doc-a") is None
+
+
+def test_summary_totals_and_by_type(tmp_path):
+    stats = DocumentStats(tmp_path / "stats.sqlite")
+    stats.record("doc-a", file_type=".pdf", words=100, pages=2, chunks=3, bytes=1000)
+    stats.record("doc-b", file_type=".pdf", words=50, pages=1, chunks=1, bytes=500)
+    stats.record("doc-c", file_type=".txt", words=10, chunks=1, bytes=80)
+
+    summary = stats.summary(["doc-a", "doc-c", "not-indexed"])
+    assert summary["totals"]["documents"] == 2
+    assert summary["totals"]["words"] == 110
+    assert summary["totals"]["pages"] == 2
+    assert summary["by_type"][".pdf"]["bytes"] == 1000
+    assert summary["by_type"][".txt"]["chunks"] == 1
+
+
+def test_summary_of_many_documents(tmp_path):
+    # More documents than SQLite takes ? parameters in one query
+    stats = DocumentStats(tmp_path / "stats.sqlite")
+    doc_hashes = [f"doc-{i}" for i in range(2000)]
+    for doc_hash in doc_hashes:
+        stats.record(doc_hash, file_type=".txt", words=1)
+    assert stats.summary(doc_hashes)["totals"]["words"] == 2000
@@ -0,0 +1,86 @@
+import threading
+import time
+
+from ingest_jobs import FAILED, INDEXED, QUEUED, IngestQueue
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_tasks_run_through_every_stage():
+    def double(task):
+        task.result["value"] = 2 * int(task.name)
+
+    queue = IngestQueue([("doubling", double)], workers=1)
+    task = queue.submit("alice", "21", "/tmp/21")
+    wait_until(lambda: task.done)
+    assert task.stage == INDEXED
+    assert task.result["value"] == 42
+    assert "doubling" in task.timings
+
+
+def test_a_failing_stage_fails_the_task():
+    def boom(task):
+        raise ValueError("unreadable")
+
+    finished = []
+    queue = IngestQueue([("converting", boom), ("never", lambda task: None)], workers=1, on_finish=finished.append)
+    task = queue.submit("alice", "a.pdf", "/tmp/a.pdf")
+    wait_until(lambda: task.done)
+    assert task.stage == FAILED
+    assert task.error == "ValueError: unreadable"
+    assert "never" not in task.timings
+    wait_until(lambda: finished == [task])
+
+
+def test_owners_take_turns():
+    gate = threading.Event()
+    order = []
+
+    def record(task):
+        gate.wait()
+        order.append(task.name)
+
+    queue = IngestQueue([("recording", record)], workers=1)
+    tasks = [queue.submit("alice", f"alice-{i}", "") for i in range(3)]
+    tasks.append(queue.submit("bob", "bob-0", ""))
+    gate.set()
+    wait_until(lambda: all(task.done for task in tasks))
+    # alice's first task was already running; bob's one file doesn't wait for all of hers
+    assert order.index("bob-0") <= 2
+
+
+def test_forget_cancels_queued_tasks():
+    gate = threading.Event()
+    finished = []
+    queue = IngestQueue([("blocking", lambda task: gate.wait())], workers=1, on_finish=finished.append)
+    running = queue.submit("alice", "a", "")
+    wait_until(lambda: running.stage == "blocking")
+    queued = queue.submit("alice", "b", "")
+    assert queued.stage == QUEUED
+
+    queue.forget([queued.task_id])
+    assert finished == [queued]
+    assert queue.pending() == 0
+    gate.set()
+    wait_until(lambda: running.done)
+    assert queue.get([queued.task_id, running.task_id]) == [running]
+
+
+def test_finished_tasks_are_evicted_past_the_cap():
+    queue = IngestQueue([("noop", lambda task: None)], workers=1, max_finished=2)
+    tasks = [queue.submit("alice", str(i), "") for i in range(4)]
+    wait_until(lambda: all(task.done for task in tasks))
+    assert [task.name for task in queue.get(task.task_id for task in tasks)] == ["2", "3"]
+
+
+def test_finished_tasks_are_evicted_after_the_ttl():
+    queue = IngestQueue([("noop", lambda task: None)], workers=1, finished_ttl=0.05)
+    task = queue.submit("alice", "a", "")
+    wait_until(lambda: task.done)
+    time.sleep(0.1)
+    assert queue.get([task.task_id]) == []
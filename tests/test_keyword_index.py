@@ -0,0 +1,59 @@
+import pytest
+
+from keyword_index import KeywordIndex, reciprocal_rank_fusion, tokenize
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = KeywordIndex(tmp_path / "keywords.sqlite")
+    index.add("doc-a", ["doc-a:0", "doc-a:1"], ["The orchestra plays the opening theme", "A quiet piano ballad"])
+    index.add("doc-b", ["doc-b:0"], ["Orchestra, choir and orchestra again: an orchestra suite"])
+    return index
+
+
+def test_tokenize_lowercases_and_drops_stopwords():
+    assert tokenize("What is THE Theme of the film?") == ["theme", "film"]
+
+
+def test_search_ranks_by_bm25(index):
+    hits = index.search("orchestra")
+    assert [chunk_id for chunk_id, _ in hits] == ["doc-b:0", "doc-a:0"]
+    assert hits[0][1] > hits[1][1] > 0
+
+
+def test_rare_terms_outweigh_common_ones(index):
+    # "piano" is in one chunk, "orchestra" in two: the piano chunk wins a query with both
+    assert index.search("piano orchestra")[0][0] == "doc-a:1"
+
+
+def test_search_within_documents(index):
+    assert [chunk_id for chunk_id, _ in index.search("orchestra", doc_hashes=["doc-a"])] == ["doc-a:0"]
+    assert index.search("orchestra", doc_hashes=[]) == []
+    assert index.search("the of and") == []
+
+
+def test_remove_drops_postings_and_commit(index):
+    index.commit("doc-b", "b.pdf", 1)
+    index.remove("doc-b")
+    assert [chunk_id for chunk_id, _ in index.search("orchestra")] == ["doc-a:0"]
+    assert index.doc_hashes() == {"doc-a"}
+    assert index.committed() == {}
+
+
+def test_commit_log_survives_reopening(tmp_path):
+    path = tmp_path / "keywords.sqlite"
+    first = KeywordIndex(path)
+    assert not first.had_commit_log
+    first.commit("doc-a", "a.pdf", 2)
+
+    reopened = KeywordIndex(path)
+    assert reopened.had_commit_log
+    assert reopened.committed() == {"doc-a": {"source": "a.pdf", "chunks": 2}}
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion(["a", "b", "c"], ["c", "d"], k=60)
+    # "c" is in both lists, so it beats "a", which is first in only one
+    assert fused[0] == "c"
+    assert set(fused) == {"a", "b", "c", "d"}
+    assert fused.index("a") < fused.index("b") and fused.index("a") < fused.index("d")
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+from fake_openai import serve  # noqa: E402
+from llm_gateway import BACKOFF_MAX, LLMGateway, backoff_delay  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "Who scored Inception?"}]
+
+
+@pytest.fixture
+def fake_server():
+    servers = []
+
+    def start(**options):
+        server, base_url = serve(**options)
+        servers.append(server)
+        return base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def gateway(fake_server):
+    gateways = []
+
+    def start(max_retries=2, **options):
+        gateway = LLMGateway(api_key="fake", base_url=fake_server(**options), max_retries=max_retries,
+                             tokens_per_minute=0)
+        gateways.append(gateway)
+        return gateway
+
+    yield start
+    for gateway in gateways:
+        gateway.close()
+
+
+def test_complete_returns_the_answer(gateway):
+    answer = gateway(words=6).complete(model="gpt-3.5-turbo", messages=MESSAGES)
+    assert answer.startswith("Fake answer to: Who scored Inception?")
+    assert len(answer.split()) == 6
+
+
+def test_stream_yields_the_same_answer(gateway):
+    llm = gateway(words=6)
+    parts = list(llm.stream(model="gpt-3.5-turbo", messages=MESSAGES))
+    assert len(parts) == 6
+    assert "".join(parts) == llm.complete(model="gpt-3.5-turbo", messages=MESSAGES)
+
+
+def test_stopping_a_stream_early_cancels_the_request(gateway):
+    llm = gateway(words=200, token_delay=0.02)  # 4 s to stream in full
+    stream = llm.stream(model="gpt-3.5-turbo", messages=MESSAGES)
+    assert next(stream)
+    stream.close()
+    deadline = time.monotonic() + 1
+    while llm.metrics()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert llm.metrics()["in_flight"] == 0
+
+
+def test_rate_limited_requests_are_retried(gateway):
+    llm = gateway(fail_every=2)
+    for _ in range(3):
+        assert llm.complete(model="gpt-3.5-turbo", messages=MESSAGES)
+    stats = llm.metrics()
+    assert stats["requests"] == 3
+    assert stats["retries"] >= 1
+    assert stats["errors"] == 0
+    assert stats["in_flight"] == 0
+
+
+def test_gives_up_after_max_retries(gateway):
+    import openai
+
+    llm = gateway(max_retries=0, fail_every=1)
+    with pytest.raises(openai.RateLimitError):
+        llm.complete(model="gpt-3.5-turbo", messages=MESSAGES)
+    assert llm.metrics()["errors"] == 1
+
+
+def test_concurrent_callers_share_the_gateway(gateway):
+    llm = gateway(latency=0.05, words=3)
+    answers = []
+    threads = [threading.Thread(target=lambda: answers.append(llm.complete(model="m", messages=MESSAGES)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(answers) == 8
+    assert llm.metrics()["requests"] == 8
+
+
+def test_backoff_delay():
+    assert backoff_delay(3, retry_after=1.5) == 1.5
+    assert backoff_delay(3, retry_after=10 ** 6) == BACKOFF_MAX
+    assert all(0 <= backoff_delay(attempt) <= BACKOFF_MAX for attempt in range(10))
@@ -0,0 +1,66 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from markdown_chunker import CODE, HEADING, TABLE, TEXT, MarkdownChunker, iter_blocks  # noqa: E402
+
+
+def count_words(texts):
+    return [len(text.split()) for text in texts]
+
+
+def chunker(target=20, maximum=30):
+    return MarkdownChunker(target_tokens=target, max_tokens=maximum, count_batch=count_words)
+
+
+def test_iter_blocks_kinds():
+    markdown = "# Title\n\nSome text\nmore text\n\n| a | b |\n|---|---|\n| 1 | 2 |\n\n```\ncode\n```\n"
+    assert [kind for kind, _, _ in iter_blocks(markdown)] == [HEADING, TEXT, TABLE, CODE]
+    assert list(iter_blocks("## Sub"))[0] == (HEADING, "Sub", 2)
+
+
+def test_chunks_carry_their_heading_path():
+    markdown = "# Report\n\n## Results\n\n" + "word " * 15 + "\n\n## Costs\n\n" + "cost " * 15
+    chunks = chunker().create_documents([markdown], [{"source": "r.pdf"}])
+    # Labelled with the path of its text, not of the title it opens with
+    assert [chunk.metadata["headings"] for chunk in chunks] == ["Report > Results", "Report > Costs"]
+    assert chunks[0].page_content.startswith("# Report\n\n## Results")
+    assert all(chunk.metadata["source"] == "r.pdf" for chunk in chunks)
+    assert chunks[1].page_content.startswith("## Costs")
+
+
+def test_chunks_stay_within_max_tokens():
+    sentences = " ".join(f"Sentence number {i} is here." for i in range(60))
+    chunks = chunker().create_documents([sentences])
+    assert len(chunks) > 1
+    assert all(len(chunk.page_content.split()) <= 30 for chunk in chunks)
+    assert " ".join(chunk.page_content for chunk in chunks).split() == sentences.split()
+
+
+def test_leading_headings_count_against_max_tokens():
+    markdown = "# Annual Report\n\n## Financial Results\n\n### Third Quarter\n\n" + "word " * 11
+    chunks = chunker(target=10, maximum=12).create_documents([markdown])
+    for chunk in chunks:
+        # Words plus one token for each "\n\n" between blocks
+        assert len(chunk.page_content.split()) + chunk.page_content.count("\n\n") <= 12
+        assert chunk.metadata["headings"] == "Annual Report > Financial Results > Third Quarter"
+    assert " ".join(chunk.page_content for chunk in chunks).count("word") == 11
+
+
+def test_long_table_is_split_between_rows_with_its_header():
+    rows = "\n".join(f"| row {i} | value {i} |" for i in range(30))
+    table = "| name | value |\n|---|---|\n" + rows
+    chunks = chunker().create_documents([table])
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.page_content.startswith("| name | value |\n|---|---|")
+
+
+def test_feed_carries_an_open_chunk_across_pieces():
+    split = chunker()
+    first = split.feed("# Intro\n\nshort start", {"pages": "1-1"})
+    assert first == []
+    rest = split.feed("short end", {"pages": "2-2"}) + split.finish()
+    assert len(rest) == 1
+    assert rest[0].page_content == "# Intro\n\nshort start\n\nshort end"
+    assert rest[0].metadata["pages"] == "1-2"
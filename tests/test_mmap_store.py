@@ -0,0 +1,84 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+
+from mmap_store import MmapVectorStore, quantize  # noqa: E402
+
+
+def add(store, doc_hash, vectors, source=None):
+    ids = [f"{doc_hash}:{i}" for i in range(len(vectors))]
+    metadatas = [{"doc_hash": doc_hash, "source": source or f"{doc_hash}.pdf", "chunk_id": chunk_id} for chunk_id in ids]
+    store.upsert(ids, vectors, metadatas, [f"text of {chunk_id}" for chunk_id in ids])
+    return ids
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_quantize_keeps_directions(dtype):
+    vectors = np.random.default_rng(0).normal(size=(5, 16)).astype(np.float32)
+    codes, scales = quantize(vectors, dtype)
+    restored = codes.astype(np.float32) * (scales[:, None] if scales is not None else 1)
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    cosines = (restored * unit).sum(axis=1) / np.linalg.norm(restored, axis=1)
+    assert cosines.min() > 0.999
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_search_finds_the_nearest_rows(tmp_path, dtype):
+    store = MmapVectorStore(tmp_path / "store", dtype=dtype)
+    add(store, "a", [[1, 0, 0], [0, 1, 0]])
+    add(store, "b", [[0.9, 0.1, 0]])
+
+    docs = store.search_documents([1, 0, 0], k=2)
+    assert [doc.metadata["chunk_id"] for doc in docs] == ["a:0", "b:0"]
+    assert docs[0].page_content == "text of a:0"
+
+    only_b = store.search_documents([1, 0, 0], k=2, doc_hashes=["b"])
+    assert [doc.metadata["chunk_id"] for doc in only_b] == ["b:0"]
+    assert store.search([1, 0, 0], doc_hashes=["missing"]) == []
+
+
+def test_delete_hides_rows_and_documents(tmp_path):
+    store = MmapVectorStore(tmp_path / "store")
+    ids = add(store, "a", [[1, 0], [0, 1]])
+    add(store, "b", [[1, 1]])
+    store.delete(ids)
+
+    assert [doc.metadata["chunk_id"] for doc in store.search_documents([1, 0], k=3)] == ["b:0"]
+    assert store.get(ids) == []
+    assert store.documents() == {"b": {"source": "b.pdf", "chunks": 1}}
+
+
+def test_upsert_replaces_rows_with_the_same_id(tmp_path):
+    store = MmapVectorStore(tmp_path / "store")
+    add(store, "a", [[1, 0]])
+    add(store, "a", [[0, 1]])
+    hits = store.search([0, 1], k=5)
+    assert len(hits) == 1 and hits[0][2] == pytest.approx(1.0, abs=1e-2)
+    assert store.texts("a") == (["a:0"], ["text of a:0"])
+
+
+def test_another_instance_sees_writes(tmp_path):
+    # Two server processes on the same directory
+    writer = MmapVectorStore(tmp_path / "store")
+    reader = MmapVectorStore(tmp_path / "store")
+    assert reader.search([1, 0]) == []
+    add(writer, "a", [[1, 0]])
+    assert len(reader.search([1, 0])) == 1
+    writer.delete(["a:0"])
+    assert reader.search([1, 0]) == []
+
+
+def test_compact_frees_dead_segments(tmp_path):
+    store = MmapVectorStore(tmp_path / "store")
+    add(store, "a", [[1, 0], [0, 1]])
+    add(store, "b", [[1, 1]])
+    assert store.dead_fraction() == 0.0
+
+    store.delete(["a:0", "a:1"])
+    assert store.dead_fraction() == pytest.approx(2 / 3)
+    files_before = len(list((tmp_path / "store").glob("*.npy")))
+    store.compact()
+    assert store.dead_fraction() == 0.0
+    assert len(list((tmp_path / "store").glob("*.npy"))) < files_before
+    assert [doc.metadata["chunk_id"] for doc in store.search_documents([1, 1])] == ["b:0"]
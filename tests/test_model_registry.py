@@ -0,0 +1,77 @@
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from model_registry import ModelRegistry
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """A stand-in for transformers.pipeline that records every load."""
+    loaded = []
+
+    def pipeline(task, model, **kwargs):
+        time.sleep(0.01)
+        loaded.append(model)
+        return SimpleNamespace(task=task, model=model, kwargs=kwargs)
+
+    monkeypatch.setitem(sys.modules, "transformers", SimpleNamespace(pipeline=pipeline))
+    return loaded
+
+
+def test_each_model_is_loaded_once(loads):
+    registry = ModelRegistry(idle_seconds=0)
+    first = registry.get("text2text-generation", "flan")
+    assert registry.get("text2text-generation", "flan") is first
+    assert registry.get("text2text-generation", "flan", max_new_tokens=5) is not first
+    assert loads == ["flan", "flan"]
+
+
+def test_concurrent_sessions_share_one_load(loads):
+    registry = ModelRegistry(idle_seconds=0)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("t", "flan"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == ["flan"]
+    assert all(result is results[0] for result in results)
+
+
+def test_least_recently_used_goes_past_max_loaded(loads):
+    registry = ModelRegistry(max_loaded=2, idle_seconds=0)
+    registry.get("t", "a")
+    registry.get("t", "b")
+    registry.get("t", "a")
+    registry.get("t", "c")
+    assert [entry["model"] for entry in registry.loaded()] == ["a", "c"]
+
+
+def test_idle_models_are_dropped_on_the_next_get(loads):
+    registry = ModelRegistry(idle_seconds=0.05)
+    registry.get("t", "a")
+    time.sleep(0.1)
+    registry.get("t", "b")
+    assert [entry["model"] for entry in registry.loaded()] == ["b"]
+
+
+def test_requested_model_is_kept_even_if_it_was_idle(loads):
+    registry = ModelRegistry(idle_seconds=0.05)
+    first = registry.get("t", "a")
+    time.sleep(0.1)
+    assert registry.get("t", "a") is first
+    assert loads == ["a"]
+
+
+def test_unload(loads):
+    registry = ModelRegistry(idle_seconds=0)
+    registry.get("t", "a")
+    registry.get("t", "b")
+    registry.unload("a")
+    assert [entry["model"] for entry in registry.loaded()] == ["b"]
+    registry.unload()
+    assert registry.loaded() == []
@@ -0,0 +1,56 @@
+import sys
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document
+
+import reranker
+
+
+class FakeCrossEncoder:
+    """Scores a chunk by the number in its text, so the ranking is known in advance."""
+
+    def __init__(self, model_name, device):
+        self.model_name = model_name
+
+    def predict(self, pairs, batch_size, show_progress_bar):
+        return [float(text.split()[0]) for _, text in pairs]
+
+
+@pytest.fixture
+def ranker(monkeypatch):
+    monkeypatch.setitem(sys.modules, "sentence_transformers", SimpleNamespace(CrossEncoder=FakeCrossEncoder))
+    # One token per word keeps the budgets below easy to follow
+    monkeypatch.setattr(reranker, "count_tokens", lambda text: len(text.split()))
+    return reranker.Reranker("fake")
+
+
+def doc(score, words):
+    return Document(page_content=" ".join([str(score)] + ["word"] * (words - 1)))
+
+
+def test_keeps_the_best_top_n(ranker):
+    docs = [doc(1, 2), doc(3, 2), doc(2, 2)]
+    kept, report = ranker.rerank("q", docs, top_n=2, token_budget=100)
+    assert [d.metadata["rerank_score"] for d in kept] == [3.0, 2.0]
+    assert report["candidates"] == 3 and report["kept"] == 2
+    assert report["tokens"] == 4 and report["tokens_dropped"] == 2
+
+
+def test_token_budget_skips_chunks_that_do_not_fit(ranker):
+    # The 5-token runner-up doesn't fit after the best one, but the smaller third one does
+    docs = [doc(3, 4), doc(2, 5), doc(1, 3)]
+    kept, report = ranker.rerank("q", docs, top_n=3, token_budget=8)
+    assert [d.metadata["rerank_score"] for d in kept] == [3.0, 1.0]
+    assert report["tokens"] == 7 and report["tokens_dropped"] == 5
+
+
+def test_best_chunk_is_kept_even_over_budget(ranker):
+    kept, report = ranker.rerank("q", [doc(2, 50), doc(1, 2)], top_n=4, token_budget=10)
+    assert [d.metadata["rerank_score"] for d in kept] == [2.0]
+    assert report["tokens"] == 50
+
+
+def test_no_candidates(ranker):
+    kept, report = ranker.rerank("q", [])
+    assert kept == [] and report["kept"] == 0 and report["tokens"] == 0
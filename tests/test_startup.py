@@ -0,0 +1,55 @@
+import threading
+import uuid
+
+import pytest
+
+from startup import code_version, resource, warm_status, warm_up
+
+
+@pytest.fixture
+def name():
+    # warm_up's tasks live for the whole process: one fresh name per test
+    return f"test-{uuid.uuid4().hex}"
+
+
+def test_code_version_follows_the_code_not_the_function_object():
+    def make(seed):
+        return lambda: ["doc one", "doc two"]
+
+    assert code_version(make(1)) == code_version(make(2))
+    assert code_version(lambda: ["doc one", "doc two"]) != code_version(lambda: ["doc one", "doc three"])
+    assert code_version(len) == ""
+
+
+def test_warm_up_builds_once(name):
+    calls = []
+    release = threading.Event()
+
+    def factory():
+        release.wait(5)
+        calls.append(1)
+        return object()
+
+    first = warm_up(name, factory)
+    assert warm_up(name, factory) is first
+    assert warm_status()[name] == "loading"
+    release.set()
+    assert resource(name, factory) is first.result()
+    assert calls == [1]
+    assert warm_status()[name] == "ready"
+
+
+def test_changed_code_is_built_again(name):
+    assert resource(name, lambda: "old") == "old"
+    assert resource(name, lambda: "new") == "new"
+
+
+def test_failed_build_is_reported_and_retried(name):
+    def broken():
+        raise RuntimeError("no model")
+
+    with pytest.raises(RuntimeError):
+        resource(name, broken)
+    assert warm_status()[name] == "failed: no model"
+    assert resource(name, lambda: "fixed") == "fixed"
+    assert warm_status()[name] == "ready"
@@ -0,0 +1,76 @@
+import io
+import os
+import time
+
+import pytest
+
+import upload_spool
+from upload_spool import UploadSpool, spooled_hash
+
+
+class Upload(io.BytesIO):
+    """What st.file_uploader hands over: a BytesIO with a name."""
+
+    def __init__(self, data: bytes, name: str = "report.pdf"):
+        super().__init__(data)
+        self.name = name
+
+
+@pytest.fixture
+def no_grace(monkeypatch):
+    monkeypatch.setattr(upload_spool, "_GRACE_SECONDS", 0)
+
+
+def age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_identical_uploads_share_one_file(tmp_path):
+    spool = UploadSpool(tmp_path)
+    first, content_hash = spool.put(Upload(b"same bytes", "a.pdf"))
+    second, _ = spool.put(Upload(b"same bytes", "b.pdf"))
+    third, _ = spool.put(Upload(b"other bytes", "a.pdf"))
+    assert first == second != third
+    assert first.endswith(".pdf")
+    assert spooled_hash(first) == content_hash
+    assert spooled_hash(tmp_path / "elsewhere.pdf") is None
+
+
+def test_gc_deletes_old_files(tmp_path, no_grace):
+    spool = UploadSpool(tmp_path, max_age=60)
+    old, _ = spool.put(Upload(b"old"))
+    new, _ = spool.put(Upload(b"new", "new.txt"))
+    age(old, 120)
+    assert spool.gc() == 3
+    assert not os.path.exists(old) and os.path.exists(new)
+
+
+def test_gc_keeps_under_quota_least_recently_used_first(tmp_path, no_grace):
+    spool = UploadSpool(tmp_path, max_bytes=10)
+    paths = [spool.put(Upload(bytes([i]) * 6, f"{i}.txt"))[0] for i in range(3)]
+    for seconds, path in zip((30, 20, 10), paths):
+        age(path, seconds)
+    spool.gc()
+    assert [os.path.exists(path) for path in paths] == [False, False, True]
+
+
+def test_gc_spares_recent_files(tmp_path):
+    spool = UploadSpool(tmp_path, max_bytes=0, max_age=0)
+    path, _ = spool.put(Upload(b"just uploaded"))
+    assert spool.gc() == 0
+    assert os.path.exists(path)
+
+
+def test_pinned_files_survive_gc_until_unpinned(tmp_path, no_grace):
+    spool = UploadSpool(tmp_path, max_bytes=0, max_age=0)
+    path, _ = spool.put(Upload(b"being converted"), pin=True)
+    spool.pin(path)  # a second upload of the same file
+    age(path, 3600)
+
+    assert spool.gc() == 0
+    spool.unpin(path)
+    assert spool.gc() == 0
+    spool.unpin(path)
+    assert spool.gc() > 0
+    assert not os.path.exists(path)
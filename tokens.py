@@ -0,0 +1,56 @@
+import os
+from functools import lru_cache
+
+# The encoding gpt-3.5-turbo / gpt-4 count prompt tokens with
+ENCODING = os.environ.get("TOKEN_ENCODING", "cl100k_base")
+
+# Rough ratio for English text when tiktoken isn't available
+_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding(name: str):
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception:
+        # Not installed, or the BPE file can't be downloaded (offline): fall back to estimating
+        return None
+
+
+def count_tokens(text: str, encoding: str = ENCODING) -> int:
+    """Tokens the OpenAI tokenizer would bill for `text` (estimated if tiktoken is unavailable)."""
+    if not text:
+        return 0
+    enc = _encoding(encoding)
+    if enc is None:
+        return max(1, len(text) // _CHARS_PER_TOKEN)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def count_tokens_batch(texts, encoding: str = ENCODING):
+    """count_tokens for many texts at once (tiktoken encodes the batch on several threads)."""
+    texts = list(texts)
+    enc = _encoding(encoding)
+    if enc is None:
+        return [max(1, len(text) // _CHARS_PER_TOKEN) if text else 0 for text in texts]
+    return [len(tokens) for tokens in enc.encode_ordinary_batch(texts)]
+
+
+def truncate_tokens(text: str, max_tokens: int, count=None) -> str:
+    """The longest prefix of `text` (cut at a word boundary) that fits in max_tokens."""
+    count = count or count_tokens
+    if max_tokens <= 0:
+        return ""
+    if count(text) <= max_tokens:
+        return text
+    words = text.split(" ")
+    low, high = 0, len(words)
+    # Binary search on the number of words kept, so any counter (tiktoken, a HF tokenizer) works
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count(" ".join(words[:mid])) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return " ".join(words[:low])
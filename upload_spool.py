@@ -0,0 +1,144 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+DEFAULT_SPOOL_DIR = Path(os.environ.get("UPLOAD_SPOOL_DIR", ".cache/uploads"))
+DEFAULT_MAX_BYTES = int(os.environ.get("UPLOAD_SPOOL_MAX_MB", "2048")) * 1024 * 1024
+DEFAULT_MAX_AGE = float(os.environ.get("UPLOAD_SPOOL_MAX_AGE_HOURS", "24")) * 3600
+
+# Files this recent are never collected, so one being converted right now can't vanish
+_GRACE_SECONDS = 600
+_GC_INTERVAL = 60
+_WRITE_BLOCK = 1024 * 1024
+_HASH_NAME = re.compile(r"^[0-9a-f]{64}$")
+
+
+# ----------------- UPLOAD SPOOL -----------------
+class UploadSpool:
+    """
+    Uploaded files on disk under the SHA-256 of their bytes, e.g.
+    .cache/uploads/3f2a…e1.pdf. The same file uploaded twice (by anyone)
+    is stored once, names can't collide, and the file name doubles as the
+    content hash that conversion caching and fingerprinting need.
+
+    Uploads are written straight from Streamlit's buffer (getbuffer(), a
+    memoryview, so no second in-memory copy) one block at a time. Old files
+    are collected by age and, past the size quota, least recently used
+    first; spooling a file again bumps its mtime. Files someone still needs
+    (queued or being converted) are pinned and never collected, however
+    old they are or however full the spool is.
+    """
+
+    def __init__(self, spool_dir=DEFAULT_SPOOL_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = DEFAULT_MAX_AGE):
+        self.spool_dir = Path(spool_dir)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._last_gc = 0.0
+        self._pins = Counter()
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+
+    def put(self, uploaded_file, pin: bool = False):
+        """Spool one st.file_uploader file; returns (path, content_hash). pin=True pins it (see pin())."""
+        buffer = uploaded_file.getbuffer()
+        digest = hashlib.sha256()
+        for start in range(0, len(buffer), _WRITE_BLOCK):
+            digest.update(buffer[start:start + _WRITE_BLOCK])
+        content_hash = digest.hexdigest()
+        path = self.spool_dir / f"{content_hash}{Path(uploaded_file.name).suffix.lower()}"
+
+        if path.exists():
+            os.utime(path, None)
+        else:
+            # Unique temp name + atomic rename: concurrent uploads of the same file can't clash
+            fd, tmp_path = tempfile.mkstemp(dir=self.spool_dir, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for start in range(0, len(buffer), _WRITE_BLOCK):
+                        f.write(buffer[start:start + _WRITE_BLOCK])
+                os.replace(tmp_path, path)
+            except BaseException:
+                Path(tmp_path).unlink(missing_ok=True)
+                raise
+
+        if pin:
+            self.pin(path)
+        if time.monotonic() - self._last_gc > _GC_INTERVAL:
+            self.gc()
+        return str(path), content_hash
+
+    def pin(self, path) -> None:
+        """Keep path out of gc() until a matching unpin() (pins from several users add up)."""
+        with self._lock:
+            self._pins[Path(path).name] += 1
+
+    def unpin(self, path) -> None:
+        with self._lock:
+            name = Path(path).name
+            self._pins[name] -= 1
+            if self._pins[name] <= 0:
+                del self._pins[name]
+
+    def gc(self) -> int:
+        """Delete files past max_age, then the least recently used until under max_bytes. Returns bytes freed."""
+        with self._lock:
+            self._last_gc = time.monotonic()
+            now = time.time()
+            entries = []
+            for path in self.spool_dir.iterdir():
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            entries.sort()
+
+            total = sum(size for _, size, _ in entries)
+            freed = 0
+            for mtime, size, path in entries:
+                age = now - mtime
+                if age < _GRACE_SECONDS:
+                    break
+                if age <= self.max_age and total - freed <= self.max_bytes:
+                    break
+                if path.name in self._pins:
+                    continue
+                try:
+                    path.unlink()
+                    freed += size
+                except FileNotFoundError:
+                    pass
+            return freed
+
+    def usage(self) -> dict:
+        sizes = [p.stat().st_size for p in self.spool_dir.iterdir() if p.is_file()]
+        return {"files": len(sizes), "bytes": sum(sizes), "max_bytes": self.max_bytes}
+
+
+def spooled_hash(path):
+    """The content hash of a spooled file, from its name (None for files spooled some other way)."""
+    stem = Path(path).stem
+    return stem if _HASH_NAME.match(stem) else None
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def get_spool() -> UploadSpool:
+    global _spool
+    with _spool_lock:
+        if _spool is None:
+            _spool = UploadSpool()
+        return _spool
+
+
+def spool_upload(uploaded_file, pin: bool = False):
+    """Shortcut for get_spool().put: (path, content_hash) of the upload on disk."""
+    return get_spool().put(uploaded_file, pin)